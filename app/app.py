@@ -1,73 +1,760 @@
-from flask import Blueprint, Flask, render_template, request, redirect, url_for
+from flask import (
+    Blueprint,
+    Flask,
+    abort,
+    current_app,
+    jsonify,
+    make_response,
+    render_template,
+    request,
+    redirect,
+    stream_template,
+    stream_with_context,
+    url_for,
+)
+from flask.cli import with_appcontext
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import column, delete as sql_delete, func, insert, inspect, select
+from sqlalchemy import table, text
+from sqlalchemy.exc import SQLAlchemyError
+from werkzeug.exceptions import HTTPException
+from werkzeug.http import is_resource_modified
+from werkzeug.security import safe_join
 
-from os import environ, path
-
-app = Flask(__name__)
+import click
 
-# I know this is not great.
-# In a real setup there would be 1 database all containers connect to.
-# This purpose of this project is the CI/CD process itself not the
-# application or database. For simplify and demo this setups aligns
-# with the goals of this project.
-is_prod_like = environ.get("PROD_LIKE", "").lower() == "true"
+from concurrent.futures import TimeoutError as FutureTimeoutError
+import csv
+from datetime import datetime, timezone
+import io
+import json
+from functools import lru_cache
+from hashlib import sha256
+from os import environ, path
+import re
 
-# When running gunicorn their code be many works for 1 container
-# when this is the case all the workers need to connect to the same
-# database.
-# TODO: Fine a better solution for this.
-if is_prod_like:
-    db = "sqlite:///" + path.join("/opt/simple-task-app/database/", "database.db")
-else:
-    db = "sqlite:///:memory:"
+from cache import make_cache
+from group_commit import GroupCommitter
+from migrations import migrations_cli, upgrade
+from metrics import Metrics, init_metrics
+from profiling import init_profiling
+from database import (
+    database_binds,
+    database_uri,
+    engine_options,
+    env_flag,
+    is_memory_database,
+    replica_uri,
+)
 
+db = SQLAlchemy()
 
-app.config["SQLALCHEMY_DATABASE_URI"] = db
 
-db = SQLAlchemy(app)
+def utcnow():
+    return datetime.now(timezone.utc).replace(tzinfo=None)
 
 
 class Task(db.Model):
+    # The schema is managed by migrations.py, a change here needs a migration.
+    __table_args__ = (
+        db.Index("ix_task_created_at_id", "created_at", "id"),
+        db.Index("ix_task_title", "title"),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(50), nullable=False)
+    # Tasks from before migration 2 have no creation time.
+    created_at = db.Column(db.DateTime, nullable=True, default=utcnow)
+
+
+def load_config(env=environ):
+    """Read the app configuration from the environment.
+
+    Returns:
+    - dict: Flask config values, create_app() fills in the derived ones.
+    """
+    # I know this is not great.
+    # Without DATABASE_URL every container has its own database. This purpose
+    # of this project is the CI/CD process itself not the application or
+    # database. For simplify and demo this setups aligns with the goals of this
+    # project, pointing DATABASE_URL (and DATABASE_REPLICA_URL) at a shared
+    # server lets the containers scale horizontally. See database.py.
+    is_prod_like = env.get("PROD_LIKE", "").lower() == "true"
+
+    return {
+        "SQLALCHEMY_DATABASE_URI": database_uri(is_prod_like, env),
+        "DATABASE_REPLICA_URI": replica_uri(env),
+        # Number of tasks rendered per page on the index. Pages are keyset
+        # based on Task.id so every page is an index range scan on the primary
+        # key no matter how large the table gets. 0 turns the pages off, the
+        # index then streams every task, see index().
+        "TASKS_PER_PAGE": int(env.get("TASKS_PER_PAGE", 50)),
+        # Streamed responses (the unpaginated index and the exports) fetch and
+        # send this many tasks at a time.
+        "STREAM_CHUNK_SIZE": int(env.get("STREAM_CHUNK_SIZE", 1000)),
+        # Commit the single task inserts of concurrent requests together, see
+        # group_commit.py.
+        "GROUP_COMMIT": env_flag("GROUP_COMMIT", False, env),
+        "GROUP_COMMIT_MAX_BATCH": int(env.get("GROUP_COMMIT_MAX_BATCH", 64)),
+        "GROUP_COMMIT_WINDOW_MS": float(env.get("GROUP_COMMIT_WINDOW_MS", 5)),
+        "GROUP_COMMIT_TIMEOUT": float(env.get("GROUP_COMMIT_TIMEOUT", 5)),
+        # Bulk endpoints run one statement per chunk of this many items, which
+        # keeps the number of bound parameters under the database limits.
+        "BULK_CHUNK_SIZE": int(env.get("BULK_CHUNK_SIZE", 500)),
+        # bm25 ranking of search results scores every match, a search that
+        # matches more tasks than this lists the newest matches first instead.
+        "SEARCH_RANK_LIMIT": int(env.get("SEARCH_RANK_LIMIT", 5000)),
+        # Rendered index pages are cached until the next add or delete. Prod
+        # like containers share the cache between the gunicorn workers. See
+        # cache.py.
+        "INDEX_CACHE": env.get("INDEX_CACHE", "sqlite" if is_prod_like else "memory"),
+        "INDEX_CACHE_PATH": env.get(
+            "INDEX_CACHE_PATH", "/opt/simple-task-app/database/cache.db"
+        ),
+        "INDEX_CACHE_SIZE": int(env.get("INDEX_CACHE_SIZE", 256)),
+        "INDEX_CACHE_TTL": int(env.get("INDEX_CACHE_TTL", 60)),
+        # Directory the gunicorn workers share their metrics through, see
+        # metrics.py.
+        "METRICS_DIR": env.get("METRICS_DIR"),
+        # Static files are served with a one year max age. url_for("static")
+        # adds a hash of the file contents to the URL so a changed file gets a
+        # new URL.
+        "SEND_FILE_MAX_AGE_DEFAULT": 31536000,
+    }
+
+
+def create_app(config=None):
+    """Create the Flask app.
+
+    Nothing here connects to the database. The engines only open a connection
+    on the first query, and the schema is migrated by init_db() once per
+    deployment (the `flask db upgrade` command or gunicorn's on_starting
+    hook) instead of in every worker. The exception is an in-memory database, it
+    only exists inside this process, so its schema is created right away
+    unless CREATE_SCHEMA says otherwise.
+
+    Parameters:
+    - config (dict): Values that override load_config().
+    """
+    app = Flask(__name__)
+    app.config.update(load_config())
+    app.config.update(config or {})
+
+    uri = app.config["SQLALCHEMY_DATABASE_URI"]
+    app.config.setdefault("SQLALCHEMY_ENGINE_OPTIONS", engine_options(uri))
+    app.config.setdefault(
+        "SQLALCHEMY_BINDS", database_binds(app.config["DATABASE_REPLICA_URI"])
+    )
+    app.config.setdefault("CREATE_SCHEMA", is_memory_database(uri))
+
+    db.init_app(app)
+
+    app.extensions["index_cache"] = make_cache(
+        app.config["INDEX_CACHE"],
+        path=app.config["INDEX_CACHE_PATH"],
+        maxsize=app.config["INDEX_CACHE_SIZE"],
+        ttl=app.config["INDEX_CACHE_TTL"],
+    )
+
+    # Per read engine, whether it has the task_version counter, see
+    # task_version().
+    app.extensions["task_version_tables"] = {}
+
+    app.extensions["group_commit"] = None
+    if app.config["GROUP_COMMIT"]:
+        with app.app_context():
+            app.extensions["group_commit"] = GroupCommitter(
+                db.engine,
+                Task.__table__,
+                max_batch=app.config["GROUP_COMMIT_MAX_BATCH"],
+                window=app.config["GROUP_COMMIT_WINDOW_MS"] / 1000,
+                timeout=app.config["GROUP_COMMIT_TIMEOUT"],
+            )
+
+    app.extensions["metrics"] = Metrics(app.config["METRICS_DIR"])
+    init_metrics(app, db, app.extensions["metrics"])
+
+    # Off unless PROFILE_REQUESTS or PROFILE_SAMPLE_RATE is set, see
+    # profiling.py.
+    init_profiling(app)
+
+    app.register_blueprint(tasks_bp, url_prefix="/")
+    app.register_blueprint(api_bp, url_prefix="/api/v1")
+    app.url_defaults(static_fingerprint)
+    app.add_url_rule("/cache/stats", view_func=cache_stats)
+    app.add_url_rule("/healthz", view_func=healthz)
+    app.cli.add_command(migrations_cli)
+    app.cli.add_command(reset_db_command)
+
+    if app.config["CREATE_SCHEMA"]:
+        init_db(app)
+
+    return app
+
+
+def init_db(app):
+    """Apply the pending schema migrations, see migrations.py."""
+    with app.app_context():
+        return upgrade(db.engine)
+
+
+@click.command("reset-db")
+@click.confirmation_option(prompt="Delete every task?")
+@with_appcontext
+def reset_db_command():
+    """Delete every task, used between the Selenium tests."""
+    deleted = db.session.execute(sql_delete(Task)).rowcount
+    db.session.commit()
+    index_cache().invalidate()
+    click.echo(f"Deleted {deleted} tasks.")
+
+
+def index_cache():
+    return current_app.extensions["index_cache"]
+
+
+def metrics():
+    return current_app.extensions["metrics"]
+
+
+def read_engine():
+    """Engine used for read only queries, the replica when one is configured."""
+    return db.engines.get("replica", db.engine)
+
+
+def task_page_query(after=None, before=None, per_page=50, columns=None):
+    """Build the SELECT of get_task_page(), one row more than per_page."""
+    query = select(*columns) if columns else select(Task)
+    if before is not None:
+        query = query.where(Task.id < before).order_by(Task.id.desc())
+    else:
+        if after is not None:
+            query = query.where(Task.id > after)
+        query = query.order_by(Task.id.asc())
+    return query.limit(per_page + 1)
 
 
-with app.app_context():
-    db.create_all()
+def get_task_page(after=None, before=None, per_page=50, columns=None):
+    """Return one keyset page of tasks ordered by id.
+
+    Only one of ``after`` or ``before`` is used. ``after`` returns the page
+    following that id and ``before`` the page preceding it. One extra row is
+    fetched to find out if there is another page in the same direction.
+
+    ``columns`` selects plain rows with just those columns instead of Task
+    objects, which skips the ORM bookkeeping for callers that only serialize
+    the data. The columns must include Task.id.
+
+    Returns:
+    - tuple: (tasks, prev_cursor, next_cursor), cursors are None when there
+      is no page in that direction.
+    """
+    result = db.session.execute(
+        task_page_query(after, before, per_page, columns),
+        bind_arguments={"bind": read_engine()},
+    )
+    tasks = result.all() if columns else result.scalars().all()
+    has_more = len(tasks) > per_page
+    tasks = tasks[:per_page]
+
+    if before is not None:
+        tasks.reverse()
+        has_prev, has_next = has_more, True
+    else:
+        has_prev, has_next = after is not None, has_more
+
+    prev_cursor = tasks[0].id if tasks and has_prev else None
+    next_cursor = tasks[-1].id if tasks and has_next else None
+    return tasks, prev_cursor, next_cursor
+
+
+# Change counter of the task table, created by migration 4 on SQLite.
+task_version_table = table("task_version", column("version"))
+
+
+def task_version():
+    """Return the change counter of the task table on the read engine.
+
+    Every write bumps it in its own transaction, so it changes with the data
+    no matter which worker or container wrote. Whether the table exists is
+    checked once per process and engine, the schema is migrated before the
+    workers start.
+
+    Returns:
+    - int: Microsecond timestamp of the last write, None when the database
+      has no counter.
+    """
+    engine = read_engine()
+    tables = current_app.extensions["task_version_tables"]
+    if engine not in tables:
+        tables[engine] = inspect(engine).has_table("task_version")
+    if not tables[engine]:
+        return None
+    return db.session.scalar(
+        select(task_version_table.c.version), bind_arguments={"bind": engine}
+    )
+
+
+# Full-text index of task titles, created by migration 3 on SQLite.
+task_fts = table("task_fts", column("rowid"), column("title"), column("rank"))
+
+# A search uses at most this many words, which bounds the cost of a query.
+MAX_SEARCH_TERMS = 8
+
+
+def search_terms(query):
+    """Split a search query into at most MAX_SEARCH_TERMS words."""
+    return re.findall(r"\w+", query)[:MAX_SEARCH_TERMS]
+
+
+def fts_match_expression(terms):
+    """Build an FTS5 MATCH expression that finds titles with all the terms.
+
+    Every term is a quoted string so nothing the user types is read as FTS5
+    syntax (AND, NEAR, column filters, ...). The last term is a prefix query
+    so a search for "buy gro" finds "buy groceries". Only the last one, a
+    prefix of a long common word merges the entries of every word starting
+    with it, which costs more than the lookup of a whole word.
+    """
+    quoted = ['"{}"'.format(term.replace('"', '""')) for term in terms]
+    quoted[-1] += "*"
+    return " ".join(quoted)
+
+
+def search_tasks(query, page=1, per_page=50, use_fts=None):
+    """Return one page of the tasks whose title has every word of query.
+
+    On SQLite the task_fts index is used and the best matches (bm25) come
+    first, unless more than SEARCH_RANK_LIMIT tasks match. Ranking has to
+    score every match, so those searches list the newest matches first, which
+    the index returns without reading the rest. Other databases have no FTS5,
+    they fall back to a LIKE scan per word ordered by id.
+
+    Returns:
+    - tuple: (tasks, has_next), tasks are rows with id and title.
+    """
+    terms = search_terms(query)
+    if not terms:
+        return [], False
+
+    engine = read_engine()
+    if use_fts is None:
+        use_fts = engine.dialect.name == "sqlite"
+
+    if use_fts:
+        match = text("task_fts MATCH :match").bindparams(
+            match=fts_match_expression(terms)
+        )
+        # Counting stops at the limit, so this costs at most that many rows.
+        limit = current_app.config["SEARCH_RANK_LIMIT"]
+        matches = select(task_fts.c.rowid).where(match).limit(limit).subquery()
+        count = db.session.scalar(
+            select(func.count()).select_from(matches),
+            bind_arguments={"bind": engine},
+        )
+        if count < limit:
+            order = (task_fts.c.rank, task_fts.c.rowid)
+        else:
+            order = (task_fts.c.rowid.desc(),)
+        statement = (
+            select(task_fts.c.rowid.label("id"), task_fts.c.title)
+            .where(match)
+            .order_by(*order)
+        )
+    else:
+        statement = select(Task.id, Task.title).order_by(Task.id)
+        for term in terms:
+            statement = statement.where(Task.title.icontains(term, autoescape=True))
+
+    # Offset pages, a ranked order has no key to continue from.
+    statement = statement.limit(per_page + 1).offset((page - 1) * per_page)
+    tasks = db.session.execute(statement, bind_arguments={"bind": engine}).all()
+    return tasks[:per_page], len(tasks) > per_page
+
 
 tasks_bp = Blueprint("tasks", __name__)
 
 
+def page_size():
+    """Tasks per page for the paginated views, also when the index streams."""
+    return current_app.config["TASKS_PER_PAGE"] or 50
+
+
+def stream_task_chunks(columns=(Task.id, Task.title)):
+    """Yield all tasks ordered by id as lists of STREAM_CHUNK_SIZE rows.
+
+    yield_per fetches the rows in chunks, from a server side cursor on
+    databases that have one, so only one chunk is in memory at a time. The
+    connection stays checked out until the last chunk was read.
+    """
+    statement = (
+        select(*columns)
+        .order_by(Task.id)
+        .execution_options(yield_per=current_app.config["STREAM_CHUNK_SIZE"])
+    )
+    result = db.session.execute(statement, bind_arguments={"bind": read_engine()})
+    yield from result.partitions()
+
+
+def buffered(chunks, size=16384):
+    """Join small string chunks into writes of about size characters."""
+    buffer, length = [], 0
+    for chunk in chunks:
+        buffer.append(chunk)
+        length += len(chunk)
+        if length >= size:
+            yield "".join(buffer)
+            buffer, length = [], 0
+    if buffer:
+        yield "".join(buffer)
+
+
+def stream_index():
+    """Stream the index with every task, rendered while the rows are read."""
+    tasks = (task for chunk in stream_task_chunks() for task in chunk)
+    # Jinja yields a few bytes per loop iteration, buffered() turns that into
+    # fewer and larger writes.
+    return current_app.response_class(
+        buffered(
+            stream_template(
+                "index.html", tasks=tasks, prev_cursor=None, next_cursor=None
+            )
+        )
+    )
+
+
+def render_index(after, before, per_page):
+    tasks, prev_cursor, next_cursor = get_task_page(after, before, per_page)
+    return render_template(
+        "index.html", tasks=tasks, prev_cursor=prev_cursor, next_cursor=next_cursor
+    )
+
+
 @tasks_bp.route("/")
 def index():
-    tasks = Task.query.all()
-    return render_template("index.html", tasks=tasks)
+    after = request.args.get("after", type=int)
+    before = request.args.get("before", type=int)
+    per_page = current_app.config["TASKS_PER_PAGE"]
+
+    # The task_version counter changes with every write to the table, so it
+    # is the version token of the page. Conditional requests are answered
+    # after that one primary key lookup. The cache version only tracks the
+    # writes of this cache, with several workers or containers it can miss
+    # writes, so without the counter pages are cached but never validated.
+    version = task_version()
+    conditional = version is not None
+    if conditional:
+        etag = f"{version}-{per_page}-{after}-{before}"
+        last_modified = datetime.fromtimestamp(version / 1_000_000, timezone.utc)
+    else:
+        version = index_cache().version()
+
+    if conditional and not is_resource_modified(
+        request.environ, etag=etag, last_modified=last_modified
+    ):
+        response = make_response("", 304)
+    elif per_page == 0:
+        # A page with every task is too large to keep in the cache, and
+        # rendering it in one piece would hold all of it in memory.
+        response = stream_index()
+    else:
+        html, hit = index_cache().get_or_render(
+            f"index:{per_page}:{after}:{before}",
+            lambda: render_index(after, before, per_page),
+            version=version,
+        )
+        response = make_response(html)
+        response.headers["X-Cache"] = "HIT" if hit else "MISS"
+        metrics().inc(
+            "index_cache_requests_total", {"result": "hit" if hit else "miss"}
+        )
+
+    if conditional:
+        response.set_etag(etag)
+        response.last_modified = last_modified
+    # Browsers may keep the page but have to revalidate it on every load.
+    response.cache_control.no_cache = True
+    return response
+
+
+def csv_chunk(rows):
+    output = io.StringIO()
+    writer = csv.writer(output)
+    for row in rows:
+        created_at = row.created_at.isoformat() if row.created_at else ""
+        writer.writerow((row.id, row.title, created_at))
+    return output.getvalue()
+
+
+def jsonl_chunk(rows):
+    return "".join(
+        json.dumps(
+            {
+                "id": row.id,
+                "title": row.title,
+                "created_at": row.created_at.isoformat() if row.created_at else None,
+            }
+        )
+        + "\n"
+        for row in rows
+    )
+
+
+def export_response(header, format_chunk, mimetype, filename):
+    """Stream every task, one write per chunk of rows."""
+
+    def generate():
+        if header:
+            yield header
+        columns = (Task.id, Task.title, Task.created_at)
+        for rows in stream_task_chunks(columns):
+            yield format_chunk(rows)
+
+    response = current_app.response_class(
+        stream_with_context(generate()), mimetype=mimetype
+    )
+    response.headers["Content-Disposition"] = f"attachment; filename={filename}"
+    return response
+
+
+@tasks_bp.route("/export.csv")
+def export_csv():
+    return export_response(
+        "id,title,created_at\r\n", csv_chunk, "text/csv", "tasks.csv"
+    )
+
+
+@tasks_bp.route("/export.jsonl")
+def export_jsonl():
+    return export_response(None, jsonl_chunk, "application/x-ndjson", "tasks.jsonl")
+
+
+def create_task(title):
+    """Insert a task with one INSERT ... RETURNING and return its id.
+
+    No Task object is built, so nothing goes through the identity map.
+    """
+    return db.session.scalar(insert(Task).values(title=title).returning(Task.id))
+
+
+def add_task(title):
+    """Insert a task, commit it and return its id.
+
+    With GROUP_COMMIT the insert shares a transaction with the inserts of
+    other requests of this worker. Answers with a 503 when the insert was not
+    started within GROUP_COMMIT_TIMEOUT, the task is not created then.
+    """
+    committer = current_app.extensions["group_commit"]
+    if committer is None:
+        id = create_task(title)
+        db.session.commit()
+        return id
+    try:
+        return committer.insert({"title": title})
+    except FutureTimeoutError:
+        abort(503, "Too many tasks are being added, try again.")
+
+
+def delete_task(id):
+    """Delete a task with one DELETE statement and return the affected rows."""
+    return db.session.execute(sql_delete(Task).where(Task.id == id)).rowcount
+
+
+@tasks_bp.route("/search")
+def search():
+    query = request.args.get("q", "")
+    page = max(request.args.get("page", 1, type=int), 1)
+    tasks, has_next = search_tasks(query, page, page_size())
+    return render_template(
+        "search.html", query=query, tasks=tasks, page=page, has_next=has_next
+    )
 
 
 @tasks_bp.route("/add", methods=["POST"])
 def add():
     title = request.form.get("title")
-    new_task = Task(title=title)
-    db.session.add(new_task)
-    db.session.commit()
+    if not title:
+        abort(400)
+    add_task(title)
+    index_cache().invalidate()
     return redirect(url_for("tasks.index"))
 
 
 @tasks_bp.route("/delete/<int:id>")
 def delete(id):
-    task_to_delete = Task.query.get(id)
-    db.session.delete(task_to_delete)
+    deleted = delete_task(id)
     db.session.commit()
+    if not deleted:
+        abort(404)
+    index_cache().invalidate()
     return redirect(url_for("tasks.index"))
 
 
-app.register_blueprint(tasks_bp, url_prefix="/")
+def chunked(items, size):
+    for start in range(0, len(items), size):
+        yield items[start : start + size]
+
+
+def bulk_items(key):
+    """Return the list under key in the JSON body or abort with a 400."""
+    payload = request.get_json(silent=True)
+    if not isinstance(payload, dict) or not isinstance(payload.get(key), list):
+        abort(400, f'Expected a JSON object with a "{key}" list.')
+    return payload[key]
+
+
+def valid_title(title):
+    return isinstance(title, str) and 0 < len(title) <= 50
+
+
+def valid_id(id):
+    return isinstance(id, int) and not isinstance(id, bool)
+
+
+@tasks_bp.route("/bulk/add", methods=["POST"])
+def bulk_add():
+    titles = bulk_items("titles")
+    rows = [{"title": title} for title in titles if valid_title(title)]
+
+    # One multi row INSERT per chunk, all chunks in a single transaction.
+    ids = []
+    for chunk in chunked(rows, current_app.config["BULK_CHUNK_SIZE"]):
+        statement = insert(Task).returning(Task.id, sort_by_parameter_order=True)
+        ids.extend(db.session.scalars(statement, chunk).all())
+    db.session.commit()
+    if ids:
+        index_cache().invalidate()
+
+    new_ids = iter(ids)
+    results = []
+    for title in titles:
+        if valid_title(title):
+            results.append({"title": title, "id": next(new_ids), "status": "created"})
+        else:
+            results.append({"title": title, "status": "invalid"})
+    return jsonify(results=results, created=len(ids))
+
+
+@tasks_bp.route("/bulk/delete", methods=["POST"])
+def bulk_delete():
+    ids = bulk_items("ids")
+    valid_ids = list({id for id in ids if valid_id(id)})
+
+    # DELETE ... WHERE id IN (...) per chunk, all chunks in a single transaction.
+    deleted = set()
+    for chunk in chunked(valid_ids, current_app.config["BULK_CHUNK_SIZE"]):
+        statement = sql_delete(Task).where(Task.id.in_(chunk)).returning(Task.id)
+        deleted.update(db.session.scalars(statement).all())
+    db.session.commit()
+    if deleted:
+        index_cache().invalidate()
+
+    results = []
+    for id in ids:
+        if not valid_id(id):
+            status = "invalid"
+        elif id in deleted:
+            status = "deleted"
+        else:
+            status = "not_found"
+        results.append({"id": id, "status": status})
+    return jsonify(results=results, deleted=len(deleted))
+
+
+api_bp = Blueprint("api", __name__)
+
+
+@api_bp.errorhandler(HTTPException)
+def api_error(error):
+    return jsonify(error=error.description), error.code
+
+
+def task_json(row):
+    return {"id": row.id, "title": row.title}
+
+
+@api_bp.route("/tasks")
+def api_list_tasks():
+    limit = request.args.get("limit", page_size(), type=int)
+    tasks, prev_cursor, next_cursor = get_task_page(
+        after=request.args.get("after", type=int),
+        before=request.args.get("before", type=int),
+        per_page=max(1, min(limit, 1000)),
+        columns=(Task.id, Task.title),
+    )
+    return jsonify(
+        tasks=[task_json(task) for task in tasks], prev=prev_cursor, next=next_cursor
+    )
+
+
+@api_bp.route("/tasks", methods=["POST"])
+def api_create_task():
+    payload = request.get_json(silent=True)
+    title = payload.get("title") if isinstance(payload, dict) else None
+    if not valid_title(title):
+        abort(400, "title must be a string of 1 to 50 characters.")
+
+    id = add_task(title)
+    index_cache().invalidate()
+
+    response = jsonify(id=id, title=title)
+    response.status_code = 201
+    response.headers["Location"] = url_for("api.api_get_task", id=id)
+    return response
+
+
+@api_bp.route("/tasks/<int:id>")
+def api_get_task(id):
+    task = db.session.execute(
+        select(Task.id, Task.title).where(Task.id == id),
+        bind_arguments={"bind": read_engine()},
+    ).first()
+    if task is None:
+        abort(404, f"Task {id} not found.")
+    return jsonify(task_json(task))
+
+
+@api_bp.route("/tasks/<int:id>", methods=["DELETE"])
+def api_delete_task(id):
+    deleted = delete_task(id)
+    db.session.commit()
+    if not deleted:
+        abort(404, f"Task {id} not found.")
+    index_cache().invalidate()
+    return "", 204
+
+
+@lru_cache(maxsize=None)
+def static_file_hash(static_folder, filename):
+    file_path = safe_join(static_folder, filename)
+    if file_path is None or not path.isfile(file_path):
+        return None
+    with open(file_path, "rb") as file:
+        return sha256(file.read()).hexdigest()[:12]
+
+
+def static_fingerprint(endpoint, values):
+    if endpoint == "static" and "filename" in values and "v" not in values:
+        file_hash = static_file_hash(current_app.static_folder, values["filename"])
+        if file_hash is not None:
+            values["v"] = file_hash
+
+
+def cache_stats():
+    return jsonify(index_cache().stats())
+
+
+def healthz():
+    """Readiness for the Docker HEALTHCHECK, the task table has to answer."""
+    try:
+        db.session.execute(select(Task.id).limit(1))
+    except SQLAlchemyError:
+        return jsonify(status="unavailable"), 503
+    return jsonify(status="ok")
 
 
 if __name__ == "__main__":
     debug = environ.get("FLASK_DEBUG", False)
     host = environ.get("FLASK_HOST", "127.0.0.1")
     port = environ.get("FLASK_PORT", 5000)
-    app.run(debug=debug, host=host, port=port)
-else:
-    gunicorn_app = app
+    create_app().run(debug=debug, host=host, port=port)
@@ -0,0 +1,247 @@
+"""
+cache.py
+
+Cache for the rendered task list.
+
+The list only changes in add() and delete(), so the rendered index page is
+cached and every write bumps a version number that is part of the cache key.
+Old entries are never read again after a bump and age out through the TTL or
+the LRU size limit, so invalidation never has to find and delete keys.
+
+Versions are microsecond timestamps of the last write (bumped by at least one
+so they always increase). A new process or a new cache file starts at the
+current time, so a restart never hands out an old version again. The index
+keys its pages on the task_version counter of the database instead when the
+database has one (see migrations.py), that one also sees the writes of other
+workers and containers; the cache version is the fallback.
+
+Two backends are available:
+
+* memory: an OrderedDict LRU inside the worker process. Fastest, but every
+  gunicorn worker has its own copy and its own version number, so a write in
+  one worker is only seen by the others once their entries expire.
+* sqlite: a small SQLite file shared by all workers of a container. The
+  version number lives in the same file so a write in any worker invalidates
+  the page for all of them. A hit only records its use time when the stored
+  one is older than touch_interval, so hot reads do not all queue for the
+  write lock of the file and the LRU order is exact to that interval.
+"""
+
+from collections import OrderedDict
+import os
+import sqlite3
+import threading
+import time
+
+
+def now_version():
+    return time.time_ns() // 1000
+
+
+class MemoryCache:
+    """Size bounded LRU cache with a TTL, local to the process."""
+
+    def __init__(self, maxsize=256, ttl=60):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._version = now_version()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires = entry
+            if expires < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def get_version(self):
+        return self._version
+
+    def bump_version(self):
+        with self._lock:
+            self._version = max(self._version + 1, now_version())
+            return self._version
+
+
+class SQLiteCache:
+    """Size bounded LRU cache with a TTL, shared through a local SQLite file."""
+
+    def __init__(self, path, maxsize=256, ttl=60, touch_interval=1.0):
+        self.path = path
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.touch_interval = touch_interval
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache_entry "
+                "(key TEXT PRIMARY KEY, value TEXT, expires REAL, used REAL)"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache_meta "
+                "(name TEXT PRIMARY KEY, value INTEGER NOT NULL)"
+            )
+            conn.execute(
+                "INSERT OR IGNORE INTO cache_meta (name, value) VALUES ('version', ?)",
+                (now_version(),),
+            )
+
+    def _connect(self):
+        # One connection per thread, sqlite3 connections can't be shared.
+        # Connections opened before a fork (gunicorn preload_app) belong to
+        # the parent process and are replaced.
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            # Losing the cache on a crash is fine, it is rebuilt on the next
+            # request, so skip fsyncs entirely.
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=OFF")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def get(self, key):
+        conn = self._connect()
+        now = time.time()
+        row = conn.execute(
+            "SELECT value, used FROM cache_entry WHERE key = ? AND expires >= ?",
+            (key, now),
+        ).fetchone()
+        if row is None:
+            return None
+        value, used = row
+        # Reads only take the write lock once per interval and entry.
+        if now - used >= self.touch_interval:
+            conn.execute("UPDATE cache_entry SET used = ? WHERE key = ?", (now, key))
+        return value
+
+    def set(self, key, value):
+        conn = self._connect()
+        now = time.time()
+        conn.execute(
+            "INSERT OR REPLACE INTO cache_entry (key, value, expires, used) "
+            "VALUES (?, ?, ?, ?)",
+            (key, value, now + self.ttl, now),
+        )
+        conn.execute(
+            "DELETE FROM cache_entry WHERE key IN (SELECT key FROM cache_entry "
+            "ORDER BY used DESC LIMIT -1 OFFSET ?)",
+            (self.maxsize,),
+        )
+
+    def clear(self):
+        self._connect().execute("DELETE FROM cache_entry")
+
+    def get_version(self):
+        row = (
+            self._connect()
+            .execute("SELECT value FROM cache_meta WHERE name = 'version'")
+            .fetchone()
+        )
+        return row[0]
+
+    def bump_version(self):
+        return (
+            self._connect()
+            .execute(
+                "UPDATE cache_meta SET value = max(value + 1, ?) "
+                "WHERE name = 'version' RETURNING value",
+                (now_version(),),
+            )
+            .fetchone()[0]
+        )
+
+
+class NullCache(MemoryCache):
+    """Backend used when caching is turned off.
+
+    Nothing is stored, the version is tracked like in the other backends.
+    """
+
+    def get(self, key):
+        return None
+
+    def set(self, key, value):
+        pass
+
+
+class RenderCache:
+    """Versioned render cache that counts hits and misses.
+
+    The counters are per process, they are exposed by the /cache/stats route.
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+
+    def version(self):
+        """Current version, changes after every invalidate()."""
+        return self.backend.get_version()
+
+    def get_or_render(self, key, render, version=None):
+        """Return the cached value for key, calling render() on a miss.
+
+        Pass version when the caller already looked it up for this request.
+
+        Returns:
+        - tuple: (value, hit) where hit is True when the value was cached.
+        """
+        if version is None:
+            version = self.version()
+        versioned_key = f"v{version}:{key}"
+        value = self.backend.get(versioned_key)
+        if value is not None:
+            self.hits += 1
+            return value, True
+
+        self.misses += 1
+        value = render()
+        self.backend.set(versioned_key, value)
+        return value, False
+
+    def invalidate(self):
+        """Bump the version so every cached render is stale."""
+        return self.backend.bump_version()
+
+    def clear(self):
+        self.backend.clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "backend": type(self.backend).__name__,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+        }
+
+
+def make_cache(backend, path=None, maxsize=256, ttl=60):
+    """Create the RenderCache for the backend name: memory, sqlite or none."""
+    if backend == "memory":
+        return RenderCache(MemoryCache(maxsize=maxsize, ttl=ttl))
+    if backend == "sqlite":
+        return RenderCache(SQLiteCache(path, maxsize=maxsize, ttl=ttl))
+    if backend == "none":
+        return RenderCache(NullCache())
+    raise ValueError(f"Unknown cache backend: {backend}")
@@ -0,0 +1,127 @@
+"""
+database.py
+
+Engine configuration for the task app.
+
+The database is selected with DATABASE_URL, any SQLAlchemy URL works as long
+as its driver is installed (e.g. postgresql+psycopg://...). Reads can be sent
+to a replica with DATABASE_REPLICA_URL while writes always go to DATABASE_URL.
+Without DATABASE_URL the app falls back to SQLite, see database_uri().
+
+When SQLite is used all gunicorn workers in a container share one file, so
+the defaults here are picked for several processes writing to the same
+database:
+
+* WAL journal mode lets readers run while a writer commits.
+* synchronous=NORMAL only fsyncs at WAL checkpoints, which is safe in WAL mode.
+* busy_timeout makes a blocked writer wait for the lock instead of failing
+  straight away with "database is locked".
+* mmap_size lets reads come from the page cache instead of read() calls.
+
+Every setting can be overridden with an environment variable, the same way
+PROD_LIKE is read in app.py.
+"""
+
+from os import environ
+import sqlite3
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+# Default location of the database file shared by the workers of one container.
+PROD_LIKE_DATABASE = "/opt/simple-task-app/database/database.db"
+
+
+def database_uri(is_prod_like, env=environ):
+    """Return the primary database URI.
+
+    DATABASE_URL always wins. Otherwise prod like containers use one SQLite
+    file all workers connect to and everything else a per process in-memory
+    database.
+    """
+    if env.get("DATABASE_URL"):
+        return env["DATABASE_URL"]
+    if is_prod_like:
+        return "sqlite:///" + PROD_LIKE_DATABASE
+    return "sqlite:///:memory:"
+
+
+def replica_uri(env=environ):
+    """Return the read replica URI or None when reads use the primary."""
+    return env.get("DATABASE_REPLICA_URL") or None
+
+
+def sqlite_pragmas(env=environ):
+    """Return the PRAGMA statements applied to every new SQLite connection."""
+    return {
+        "journal_mode": env.get("SQLITE_JOURNAL_MODE", "WAL"),
+        "synchronous": env.get("SQLITE_SYNCHRONOUS", "NORMAL"),
+        "busy_timeout": int(env.get("SQLITE_BUSY_TIMEOUT", 5000)),
+        "mmap_size": int(env.get("SQLITE_MMAP_SIZE", 268435456)),
+    }
+
+
+def env_flag(name, default, env=environ):
+    """Read a true/false environment variable."""
+    return env.get(name, str(default)).lower() == "true"
+
+
+def is_memory_database(uri):
+    return uri in ("sqlite://", "sqlite:///:memory:")
+
+
+def engine_options(uri, env=environ):
+    """Build the SQLALCHEMY_ENGINE_OPTIONS for the given database URI.
+
+    In-memory SQLite is served by a single static connection, so the pool
+    settings only apply to file-backed and server databases.
+    """
+    if is_memory_database(uri):
+        return {}
+
+    # Server databases drop idle connections behind our back, SQLite files
+    # never do, so pre ping and recycling are only on by default for them.
+    is_sqlite = uri.startswith("sqlite")
+
+    # One gunicorn worker only serves one request at a time with sync workers,
+    # so a small pool is enough and keeps the connection count down. The total
+    # per container is workers * (pool_size + max_overflow).
+    return {
+        "pool_size": int(env.get("DB_POOL_SIZE", 2)),
+        "max_overflow": int(env.get("DB_MAX_OVERFLOW", 2)),
+        "pool_timeout": int(env.get("DB_POOL_TIMEOUT", 10)),
+        "pool_pre_ping": env_flag("DB_POOL_PRE_PING", not is_sqlite, env),
+        "pool_recycle": int(env.get("DB_POOL_RECYCLE", -1 if is_sqlite else 1800)),
+    }
+
+
+def database_binds(replica, env=environ):
+    """Return SQLALCHEMY_BINDS with the read replica, if one is configured."""
+    if replica is None:
+        return {}
+    return {"replica": {"url": replica, **engine_options(replica, env)}}
+
+
+def dispose_engines(engines):
+    """Drop pooled connections inherited from a parent process after a fork.
+
+    In-memory SQLite databases only exist on their one connection, so those
+    engines are left alone.
+    """
+    for engine in engines:
+        if engine.url.database not in (None, "", ":memory:"):
+            engine.dispose(close=False)
+
+
+@event.listens_for(Engine, "connect")
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    if not isinstance(dbapi_connection, sqlite3.Connection):
+        return
+
+    cursor = dbapi_connection.cursor()
+    for name, value in sqlite_pragmas().items():
+        # Values come from the environment of the container and not from user
+        # input, the PRAGMA syntax does not support bound parameters.
+        cursor.execute(f"PRAGMA {name}={value}")  # nosec B608
+    cursor.close()
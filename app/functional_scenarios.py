@@ -0,0 +1,66 @@
+"""
+functional_scenarios.py
+
+The task scenarios shared by the Selenium suite (test_selenium.py) and the
+in-process functional suite (test_functional.py).
+"""
+
+
+class TaskScenarios:
+    """The functional tests, run against the page self.driver has open.
+
+    self.driver is a Selenium WebDriver in test_selenium.py and an HtmlDriver
+    in test_functional.py, so the scenarios only use the part of the WebDriver
+    API HtmlDriver implements: find_element(s) by name or simple XPath,
+    send_keys(), click() and text.
+    """
+
+    ##########################
+    ## Functional Scenarios ##
+    ##########################
+
+    def test_add_task(self):
+        # Input task name and submit
+        input_element = self.driver.find_element("name", "title")
+        input_element.send_keys("Selenium Test Task")
+
+        submit_button = self.driver.find_element("xpath", "//form/button")
+        submit_button.click()
+
+        # Check if task is added successfully
+        tasks = self.driver.find_elements("xpath", "//ul/li/span")
+        self.assertEqual(len(tasks), 1)
+        self.assertEqual(tasks[0].text, "Selenium Test Task")
+
+    def test_task_order(self):
+        task_indices = range(1, 3)
+
+        # Iterate over the range to add tasks with different indices
+        for i in task_indices:
+            input_element = self.driver.find_element("name", "title")
+            input_element.send_keys(f"Selenium Test Task {i}")
+
+            submit_button = self.driver.find_element("xpath", "//form/button")
+            submit_button.click()
+
+        # Find all task
+        tasks = self.driver.find_elements("xpath", "//ul/li/span")
+
+        # Iterate over the range to assert the task text matches the expected values
+        for i in task_indices:
+            self.assertEqual(tasks[i - 1].text, f"Selenium Test Task {i}")
+
+    def test_delete_task(self):
+        # Add a task for deletion
+        input_element = self.driver.find_element("name", "title")
+        submit_button = self.driver.find_element("xpath", "//form/button")
+        input_element.send_keys("Task to Delete")
+        submit_button.click()
+
+        # Find the delete link and click it
+        delete_link = self.driver.find_element("xpath", "//ul/li/a")
+        delete_link.click()
+
+        # Verify that the task is deleted from the list
+        tasks = self.driver.find_elements("xpath", "//ul/li")
+        self.assertEqual(len(tasks), 0)
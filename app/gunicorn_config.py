@@ -1,5 +1,142 @@
 # gunicorn_config.py
-workers = 4
-timeout = 15
-bind = "0.0.0.0:8080"
+#
+# Worker settings are picked with environment variables so the same image can
+# be run with different worker models. GUNICORN_PROFILE selects one of:
+#
+#   sync      One request at a time per worker process (gunicorn default).
+#   gthread   GUNICORN_THREADS threads per worker, a slow SQLite write only
+#             blocks one thread instead of the whole worker.
+#   gevent    Greenlet workers, needs the gevent package installed.
+#   eventlet  Greenlet workers, needs the eventlet package installed.
+#
+# Neither gevent nor eventlet is a dependency of the app. The sqlite3 driver is
+# not cooperative, so with the default SQLite database a write still blocks
+# every greenlet of that worker. They are only worth it with DATABASE_URL
+# pointing at a server database and a driver that yields.
+#
+# benchmarks/worker_profiles.py compares the profiles.
+#
+# The default number of workers follows the CPUs the container may use (its
+# CPU affinity and cgroup quota, not the CPUs of the host) and is capped at
+# GUNICORN_MAX_WORKERS, 8 by default. Every worker is another writer of the
+# SQLite file and another metrics flusher, more than a few do not add
+# throughput. GUNICORN_WORKERS sets the number exactly, without the cap.
+import math
+import os
+from os import environ, path
+import tempfile
+
+profile = environ.get("GUNICORN_PROFILE", "sync")
+
+
+def cgroup_cpu_limit():
+    """Return the CPU quota of the container's cgroup, None without one."""
+    try:
+        # cgroup v2: "<quota> <period>" or "max <period>".
+        with open("/sys/fs/cgroup/cpu.max") as file:
+            quota, period = file.read().split()
+        if quota == "max":
+            return None
+        return int(quota) / int(period)
+    except (OSError, ValueError):
+        pass
+    try:
+        # cgroup v1, a quota of -1 means no limit.
+        with open("/sys/fs/cgroup/cpu/cpu.cfs_quota_us") as file:
+            quota = int(file.read())
+        with open("/sys/fs/cgroup/cpu/cpu.cfs_period_us") as file:
+            period = int(file.read())
+        return quota / period if quota > 0 else None
+    except (OSError, ValueError):
+        return None
+
+
+def available_cpus():
+    """Return the number of CPUs this process may run on, at least 1."""
+    if hasattr(os, "sched_getaffinity"):
+        cpus = len(os.sched_getaffinity(0))
+    else:  # Not available on macOS.
+        cpus = os.cpu_count() or 1
+    limit = cgroup_cpu_limit()
+    if limit is not None:
+        cpus = min(cpus, math.ceil(limit))
+    return max(cpus, 1)
+
+
+cpu_count = available_cpus()
+max_default_workers = int(environ.get("GUNICORN_MAX_WORKERS", 8))
+
+if profile == "sync":
+    worker_class = "sync"
+    default_workers = cpu_count * 2 + 1
+elif profile == "gthread":
+    worker_class = "gthread"
+    threads = int(environ.get("GUNICORN_THREADS", 4))
+    default_workers = cpu_count + 1
+elif profile in ("gevent", "eventlet"):
+    worker_class = profile
+    worker_connections = int(environ.get("GUNICORN_WORKER_CONNECTIONS", 100))
+    default_workers = cpu_count + 1
+else:
+    raise ValueError(f"Unknown GUNICORN_PROFILE: {profile}")
+
+workers = int(
+    environ.get("GUNICORN_WORKERS", min(default_workers, max_default_workers))
+)
+timeout = int(environ.get("GUNICORN_TIMEOUT", 15))
+keepalive = int(environ.get("GUNICORN_KEEPALIVE", 5))
+bind = f"0.0.0.0:{environ.get('PORT', 8080)}"
 accesslog = "-"  # Log to stdout
+
+# The workers share their /metrics data through files in this directory. It is
+# set here so it is in place before the app is loaded.
+environ.setdefault(
+    "METRICS_DIR", path.join(tempfile.gettempdir(), "simple-task-app-metrics")
+)
+
+# Restart workers after a number of requests to cap memory growth. The jitter
+# keeps all workers from restarting at the same moment.
+max_requests = int(environ.get("GUNICORN_MAX_REQUESTS", 1000))
+max_requests_jitter = int(environ.get("GUNICORN_MAX_REQUESTS_JITTER", 100))
+
+# Load the app once in the master and fork the workers from it, they share
+# the imported code copy-on-write and a recycled worker starts faster.
+preload_app = environ.get("GUNICORN_PRELOAD", "true").lower() == "true"
+
+
+def on_starting(server):
+    # Runs once in the master before any worker starts, so the schema
+    # migrations run once per deployment and not in every worker.
+    from app import create_app, db, init_db
+    from metrics import clear_directory
+
+    # Without METRICS_DIR the migration queries are not recorded and the
+    # master never starts a metrics flusher thread.
+    app = create_app({"METRICS_DIR": None})
+    init_db(app)
+    with app.app_context():
+        db.engine.dispose()
+
+    # Counters start from zero with every start of the server.
+    clear_directory(environ["METRICS_DIR"])
+
+
+def child_exit(server, worker):
+    # Runs in the master once a worker exited, recycled by max_requests or
+    # killed. Its metrics are kept in one file of all exited workers.
+    from metrics import fold_snapshot
+
+    fold_snapshot(environ["METRICS_DIR"], worker.pid)
+
+
+def post_fork(server, worker):
+    # With preload_app the database connections opened in the master would be
+    # shared by every worker, each worker has to start with its own.
+    if not server.cfg.preload_app:
+        return
+
+    from app import db
+    from database import dispose_engines
+
+    with server.app.wsgi().app_context():
+        dispose_engines(db.engines.values())
@@ -0,0 +1,187 @@
+"""
+html_driver.py
+
+A WebDriver stand-in that drives the app through Flask's test client.
+
+HtmlDriver parses every response with html.parser and implements the part
+of the Selenium WebDriver API the scenarios in functional_scenarios.py use:
+
+* get(url)
+* find_element(by, value) and find_elements(by, value) with by "name",
+  "tag name" or "xpath". XPath is limited to paths of tag names, e.g.
+  //ul/li/span: the first step matches anywhere in the page, every further
+  step a child of the one before.
+* send_keys(), click() and text on the elements.
+
+Clicking a link GETs its href, clicking a button submits its form with the
+values typed into its inputs. Redirects are followed like in a browser. No
+CSS or JavaScript is involved, so it checks what the server renders, not how
+a browser shows it.
+"""
+
+from html.parser import HTMLParser
+from urllib.parse import urlencode, urljoin, urlsplit
+
+from werkzeug.datastructures import MultiDict
+
+# Elements without a closing tag.
+VOID_TAGS = {"area", "br", "col", "embed", "hr", "img", "input", "link", "meta"}
+
+
+class NoSuchElementException(Exception):
+    """Raised by find_element() when nothing matches, like in Selenium."""
+
+
+class Element:
+    """An element of the parsed page."""
+
+    def __init__(self, driver, tag, attrs, parent):
+        self.driver = driver
+        self.tag_name = tag
+        self.attrs = dict(attrs)
+        self.parent = parent
+        self.children = []
+        self._text = []
+
+    @property
+    def text(self):
+        """The text of the element and its descendants, whitespace collapsed."""
+        return " ".join("".join(self._all_text()).split())
+
+    def _all_text(self):
+        yield from self._text
+        for child in self.children:
+            yield from child._all_text()
+
+    def get_attribute(self, name):
+        return self.attrs.get(name)
+
+    def send_keys(self, keys):
+        self.attrs["value"] = self.attrs.get("value", "") + keys
+
+    def click(self):
+        if self.tag_name == "a" and "href" in self.attrs:
+            self.driver.get(self.attrs["href"])
+        elif self.tag_name in ("button", "input") and self.form is not None:
+            self.form.submit()
+
+    def submit(self):
+        form = self if self.tag_name == "form" else self.form
+        method = form.attrs.get("method", "get").lower()
+        action = form.attrs.get("action") or self.driver.current_url
+        fields = [
+            (field.attrs["name"], field.attrs.get("value", ""))
+            for field in form.iter()
+            if field.tag_name in ("input", "textarea", "select")
+            and "name" in field.attrs
+        ]
+        if method == "post":
+            self.driver.open("POST", action, data=MultiDict(fields))
+        else:
+            self.driver.open("GET", f"{action}?{urlencode(fields)}")
+
+    @property
+    def form(self):
+        node = self.parent
+        while node is not None and node.tag_name != "form":
+            node = node.parent
+        return node
+
+    def iter(self):
+        """This element and all of its descendants in document order."""
+        yield self
+        for child in self.children:
+            yield from child.iter()
+
+    def find_element(self, by, value):
+        elements = self.find_elements(by, value)
+        if not elements:
+            raise NoSuchElementException(f"No element with {by} {value!r}")
+        return elements[0]
+
+    def find_elements(self, by, value):
+        if by == "name":
+            return [e for e in self.iter() if e.attrs.get("name") == value]
+        if by == "tag name":
+            return [e for e in self.iter() if e.tag_name == value]
+        if by == "xpath":
+            return self._xpath(value)
+        raise ValueError(f"Unsupported locator: {by}")
+
+    def _xpath(self, path):
+        if not path.startswith("//"):
+            raise ValueError(f"Unsupported XPath: {path}")
+        first, *rest = path[2:].split("/")
+        matches = [e for e in self.iter() if e is not self and e.tag_name == first]
+        for step in rest:
+            matches = [c for e in matches for c in e.children if c.tag_name == step]
+        return matches
+
+
+class PageParser(HTMLParser):
+    """Builds the Element tree of a page."""
+
+    def __init__(self, driver):
+        super().__init__(convert_charrefs=True)
+        self.root = Element(driver, "#document", {}, None)
+        self.current = self.root
+
+    def handle_starttag(self, tag, attrs):
+        element = Element(self.root.driver, tag, attrs, self.current)
+        self.current.children.append(element)
+        if tag not in VOID_TAGS:
+            self.current = element
+
+    def handle_startendtag(self, tag, attrs):
+        self.current.children.append(
+            Element(self.root.driver, tag, attrs, self.current)
+        )
+
+    def handle_endtag(self, tag):
+        # Close up to the matching element, forgiving unclosed children.
+        node = self.current
+        while node is not self.root and node.tag_name != tag:
+            node = node.parent
+        if node is not self.root:
+            self.current = node.parent
+
+    def handle_data(self, data):
+        self.current._text.append(data)
+
+
+class HtmlDriver:
+    """Drives a Flask app like a browser, see the module docstring."""
+
+    def __init__(self, client, max_redirects=5):
+        self.client = client
+        self.max_redirects = max_redirects
+        self.current_url = "/"
+        self.page = None
+        self.status_code = None
+
+    def get(self, url):
+        self.open("GET", url)
+
+    def open(self, method, url, data=None):
+        url = urljoin(self.current_url, url)
+        response = self.client.open(url, method=method, data=data)
+        for _ in range(self.max_redirects):
+            if response.status_code not in (301, 302, 303, 307, 308):
+                break
+            url = urljoin(url, response.headers["Location"])
+            response = self.client.get(url)
+        self.current_url = urlsplit(url)._replace(scheme="", netloc="").geturl()
+        self.status_code = response.status_code
+        parser = PageParser(self)
+        parser.feed(response.get_data(as_text=True))
+        parser.close()
+        self.page = parser.root
+
+    def find_element(self, by, value):
+        return self.page.find_element(by, value)
+
+    def find_elements(self, by, value):
+        return self.page.find_elements(by, value)
+
+    def quit(self):
+        self.page = None
@@ -0,0 +1,370 @@
+"""
+metrics.py
+
+Prometheus style metrics for the task app, served on /metrics.
+
+Collected per request:
+
+* http_request_duration_seconds: per blueprint endpoint, method and status.
+* db_query_duration_seconds: every SQL statement, from SQLAlchemy engine events.
+* template_render_duration_seconds: every Jinja render, from Flask signals.
+* db_pool_checkout_duration_seconds: time to get a connection from the pool.
+* index_cache_requests_total: hits and misses of the index render cache.
+
+gunicorn runs several worker processes and a scrape only reaches one of them.
+When METRICS_DIR is set every process writes a snapshot of its own metrics to
+a file in that directory, at most once per flush interval from a background
+thread, and /metrics adds up the files of all processes. When a worker exits,
+gunicorn's child_exit hook folds its file into one file of all exited workers
+(fold_snapshot()), so counters never go backwards and a scrape reads at most
+one file per live worker plus one, no matter how often workers were recycled.
+Without METRICS_DIR only the metrics of the current process are served.
+
+Recording a value is a dict update under a lock, the file writes happen off
+the request path, so this is cheap enough to leave on in production.
+"""
+
+from bisect import bisect_left
+from collections import defaultdict
+from contextlib import contextmanager
+import atexit
+import fcntl
+import json
+import logging
+import os
+from os import path
+import threading
+import time
+
+from flask import Response, before_render_template, g, has_request_context
+from flask import request, template_rendered
+from sqlalchemy import event
+
+# Snapshot of all exited workers, see fold_snapshot().
+EXITED_FILE = "metrics-exited.json"
+
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+METRICS = {
+    "http_request_duration_seconds": (
+        "histogram",
+        "Request duration by endpoint, method and status.",
+    ),
+    "db_query_duration_seconds": (
+        "histogram",
+        "SQL statement duration by endpoint and statement type.",
+    ),
+    "template_render_duration_seconds": (
+        "histogram",
+        "Jinja template render duration.",
+    ),
+    "db_pool_checkout_duration_seconds": (
+        "histogram",
+        "Time spent waiting for a database connection from the pool.",
+    ),
+    "index_cache_requests_total": (
+        "counter",
+        "Index render cache lookups by result.",
+    ),
+}
+
+
+def label_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+class Metrics:
+    """Counters and histograms of one process, see the module docstring."""
+
+    def __init__(self, directory=None, flush_interval=1.0):
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self._counters = defaultdict(float)
+        self._histograms = {}
+        self._flusher_pid = None
+
+    def inc(self, name, labels, value=1):
+        self._ensure_flusher()
+        with self._lock:
+            self._counters[(name, label_key(labels))] += value
+
+    def observe(self, name, labels, value):
+        self._ensure_flusher()
+        index = bisect_left(BUCKETS, value)
+        with self._lock:
+            key = (name, label_key(labels))
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = [[0] * (len(BUCKETS) + 1), 0.0]
+            histogram[0][index] += 1
+            histogram[1] += value
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "counters": [
+                    [name, list(labels), value]
+                    for (name, labels), value in self._counters.items()
+                ],
+                "histograms": [
+                    [name, list(labels), list(counts), total]
+                    for (name, labels), (counts, total) in self._histograms.items()
+                ],
+            }
+
+    def _snapshot_path(self, pid):
+        return path.join(self.directory, f"metrics-{pid}.json")
+
+    def _ensure_flusher(self):
+        # Started lazily so a forked gunicorn worker starts its own thread.
+        if self.directory is None or self._flusher_pid == os.getpid():
+            return
+        if self._flusher_pid is not None:
+            # Forked from a process that already recorded metrics, those are
+            # in the snapshot file of the parent and must not count twice.
+            with self._lock:
+                self._counters.clear()
+                self._histograms.clear()
+        self._flusher_pid = os.getpid()
+        os.makedirs(self.directory, exist_ok=True)
+        threading.Thread(target=self._flush_loop, daemon=True).start()
+        atexit.register(self.flush)
+
+    def _flush_loop(self):
+        while True:
+            time.sleep(self.flush_interval)
+            self.flush()
+
+    def flush(self):
+        """Write the snapshot of this process to METRICS_DIR."""
+        if self.directory is None:
+            return
+        file_path = self._snapshot_path(os.getpid())
+        tmp_path = file_path + ".tmp"
+        try:
+            with open(tmp_path, "w") as file:
+                json.dump(self.snapshot(), file)
+            os.replace(tmp_path, file_path)
+        except OSError as e:
+            # Metrics must never take a worker down, the next flush retries.
+            logging.warning(f"Unable to write metrics to {file_path}: {e}")
+
+    def collect(self):
+        """Merge the snapshots of all processes.
+
+        Returns:
+        - tuple: (counters, histograms) dicts keyed on (name, labels).
+        """
+        snapshots = [self.snapshot()]
+        if self.directory is not None and path.isdir(self.directory):
+            own_file = path.basename(self._snapshot_path(os.getpid()))
+            # A fold in between would count the exited worker twice or not at all.
+            with directory_lock(self.directory, fcntl.LOCK_SH):
+                for name in os.listdir(self.directory):
+                    if name == own_file or not name.endswith(".json"):
+                        continue
+                    snapshot = read_snapshot(path.join(self.directory, name))
+                    if snapshot is not None:
+                        snapshots.append(snapshot)
+        return merge_snapshots(snapshots)
+
+    def render(self):
+        """Return all metrics in the Prometheus text exposition format."""
+        counters, histograms = self.collect()
+        lines = []
+        for name, (kind, help_text) in METRICS.items():
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for (metric, labels), value in sorted(counters.items()):
+                if metric == name:
+                    lines.append(f"{name}{format_labels(labels)} {value}")
+            for (metric, labels), (counts, total) in sorted(histograms.items()):
+                if metric != name:
+                    continue
+                cumulative = 0
+                for bound, count in zip(BUCKETS + ("+Inf",), counts):
+                    cumulative += count
+                    bucket_labels = format_labels(labels + (("le", str(bound)),))
+                    lines.append(f"{name}_bucket{bucket_labels} {cumulative}")
+                lines.append(f"{name}_sum{format_labels(labels)} {total}")
+                lines.append(f"{name}_count{format_labels(labels)} {cumulative}")
+        return "\n".join(lines) + "\n"
+
+
+def read_snapshot(file_path):
+    try:
+        with open(file_path) as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return None  # Removed or replaced while reading.
+
+
+def merge_snapshots(snapshots):
+    """Add up snapshots.
+
+    Returns:
+    - tuple: (counters, histograms) dicts keyed on (name, labels).
+    """
+    counters = defaultdict(float)
+    histograms = {}
+    for snapshot in snapshots:
+        for name, labels, value in snapshot["counters"]:
+            counters[(name, tuple(map(tuple, labels)))] += value
+        for name, labels, counts, total in snapshot["histograms"]:
+            key = (name, tuple(map(tuple, labels)))
+            merged = histograms.setdefault(key, [[0] * len(counts), 0.0])
+            merged[0] = [a + b for a, b in zip(merged[0], counts)]
+            merged[1] += total
+    return counters, histograms
+
+
+@contextmanager
+def directory_lock(directory, operation):
+    """flock() on a lock file in the metrics directory, shared or exclusive."""
+    # Closing the file releases the lock.
+    with open(path.join(directory, "metrics.lock"), "a") as file:
+        fcntl.flock(file, operation)
+        yield
+
+
+def fold_snapshot(directory, pid):
+    """Add the snapshot of an exited worker to EXITED_FILE and remove it.
+
+    Called from gunicorn's child_exit hook in the master, after the worker
+    wrote its last snapshot on exit.
+    """
+    if directory is None:
+        return
+    worker_path = path.join(directory, f"metrics-{pid}.json")
+    if not path.exists(worker_path):
+        return
+    exited_path = path.join(directory, EXITED_FILE)
+    try:
+        with directory_lock(directory, fcntl.LOCK_EX):
+            snapshots = [read_snapshot(exited_path), read_snapshot(worker_path)]
+            counters, histograms = merge_snapshots(s for s in snapshots if s)
+            merged = {
+                "counters": [
+                    [name, list(labels), value]
+                    for (name, labels), value in counters.items()
+                ],
+                "histograms": [
+                    [name, list(labels), counts, total]
+                    for (name, labels), (counts, total) in histograms.items()
+                ],
+            }
+            with open(exited_path + ".tmp", "w") as file:
+                json.dump(merged, file)
+            os.replace(exited_path + ".tmp", exited_path)
+            os.remove(worker_path)
+    except OSError as e:
+        # The file of the worker stays, collect() still reads it.
+        logging.warning(f"Unable to fold metrics of worker {pid}: {e}")
+
+
+def format_labels(labels):
+    if not labels:
+        return ""
+    escaped = (
+        (key, str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for key, value in labels
+    )
+    return "{" + ",".join(f'{key}="{value}"' for key, value in escaped) + "}"
+
+
+def current_endpoint():
+    if has_request_context():
+        return request.endpoint or "none"
+    return "none"
+
+
+def clear_directory(directory):
+    """Remove the snapshots of an earlier run, e.g. when gunicorn starts."""
+    if directory is None or not path.isdir(directory):
+        return
+    for name in os.listdir(directory):
+        if name.startswith("metrics-"):
+            os.remove(path.join(directory, name))
+
+
+def instrument_engine(metrics, engine):
+    """Time connection checkouts and SQL statements of engine."""
+    raw_connection = engine.raw_connection
+
+    # The engine asks its pool for a connection through raw_connection(), the
+    # wrapper keeps working after engine.dispose() replaces the pool.
+    def timed_raw_connection(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return raw_connection(*args, **kwargs)
+        finally:
+            metrics.observe(
+                "db_pool_checkout_duration_seconds", {}, time.perf_counter() - start
+            )
+
+    engine.raw_connection = timed_raw_connection
+
+    # The start time lives on the execution context of the statement, a
+    # statement that raises leaves nothing behind on the pooled connection.
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, params, context, many):
+        context.metrics_query_start = time.perf_counter()
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, params, context, many):
+        elapsed = time.perf_counter() - context.metrics_query_start
+        operation = statement.lstrip().split(" ", 1)[0].upper()
+        if operation not in ("SELECT", "INSERT", "UPDATE", "DELETE"):
+            operation = "OTHER"
+        metrics.observe(
+            "db_query_duration_seconds",
+            {"endpoint": current_endpoint(), "operation": operation},
+            elapsed,
+        )
+
+
+def init_metrics(app, db, metrics):
+    """Register the request, template and SQL hooks and the /metrics route."""
+
+    @app.before_request
+    def start_timer():
+        g.metrics_start = time.perf_counter()
+
+    @app.after_request
+    def record_request(response):
+        start = g.pop("metrics_start", None)
+        if start is not None:
+            metrics.observe(
+                "http_request_duration_seconds",
+                {
+                    "endpoint": current_endpoint(),
+                    "method": request.method,
+                    "status": str(response.status_code),
+                },
+                time.perf_counter() - start,
+            )
+        return response
+
+    def start_render(sender, template, context, **extra):
+        g.setdefault("render_start", []).append(time.perf_counter())
+
+    def record_render(sender, template, context, **extra):
+        starts = g.get("render_start")
+        if starts:
+            metrics.observe(
+                "template_render_duration_seconds",
+                {"template": template.name or "string"},
+                time.perf_counter() - starts.pop(),
+            )
+
+    before_render_template.connect(start_render, app, weak=False)
+    template_rendered.connect(record_render, app, weak=False)
+
+    with app.app_context():
+        for engine in db.engines.values():
+            instrument_engine(metrics, engine)
+
+    @app.route("/metrics")
+    def metrics_endpoint():
+        return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
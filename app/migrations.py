@@ -0,0 +1,319 @@
+"""
+migrations.py
+
+Versioned schema migrations for the task app.
+
+Every migration has a version number, an upgrade and a downgrade function.
+The versions applied to a database are recorded in the schema_migrations
+table, so upgrade() only runs the ones that are missing and the same command
+can run on every deploy. Each migration runs in its own transaction together
+with its schema_migrations row, a failed migration leaves the database at the
+previous version and can simply be run again. pysqlite does not open a
+transaction for DDL on its own, migration_transaction() begins one explicitly.
+
+Several containers may start at the same time and all run upgrade(). Every
+migration takes a lock first (the SQLite write lock, an advisory lock on
+PostgreSQL) and checks again whether another process applied it meanwhile.
+
+The tables are defined here as they were at that version and not taken from
+the models, a migration must do the same thing no matter how the models look
+later on.
+
+Migrations run once per deployment, from gunicorn's on_starting hook or by
+hand:
+
+    flask --app app db upgrade
+    flask --app app db downgrade --to 1
+    flask --app app db current
+"""
+
+from collections import namedtuple
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from sqlalchemy import Column, DateTime, Index, Integer, MetaData, String, Table
+from sqlalchemy import delete, insert, inspect, select, text
+
+Migration = namedtuple("Migration", ["version", "description", "upgrade", "downgrade"])
+
+history = MetaData()
+
+schema_migrations = Table(
+    "schema_migrations",
+    history,
+    Column("version", Integer, primary_key=True, autoincrement=False),
+    Column("description", String(200), nullable=False),
+    Column("applied_at", DateTime, nullable=False),
+)
+
+
+def task_table(*columns):
+    """Return the task table with the columns it had at some version."""
+    return Table(
+        "task",
+        MetaData(),
+        Column("id", Integer, primary_key=True),
+        Column("title", String(50), nullable=False),
+        *columns,
+    )
+
+
+def create_task_table(conn):
+    # Databases from before the migrations already have the table from
+    # db.create_all(), checkfirst adopts those as version 1.
+    task_table().create(conn, checkfirst=True)
+
+
+def drop_task_table(conn):
+    task_table().drop(conn)
+
+
+def add_created_at(conn):
+    column_type = DateTime().compile(dialect=conn.dialect)
+    conn.execute(text(f"ALTER TABLE task ADD COLUMN created_at {column_type}"))
+
+    task = task_table(Column("created_at", DateTime))
+    # Ordered pagination by creation time, id breaks ties between tasks
+    # created in the same instant.
+    Index("ix_task_created_at_id", task.c.created_at, task.c.id).create(conn)
+    # Title lookups.
+    Index("ix_task_title", task.c.title).create(conn)
+
+
+def drop_created_at(conn):
+    conn.execute(text("DROP INDEX ix_task_title"))
+    conn.execute(text("DROP INDEX ix_task_created_at_id"))
+    conn.execute(text("ALTER TABLE task DROP COLUMN created_at"))
+
+
+# The FTS5 table only indexes task.title and reads the text from the task
+# table (external content), the triggers keep it in sync with every write path
+# including the bulk endpoints and writes from outside the app.
+TASK_FTS = [
+    "CREATE VIRTUAL TABLE task_fts USING fts5("
+    "title, content='task', content_rowid='id', prefix='2 3')",
+    "CREATE TRIGGER task_fts_insert AFTER INSERT ON task BEGIN "
+    "INSERT INTO task_fts (rowid, title) VALUES (new.id, new.title); END",
+    "CREATE TRIGGER task_fts_delete AFTER DELETE ON task BEGIN "
+    "INSERT INTO task_fts (task_fts, rowid, title) "
+    "VALUES ('delete', old.id, old.title); END",
+    "CREATE TRIGGER task_fts_update AFTER UPDATE OF title ON task BEGIN "
+    "INSERT INTO task_fts (task_fts, rowid, title) "
+    "VALUES ('delete', old.id, old.title); "
+    "INSERT INTO task_fts (rowid, title) VALUES (new.id, new.title); END",
+    # Index the tasks that already exist.
+    "INSERT INTO task_fts (task_fts) VALUES ('rebuild')",
+]
+
+
+def create_task_fts(conn):
+    # FTS5 only exists in SQLite, other databases search with LIKE.
+    if conn.dialect.name != "sqlite":
+        return
+    for statement in TASK_FTS:
+        conn.execute(text(statement))
+
+
+def drop_task_fts(conn):
+    if conn.dialect.name != "sqlite":
+        return
+    for trigger in ("task_fts_insert", "task_fts_delete", "task_fts_update"):
+        conn.execute(text(f"DROP TRIGGER IF EXISTS {trigger}"))
+    conn.execute(text("DROP TABLE IF EXISTS task_fts"))
+
+
+# Change counter of the task table. Every write to task bumps the version in
+# the same transaction, from any process, container or write path, so the
+# index derives its ETag from the database itself. The version is a
+# microsecond timestamp of the last write, bumped by at least one so it always
+# increases and also works as Last-Modified.
+TASK_VERSION_BUMP = (
+    "UPDATE task_version SET version = max(version + 1, "
+    "CAST((julianday('now') - 2440587.5) * 86400000000 AS INTEGER))"
+)
+TASK_VERSION = [
+    "CREATE TABLE task_version (id INTEGER PRIMARY KEY, version BIGINT NOT NULL)",
+    "INSERT INTO task_version (id, version) VALUES (1, 0)",
+    TASK_VERSION_BUMP,
+] + [
+    f"CREATE TRIGGER task_version_{operation.lower()} AFTER {operation} ON task "
+    f"BEGIN {TASK_VERSION_BUMP}; END"
+    for operation in ("INSERT", "DELETE", "UPDATE")
+]
+
+
+def create_task_version(conn):
+    # The triggers are SQLite syntax, other databases answer the index without
+    # conditional requests.
+    if conn.dialect.name != "sqlite":
+        return
+    for statement in TASK_VERSION:
+        conn.execute(text(statement))
+
+
+def drop_task_version(conn):
+    if conn.dialect.name != "sqlite":
+        return
+    for operation in ("insert", "delete", "update"):
+        conn.execute(text(f"DROP TRIGGER IF EXISTS task_version_{operation}"))
+    conn.execute(text("DROP TABLE IF EXISTS task_version"))
+
+
+MIGRATIONS = [
+    Migration(1, "Create the task table", create_task_table, drop_task_table),
+    Migration(
+        2,
+        "Add task.created_at and the created_at and title indexes",
+        add_created_at,
+        drop_created_at,
+    ),
+    Migration(3, "Add the task_fts full-text index", create_task_fts, drop_task_fts),
+    Migration(
+        4,
+        "Add the task_version change counter",
+        create_task_version,
+        drop_task_version,
+    ),
+]
+
+
+def latest_version():
+    return MIGRATIONS[-1].version
+
+
+def applied_versions(conn):
+    """Return the set of migration versions recorded in the database."""
+    if not inspect(conn).has_table("schema_migrations"):
+        return set()
+    return set(conn.scalars(select(schema_migrations.c.version)))
+
+
+def current_version(engine):
+    """Return the highest applied migration version, 0 for an empty database."""
+    with engine.connect() as conn:
+        return max(applied_versions(conn), default=0)
+
+
+# Key of the PostgreSQL advisory lock held while a migration runs.
+MIGRATION_LOCK_KEY = 7_226_172
+
+
+@contextmanager
+def migration_transaction(engine):
+    """Begin a transaction that also covers DDL and holds the migration lock."""
+    with engine.begin() as conn:
+        if conn.dialect.name == "sqlite":
+            # pysqlite only begins a transaction before INSERT, UPDATE and
+            # DELETE, so DDL would be committed statement by statement.
+            # IMMEDIATE takes the write lock right away, a second process
+            # migrating the same file waits for it (busy_timeout).
+            conn.exec_driver_sql("BEGIN IMMEDIATE")
+        elif conn.dialect.name == "postgresql":
+            conn.execute(
+                text("SELECT pg_advisory_xact_lock(:key)"),
+                {"key": MIGRATION_LOCK_KEY},
+            )
+        yield conn
+
+
+def upgrade(engine, target=None, migrations=MIGRATIONS):
+    """Apply the missing migrations up to target, by default all of them.
+
+    Returns:
+    - list: The versions that were applied.
+    """
+    target = migrations[-1].version if target is None else target
+    with engine.connect() as conn:
+        applied = applied_versions(conn)
+
+    done = []
+    for migration in migrations:
+        if migration.version > target or migration.version in applied:
+            continue
+        with migration_transaction(engine) as conn:
+            history.create_all(conn)
+            # Applied by another process while this one waited for the lock.
+            if migration.version in applied_versions(conn):
+                continue
+            migration.upgrade(conn)
+            conn.execute(
+                insert(schema_migrations).values(
+                    version=migration.version,
+                    description=migration.description,
+                    applied_at=datetime.now(timezone.utc).replace(tzinfo=None),
+                )
+            )
+        done.append(migration.version)
+    return done
+
+
+def downgrade(engine, target):
+    """Revert the applied migrations above target, newest first.
+
+    Returns:
+    - list: The versions that were reverted.
+    """
+    with engine.connect() as conn:
+        applied = applied_versions(conn)
+
+    done = []
+    for migration in reversed(MIGRATIONS):
+        if migration.version <= target or migration.version not in applied:
+            continue
+        with migration_transaction(engine) as conn:
+            if migration.version not in applied_versions(conn):
+                continue
+            migration.downgrade(conn)
+            conn.execute(
+                delete(schema_migrations).where(
+                    schema_migrations.c.version == migration.version
+                )
+            )
+        done.append(migration.version)
+    return done
+
+
+def explain_query_plan(conn, statement):
+    """Return the SQLite query plan of statement as a list of detail strings."""
+    compiled = statement.compile(
+        dialect=conn.dialect, compile_kwargs={"literal_binds": True}
+    )
+    rows = conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {compiled}")
+    return [row[3] for row in rows]
+
+
+def primary_engine():
+    return current_app.extensions["sqlalchemy"].engine
+
+
+@click.group("db")
+def migrations_cli():
+    """Manage the database schema."""
+
+
+@migrations_cli.command("upgrade")
+@click.option("--to", "target", type=int, help="Version to upgrade to.")
+@with_appcontext
+def upgrade_command(target):
+    """Apply the pending migrations."""
+    applied = upgrade(primary_engine(), target)
+    click.echo(f"Applied migrations: {applied or 'none'}")
+
+
+@migrations_cli.command("downgrade")
+@click.option("--to", "target", type=int, required=True, help="Version to keep.")
+@with_appcontext
+def downgrade_command(target):
+    """Revert the migrations above a version."""
+    reverted = downgrade(primary_engine(), target)
+    click.echo(f"Reverted migrations: {reverted or 'none'}")
+
+
+@migrations_cli.command("current")
+@with_appcontext
+def current_command():
+    """Show the schema version of the database."""
+    click.echo(current_version(primary_engine()))
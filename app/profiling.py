@@ -0,0 +1,204 @@
+#!/bin/python
+
+"""
+profiling.py
+
+Opt-in profiler for slow requests.
+
+Turned on with environment variables:
+
+* PROFILE_REQUESTS=true profiles every request.
+* PROFILE_SAMPLE_RATE=0.05 profiles a random 5% of the requests instead.
+* PROFILE_THRESHOLD_MS (default 500) only keeps profiles of requests that
+  took at least that long.
+* PROFILE_MODE is cprofile (default) or sampling.
+* PROFILE_DIR is where the profiles are written.
+
+cprofile mode writes a .pstats file per slow request, readable with pstats,
+snakeviz or flameprof. sampling mode records the stack of the request thread
+every PROFILE_INTERVAL_MS (default 5) and writes a .collapsed file in the
+"frame;frame;frame count" format flamegraph.pl and speedscope read. Sampling
+has a lower overhead and records real call stacks, cProfile records every
+call.
+
+cProfile can only be active once per process on Python 3.12 and up, so with
+threaded workers a request is skipped while another one is being profiled.
+
+Summarize the hottest functions across all captured requests with:
+
+    python profiling.py summarize /tmp/simple-task-app-profiles --top 20
+"""
+
+import argparse
+from collections import Counter
+import cProfile
+import os
+from os import path
+import pstats
+import random
+import sys
+import tempfile
+import threading
+import time
+
+from flask import g, request
+
+# Only one cProfile profiler can be enabled at a time.
+cprofile_lock = threading.Lock()
+
+
+def profiling_config(env=os.environ):
+    return {
+        "enabled": env.get("PROFILE_REQUESTS", "").lower() == "true",
+        "sample_rate": float(env.get("PROFILE_SAMPLE_RATE", 0)),
+        "threshold_ms": float(env.get("PROFILE_THRESHOLD_MS", 500)),
+        "mode": env.get("PROFILE_MODE", "cprofile"),
+        "interval_ms": float(env.get("PROFILE_INTERVAL_MS", 5)),
+        "directory": env.get(
+            "PROFILE_DIR", path.join(tempfile.gettempdir(), "simple-task-app-profiles")
+        ),
+    }
+
+
+class StackSampler:
+    """Record the stack of one thread at a fixed interval from another thread."""
+
+    def __init__(self, thread_id, interval):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(
+                    f"{code.co_name} ({code.co_filename}:{code.co_firstlineno})"
+                )
+                frame = frame.f_back
+            if stack:
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def dump(self, file_path):
+        with open(file_path, "w") as file:
+            for stack, count in self.stacks.most_common():
+                file.write(f"{stack} {count}\n")
+
+
+def init_profiling(app, config=None):
+    """Register the profiling hooks when profiling is turned on."""
+    config = config or profiling_config()
+    if not config["enabled"] and config["sample_rate"] <= 0:
+        return
+
+    os.makedirs(config["directory"], exist_ok=True)
+
+    @app.before_request
+    def start_profile():
+        # Not used for anything security related, only to pick requests.
+        sampled = random.random() < config["sample_rate"]  # nosec B311
+        if not (config["enabled"] or sampled):
+            return
+
+        if config["mode"] == "sampling":
+            profiler = StackSampler(threading.get_ident(), config["interval_ms"] / 1000)
+            profiler.start()
+        else:
+            if not cprofile_lock.acquire(blocking=False):
+                return
+            profiler = cProfile.Profile()
+            try:
+                profiler.enable()
+            except ValueError:
+                # Another profiling tool (e.g. a debugger) is already active.
+                cprofile_lock.release()
+                return
+        g.profiler = profiler
+        g.profile_start = time.perf_counter()
+
+    @app.teardown_request
+    def stop_profile(exc):
+        profiler = g.pop("profiler", None)
+        if profiler is None:
+            return
+
+        elapsed_ms = (time.perf_counter() - g.pop("profile_start")) * 1000
+        if isinstance(profiler, StackSampler):
+            profiler.stop()
+        else:
+            profiler.disable()
+            cprofile_lock.release()
+
+        if elapsed_ms < config["threshold_ms"]:
+            return
+
+        endpoint = (request.endpoint or "none").replace(".", "-")
+        name = f"{endpoint}-{time.time_ns()}-{os.getpid()}-{elapsed_ms:.0f}ms"
+        if isinstance(profiler, StackSampler):
+            profiler.dump(path.join(config["directory"], name + ".collapsed"))
+        else:
+            profiler.dump_stats(path.join(config["directory"], name + ".pstats"))
+
+
+def summarize(directory, top, sort):
+    """Print the hottest functions over all profiles in directory."""
+    files = sorted(os.listdir(directory))
+    pstats_files = [path.join(directory, f) for f in files if f.endswith(".pstats")]
+    collapsed_files = [
+        path.join(directory, f) for f in files if f.endswith(".collapsed")
+    ]
+
+    if pstats_files:
+        print(f"{len(pstats_files)} cProfile captures")
+        stats = pstats.Stats(*pstats_files)
+        stats.sort_stats(sort).print_stats(top)
+
+    if collapsed_files:
+        # The leaf of a sampled stack is the function that was running, the
+        # sum of leaves per function is its self time in samples.
+        self_samples, total_samples = Counter(), 0
+        for file_path in collapsed_files:
+            with open(file_path) as file:
+                for line in file:
+                    stack, count = line.rstrip("\n").rsplit(" ", 1)
+                    self_samples[stack.split(";")[-1]] += int(count)
+                    total_samples += int(count)
+
+        print(f"{len(collapsed_files)} sampling captures, {total_samples} samples")
+        for function, count in self_samples.most_common(top):
+            print(f"{count / total_samples:7.2%} {count:8d}  {function}")
+
+    if not pstats_files and not collapsed_files:
+        print(f"No profiles found in {directory}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Work with captured profiles.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    summary_parser = subparsers.add_parser(
+        "summarize", help="Show the hottest functions over all captured requests."
+    )
+    summary_parser.add_argument(
+        "directory", nargs="?", default=profiling_config()["directory"]
+    )
+    summary_parser.add_argument("--top", type=int, default=20)
+    summary_parser.add_argument(
+        "--sort",
+        default="tottime",
+        choices=["tottime", "cumulative", "ncalls"],
+        help="Sort order for cProfile captures",
+    )
+    args = parser.parse_args()
+
+    summarize(args.directory, args.top, args.sort)
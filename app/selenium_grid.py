@@ -0,0 +1,595 @@
+"""
+selenium_grid.py
+
+Docker and Selenium grid management for the Selenium tests, and a parallel
+runner for them.
+
+test_selenium.SeleniumTestCase starts a new app container per test and runs
+every test one after the other on a grid with a single session. The parallel
+runner keeps a warm pool instead: SELENIUM_SESSIONS app containers, each with
+its own browser session on one grid that allows that many sessions. The
+tests of test_selenium.PooledSeleniumTestCase are sharded round robin over
+the pool and every test starts by emptying the database of its container with
+`flask reset-db` instead of starting a new container.
+
+Environment:
+
+* IMAGE: the app image to test (required).
+* SELENIUM_SESSIONS: size of the pool, default 3.
+* LOCAL=true: use a local Chrome per session instead of the grid container.
+* SELENIUM_REMOTE_URL: use an already running grid or standalone Selenium
+  server instead of starting the grid container.
+* FORCE_GRID_RESET=true: replace a grid container left over from a run.
+* READY_TIMEOUT: seconds a container or URL may take to become ready,
+  default 60.
+
+Readiness comes from Docker health checks. The app and grid containers are
+started with a health check that runs every 250ms, and the runner waits for
+the health_status event of the container instead of polling with sleeps.
+URLs without a container behind them are polled with exponential backoff and
+jitter starting at a few milliseconds. The time spent in every setup phase
+is collected in `timings` and logged at the end of the run.
+
+Usage:
+    IMAGE=user/simple-task-app:latest python selenium_grid.py
+    IMAGE=user/simple-task-app:latest python selenium_grid.py --compare
+"""
+
+import argparse
+from collections import defaultdict, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing, contextmanager
+import logging
+import math
+import os
+import random
+import socket
+import threading
+import time
+import unittest
+
+import docker
+import requests
+from selenium import webdriver
+
+
+GRID_NAME = "selenium-standalone-chrome"
+
+READY_TIMEOUT = float(os.environ.get("READY_TIMEOUT", 60))
+
+# Docker takes the health check durations in nanoseconds.
+MS = 1_000_000
+
+APP_HEALTHCHECK = {
+    "test": ["CMD", "wget", "-q", "-O", "/dev/null", "http://127.0.0.1:8080/healthz"],
+    "interval": 250 * MS,
+    "timeout": 2000 * MS,
+    "retries": 3,
+    "start_period": 30000 * MS,
+}
+
+GRID_HEALTHCHECK = {
+    "test": [
+        "CMD-SHELL",
+        "curl -sf http://localhost:4444/status | grep -q '\"ready\": true'",
+    ],
+    "interval": 250 * MS,
+    "timeout": 2000 * MS,
+    "retries": 3,
+    "start_period": 60000 * MS,
+}
+
+
+class PhaseTimer:
+    """Collects the time spent per setup phase over a test run."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.durations = defaultdict(list)
+
+    @contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.durations[name].append(time.perf_counter() - start)
+
+    def report(self):
+        """Logs count, total, mean and max of every phase."""
+        for name, values in sorted(self.durations.items()):
+            logging.info(
+                f"phase {name}: {len(values)}x total {sum(values):.2f}s "
+                f"mean {sum(values) / len(values) * 1000:.0f}ms "
+                f"max {max(values) * 1000:.0f}ms"
+            )
+
+
+timings = PhaseTimer()
+
+
+def backoff_delays(initial=0.005, maximum=1.0):
+    """Yields exponentially growing delays with full jitter.
+
+    Full jitter (a random delay between 0 and the current step) keeps
+    parallel waiters from polling in lock step.
+    """
+    delay = initial
+    while True:
+        # Not used for anything security related.
+        yield random.uniform(0, delay)  # nosec B311
+        delay = min(delay * 2, maximum)
+
+
+def wait_for_url(url, timeout=READY_TIMEOUT, request_timeout=2):
+    """Polls url until it returns a 200, with backoff_delays() between tries.
+
+    Returns:
+        bool: True once the URL returned a 200, False after timeout seconds.
+    """
+    deadline = time.monotonic() + timeout
+    attempt = 0
+    for delay in backoff_delays():
+        attempt += 1
+        try:
+            response = requests.get(url, timeout=request_timeout)
+            if response.status_code == 200:
+                logging.info(f"URL {url} returned a 200 OK after {attempt} attempts.")
+                return True
+            logging.debug(
+                f"Attempt {attempt}: {url} returned a non-200 code: {response.status_code}."
+            )
+        except requests.RequestException as e:
+            logging.debug(f"Attempt {attempt}: Error accessing the URL {url}: {e}.")
+        if time.monotonic() + delay > deadline:
+            break
+        time.sleep(delay)
+
+    logging.critical(
+        f"Unable to get a 200 status code for the URL {url} within {timeout}s ({attempt} attempts)."
+    )
+    return False
+
+
+def find_free_port():
+    """Find and return a free port on the local machine."""
+    with closing(socket.socket(socket.AF_INET, socket.SOCK_STREAM)) as s:
+        s.bind(("", 0))
+        s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        port = s.getsockname()[1]
+        return port
+
+
+class DockerHelper:
+    """Utility class for managing Docker containers and images."""
+
+    def __init__(self, client=None) -> None:
+        """Initializes a new instance and sets up the Docker client.
+
+        Args:
+            client (docker.DockerClient): Client to use, from the environment by default.
+        """
+        self.client = client or docker.from_env()
+
+    def remove_container(self, container):
+        """Removes the specified Docker container.
+
+        Args:
+            container (str or docker.models.containers.Container): Container ID or object.
+
+        Raises:
+            docker.errors.NotFound: If the specified container is not found.
+            Exception: For other unexpected errors during container removal.
+        """
+        try:
+            if isinstance(container, str):
+                container = self.client.containers.get(container)
+            container.stop()
+            container.remove()
+            logging.info(f"Container '{container.name} {container.short_id}' removed.")
+        except docker.errors.NotFound:
+            logging.warn(f"Container '{container.name}' not found.")
+        except Exception as e:
+            logging.fatal(f"Docker helper Fatal Exception: {e}")
+
+    def container_exists(self, container_name):
+        """Checks if a Docker container with the given name exists.
+
+        Args:
+            container_name (str): Name of the Docker container.
+
+        Returns:
+            bool: True if the container exists, False otherwise.
+        """
+        try:
+            self.client.containers.get(container_name)
+            return True
+        except docker.errors.NotFound:
+            return False
+
+    def image_exists(self, image_name):
+        """Checks if a Docker image with the given name exists.
+
+        Args:
+            image_name (str): Name of the Docker image.
+
+        Returns:
+            bool: True if the image exists, False otherwise.
+        """
+        try:
+            self.client.images.get(image_name)
+            return True
+        except docker.errors.ImageNotFound:
+            return False
+
+    def ensure_image(self, image_name):
+        """Pulls the image unless it exists locally.
+
+        Args:
+            image_name (str): Name of the Docker image.
+
+        Raises:
+            Exception: If the image can not be found locally or remotely.
+        """
+        if self.image_exists(image_name):
+            return
+        try:
+            self.client.images.pull(image_name)
+            logging.info(f"Image '{image_name}' has been pulled successfully.")
+        except docker.errors.APIError:
+            raise Exception(
+                f"Unable to locate image '{image_name}' from local or remote."
+            )
+
+    def get_internal_ip(self, container):
+        """Retrieves the internal IP address of a Docker container.
+
+        The address comes from the inspect data the container object already
+        has, containers.run() returns it after the container started. It is
+        only inspected again when the network was not set up yet.
+
+        Args:
+            container (docker.models.containers.Container): Docker container object.
+
+        Returns:
+            str: Internal IP address of the container.
+        """
+        for _ in range(2):
+            networks = container.attrs["NetworkSettings"]["Networks"]
+            for network in networks.values():
+                if network.get("IPAddress"):
+                    return network["IPAddress"]
+            container.reload()
+        raise RuntimeError(f"Container '{container.name}' has no IP address.")
+
+    def wait_until_healthy(self, container, timeout=READY_TIMEOUT):
+        """Waits for the health check of a container to pass.
+
+        Subscribes to the health_status and die events of the container and
+        returns on the first healthy status, no polling involved.
+
+        Args:
+            container (docker.models.containers.Container): Docker container object.
+            timeout (float): Seconds to wait at most.
+
+        Returns:
+            bool: True once healthy, False if the container has no health check.
+
+        Raises:
+            RuntimeError: If the container turns unhealthy or exits.
+            TimeoutError: If it is not healthy within timeout.
+        """
+        # Events are replayed from a second before, so a status change between
+        # the inspect below and the subscription is not missed.
+        since = int(time.time()) - 1
+        deadline = time.time() + timeout
+
+        container.reload()
+        health = container.attrs["State"].get("Health")
+        if health is None:
+            return False
+        if health["Status"] == "healthy":
+            return True
+
+        events = self.client.events(
+            since=since,
+            until=math.ceil(deadline),
+            decode=True,
+            filters={"container": container.id, "event": ["health_status", "die"]},
+        )
+        try:
+            for event in events:
+                status = event.get("status", "")
+                if status == "health_status: healthy":
+                    return True
+                if status in ("health_status: unhealthy", "die"):
+                    logs = container.logs(tail=20).decode("utf-8", "replace")
+                    raise RuntimeError(
+                        f"Container '{container.name}' is {status}:\n{logs}"
+                    )
+        finally:
+            events.close()
+        raise TimeoutError(
+            f"Container '{container.name}' not healthy within {timeout}s."
+        )
+
+    def wait_until_ready(self, container, url, timeout=READY_TIMEOUT):
+        """Waits for the health check of container or, without one, for url.
+
+        Raises:
+            RuntimeError: If the container does not become ready.
+        """
+        if self.wait_until_healthy(container, timeout):
+            return
+        if not wait_for_url(url, timeout):
+            raise RuntimeError(f"Container '{container.name}' did not start.")
+
+
+def reset_database(container):
+    """Deletes every task in the database of an app container.
+
+    Args:
+        container (docker.models.containers.Container): App container object.
+
+    Raises:
+        RuntimeError: If the reset-db command fails.
+    """
+    with timings.phase("db_reset"):
+        result = container.exec_run(["flask", "--app", "app", "reset-db", "--yes"])
+    if result.exit_code != 0:
+        raise RuntimeError(
+            f"reset-db failed in {container.name}: {result.output.decode()}"
+        )
+
+
+def start_grid(docker_helper, sessions, force_reset=False):
+    """Starts the standalone Chrome grid container.
+
+    Args:
+        docker_helper (DockerHelper): Helper with the Docker client.
+        sessions (int): Number of browser sessions the grid runs at once.
+        force_reset (bool): Replace a grid container left over from a run.
+
+    Returns:
+        docker.models.containers.Container: The grid container, already
+        started but not necessarily ready yet.
+    """
+    logging.info(f"Starting selenium container: {GRID_NAME}")
+
+    if docker_helper.container_exists(GRID_NAME) and force_reset:
+        docker_helper.remove_container(GRID_NAME)
+
+    with timings.phase("grid_container_start"):
+        return docker_helper.client.containers.run(
+            name=GRID_NAME,
+            healthcheck=GRID_HEALTHCHECK,
+            image="selenium/standalone-chrome",
+            detach=True,
+            environment={
+                "SE_NODE_MAX_SESSIONS": str(sessions),
+                # The node limits the sessions to the number of CPUs otherwise.
+                "SE_NODE_OVERRIDE_MAX_SESSIONS": "true",
+                "SE_NODE_SESSION_TIMEOUT": "15",
+            },
+            ports={4444: 4444, 7900: 7900},
+            # Chrome needs more than the default 64MB of /dev/shm per session.
+            shm_size="2g",
+        )
+
+
+def run_app_container(docker_helper, image, name, port):
+    """Starts an app container with a fast health check on a local port."""
+    logging.info(f"Starting app container: {name}")
+    with timings.phase("app_container_start"):
+        return docker_helper.client.containers.run(
+            image,
+            name=name,
+            detach=True,
+            ports={8080: port},
+            healthcheck=APP_HEALTHCHECK,
+        )
+
+
+def new_driver(grid_url=None):
+    """Starts a browser session, a local Chrome when grid_url is None."""
+    with timings.phase("browser_session"):
+        if grid_url is None:
+            driver = webdriver.Chrome()
+        else:
+            driver = webdriver.Remote(
+                command_executor=grid_url, options=webdriver.ChromeOptions()
+            )
+        driver.set_window_size(1024, 768)
+    return driver
+
+
+Lease = namedtuple("Lease", ["container", "driver", "app_url"])
+
+
+class AppPool:
+    """Warm app containers, each with its own browser session.
+
+    Args:
+        docker_helper (DockerHelper): Helper with the Docker client.
+        image (str): App image to run.
+        size (int): Number of containers and sessions.
+        grid_url (str): Grid the sessions run on, None for a local Chrome.
+        driver_factory (callable): Starts a browser session for a grid URL.
+    """
+
+    def __init__(self, docker_helper, image, size, grid_url=None, driver_factory=None):
+        self.docker_helper = docker_helper
+        self.image = image
+        self.size = size
+        self.grid_url = grid_url
+        self.driver_factory = driver_factory or new_driver
+        self.name_pattern = f"{image.split(':')[0].replace('/', '-')}-selenium-"
+        self.leases = []
+
+    def _start_one(self, index):
+        port = find_free_port()
+        name = f"{self.name_pattern}pool-{index}-{port}"
+        container = run_app_container(self.docker_helper, self.image, name, port)
+        try:
+            if self.grid_url is None:
+                app_url = f"http://localhost:{port}"
+            else:
+                internal_ip = self.docker_helper.get_internal_ip(container)
+                app_url = f"http://{internal_ip}:8080"
+            with timings.phase("app_ready"):
+                self.docker_helper.wait_until_ready(
+                    container, f"http://localhost:{port}/healthz"
+                )
+            return Lease(container, self.driver_factory(self.grid_url), app_url)
+        except Exception:
+            self.docker_helper.remove_container(container)
+            raise
+
+    def start(self):
+        # Containers and sessions start in parallel, the warm up costs about
+        # as long as starting one of them.
+        with ThreadPoolExecutor(max_workers=self.size) as executor:
+            futures = [executor.submit(self._start_one, i) for i in range(self.size)]
+            for future in futures:
+                try:
+                    self.leases.append(future.result())
+                except Exception as e:
+                    logging.fatal(f"Unable to start pool member: {e}")
+        if not self.leases:
+            raise RuntimeError("No app container of the pool started.")
+        return self
+
+    def stop(self):
+        for lease in self.leases:
+            try:
+                lease.driver.quit()
+            except Exception as e:
+                logging.warning(f"Unable to quit browser session: {e}")
+            self.docker_helper.remove_container(lease.container)
+        self.leases = []
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def shard(tests, count):
+    """Split tests round robin into count lists."""
+    return [tests[i::count] for i in range(count)]
+
+
+def run_shard(tests, lease):
+    result = unittest.TestResult()
+    for test in tests:
+        test.lease = lease
+        started = time.perf_counter()
+        with timings.phase("test"):
+            test(result)
+        logging.info(
+            f"{test.id()} on {lease.container.name}: {time.perf_counter() - started:.1f}s"
+        )
+    return result
+
+
+def run_parallel(test_case, pool):
+    """Run the tests of test_case sharded over the leases of pool.
+
+    Returns:
+    - unittest.TestResult: The results of all shards merged.
+    """
+    tests = list(unittest.defaultTestLoader.loadTestsFromTestCase(test_case))
+    shards = shard(tests, len(pool.leases))
+    with ThreadPoolExecutor(max_workers=len(pool.leases)) as executor:
+        results = list(executor.map(run_shard, shards, pool.leases))
+
+    merged = unittest.TestResult()
+    for result in results:
+        merged.testsRun += result.testsRun
+        merged.failures.extend(result.failures)
+        merged.errors.extend(result.errors)
+        merged.skipped.extend(result.skipped)
+    return merged
+
+
+def run_serial(test_case):
+    """Run test_case the classic way, a new container per test."""
+    suite = unittest.defaultTestLoader.loadTestsFromTestCase(test_case)
+    return unittest.TextTestRunner(verbosity=2).run(suite)
+
+
+def report(name, result, elapsed):
+    status = "PASSED" if result.wasSuccessful() else "FAILED"
+    logging.info(
+        f"{name}: {result.testsRun} tests in {elapsed:.1f}s, "
+        f"{len(result.failures)} failures, {len(result.errors)} errors: {status}"
+    )
+    for test, trace in result.failures + result.errors:
+        logging.error(f"{test.id()}\n{trace}")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s - %(levelname)s - %(message)s",
+    )
+
+    parser = argparse.ArgumentParser(description="Run the Selenium tests in parallel.")
+    parser.add_argument(
+        "--sessions", type=int, default=int(os.environ.get("SELENIUM_SESSIONS", 3))
+    )
+    parser.add_argument(
+        "--compare",
+        action="store_true",
+        help="Also run the serial suite first and report the speedup.",
+    )
+    args = parser.parse_args()
+
+    import test_selenium
+
+    image = os.environ["IMAGE"]
+    local_mode = os.getenv("LOCAL", "").lower() == "true"
+    force_reset = os.getenv("FORCE_GRID_RESET", "").lower() == "true"
+
+    serial_elapsed = None
+    if args.compare:
+        start = time.perf_counter()
+        serial_result = run_serial(test_selenium.SeleniumTestCase)
+        serial_elapsed = time.perf_counter() - start
+        report("serial", serial_result, serial_elapsed)
+
+    docker_helper = DockerHelper()
+    docker_helper.ensure_image(image)
+
+    start = time.perf_counter()
+    grid = None
+    grid_url = os.environ.get("SELENIUM_REMOTE_URL")
+    if not local_mode and grid_url is None:
+        grid = start_grid(docker_helper, args.sessions, force_reset)
+        grid_url = f"http://{docker_helper.get_internal_ip(grid)}:4444"
+        with timings.phase("grid_ready"):
+            docker_helper.wait_until_ready(grid, "http://localhost:4444/status")
+    elif grid_url is not None:
+        with timings.phase("grid_ready"):
+            wait_for_url(grid_url + "/status")
+
+    try:
+        with AppPool(docker_helper, image, args.sessions, grid_url) as pool:
+            logging.info(f"Pool of {len(pool.leases)} ready.")
+            result = run_parallel(test_selenium.PooledSeleniumTestCase, pool)
+    finally:
+        if grid is not None:
+            docker_helper.remove_container(grid)
+    parallel_elapsed = time.perf_counter() - start
+    report(f"parallel x{args.sessions}", result, parallel_elapsed)
+    timings.report()
+
+    if serial_elapsed is not None:
+        logging.info(
+            f"Speedup: {serial_elapsed / parallel_elapsed:.2f}x "
+            f"({serial_elapsed:.1f}s serial, {parallel_elapsed:.1f}s parallel)"
+        )
+
+    raise SystemExit(0 if result.wasSuccessful() else 1)
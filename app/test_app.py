@@ -1,15 +1,70 @@
 import unittest
-from app import app, db, Task
+import atexit
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import redirect_stdout
+import csv
+import io
+import json
+import os
+from os import path
+import tempfile
+import threading
+import time
+
+from flask import Flask
+from sqlalchemy import create_engine, delete as sql_delete, event, inspect, select, text
+from sqlalchemy.exc import IntegrityError
+
+from app import (
+    create_app,
+    db,
+    init_db,
+    Task,
+    get_task_page,
+    search_tasks,
+    task_page_query,
+)
+from cache import MemoryCache, RenderCache, SQLiteCache
+from metrics import Metrics, fold_snapshot, instrument_engine
+from profiling import init_profiling, summarize
+from group_commit import FutureTimeoutError, GroupCommitter
+from database import database_binds, database_uri, engine_options
+from migrations import (
+    MIGRATIONS,
+    create_task_fts,
+    current_version,
+    downgrade,
+    explain_query_plan,
+    upgrade,
+)
+
+
+TEST_CONFIG = {
+    "TESTING": True,
+    "SQLALCHEMY_DATABASE_URI": "sqlite:///:memory:",
+    "DATABASE_REPLICA_URI": None,
+    "INDEX_CACHE": "memory",
+    "METRICS_DIR": None,
+}
+
+
+def insert_rows(uri, count):
+    """Insert rows one transaction at a time, like concurrent /add requests."""
+    engine = create_engine(uri, **engine_options(uri))
+    for i in range(count):
+        with engine.begin() as conn:
+            conn.execute(text("INSERT INTO task (title) VALUES (:t)"), {"t": str(i)})
+    engine.dispose()
+    return count
 
 
 class FlaskAppTestCase(unittest.TestCase):
     def setUp(self):
-        self.app = app.test_client()
-        with app.app_context():
-            db.create_all()
+        self.flask_app = create_app(TEST_CONFIG)
+        self.app = self.flask_app.test_client()
 
     def tearDown(self):
-        with app.app_context():
+        with self.flask_app.app_context():
             db.session.remove()
             db.drop_all()
 
@@ -20,23 +75,801 @@ class FlaskAppTestCase(unittest.TestCase):
     def test_add_task(self):
         response = self.app.post("/add", data={"title": "Test Task"})
         self.assertEqual(response.status_code, 302)  # 302 indicates a redirect
-        with app.app_context():
+        with self.flask_app.app_context():
             tasks = Task.query.all()
         self.assertEqual(len(tasks), 1)
         self.assertEqual(tasks[0].title, "Test Task")
+        self.assertIsNotNone(tasks[0].created_at)
 
     def test_delete_task(self):
         task = Task(title="Test Task")
-        with app.app_context():
+        with self.flask_app.app_context():
             db.session.add(task)
             db.session.commit()
 
         response = self.app.get("/delete/1")
         self.assertEqual(response.status_code, 302)  # 302 indicates a redirect
-        with app.app_context():
+        with self.flask_app.app_context():
             tasks = Task.query.all()
         self.assertEqual(len(tasks), 0)
 
+    def test_delete_missing_task(self):
+        response = self.app.get("/delete/1")
+        self.assertEqual(response.status_code, 404)
+
+    def test_add_task_without_title(self):
+        response = self.app.post("/add", data={})
+        self.assertEqual(response.status_code, 400)
+
+    def test_index_pagination(self):
+        with self.flask_app.app_context():
+            db.session.add_all([Task(title=f"Task {i}") for i in range(1, 6)])
+            db.session.commit()
+
+            tasks, prev_cursor, next_cursor = get_task_page(per_page=2)
+            self.assertEqual([t.id for t in tasks], [1, 2])
+            self.assertIsNone(prev_cursor)
+            self.assertEqual(next_cursor, 2)
+
+            tasks, prev_cursor, next_cursor = get_task_page(after=4, per_page=2)
+            self.assertEqual([t.id for t in tasks], [5])
+            self.assertEqual(prev_cursor, 5)
+            self.assertIsNone(next_cursor)
+
+            tasks, prev_cursor, next_cursor = get_task_page(before=3, per_page=2)
+            self.assertEqual([t.id for t in tasks], [1, 2])
+            self.assertIsNone(prev_cursor)
+            self.assertEqual(next_cursor, 2)
+
+    def test_index_page_links(self):
+        with self.flask_app.app_context():
+            db.session.add_all([Task(title=f"Task {i}") for i in range(1, 4)])
+            db.session.commit()
+
+        self.flask_app.config["TASKS_PER_PAGE"] = 2
+        response = self.app.get("/")
+        self.assertIn(b"Task 2", response.data)
+        self.assertNotIn(b"Task 3", response.data)
+        self.assertIn(b"/?after=2", response.data)
+
+        response = self.app.get("/?after=2")
+        self.assertIn(b"Task 3", response.data)
+        self.assertIn(b"/?before=3", response.data)
+
+    def test_index_cache(self):
+        response = self.app.get("/")
+        self.assertEqual(response.headers["X-Cache"], "MISS")
+        response = self.app.get("/")
+        self.assertEqual(response.headers["X-Cache"], "HIT")
+
+        self.app.post("/add", data={"title": "Cached Task"})
+        response = self.app.get("/")
+        self.assertEqual(response.headers["X-Cache"], "MISS")
+        self.assertIn(b"Cached Task", response.data)
+
+        stats = self.app.get("/cache/stats").get_json()
+        self.assertGreaterEqual(stats["hits"], 1)
+        self.assertGreaterEqual(stats["misses"], 2)
+
+    def test_index_conditional_get(self):
+        response = self.app.get("/")
+        etag = response.headers["ETag"]
+        self.assertIn("Last-Modified", response.headers)
+
+        response = self.app.get("/", headers={"If-None-Match": etag})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.data, b"")
+
+        self.app.post("/add", data={"title": "New Task"})
+        response = self.app.get("/", headers={"If-None-Match": etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response.headers["ETag"], etag)
+
+    def test_index_conditional_get_across_apps(self):
+        # Two apps on one database file stand in for two containers, each with
+        # its own index cache. A write in one changes the ETag of the other.
+        with tempfile.TemporaryDirectory() as tmpdir:
+            config = {
+                **TEST_CONFIG,
+                "SQLALCHEMY_DATABASE_URI": "sqlite:///" + path.join(tmpdir, "tasks.db"),
+            }
+            first, second = create_app(config), create_app(config)
+            init_db(first)
+            etag = second.test_client().get("/").headers["ETag"]
+
+            first.test_client().post("/add", data={"title": "From First"})
+            response = second.test_client().get("/", headers={"If-None-Match": etag})
+            for flask_app in (first, second):
+                with flask_app.app_context():
+                    db.session.remove()
+                    db.engine.dispose()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b"From First", response.data)
+        self.assertNotEqual(response.headers["ETag"], etag)
+
+    def test_index_without_task_version(self):
+        # Databases without the counter get no validators, the cache version
+        # can not see the writes of other workers.
+        with self.flask_app.app_context():
+            downgrade(db.engine, 3)
+        self.flask_app.extensions["task_version_tables"].clear()
+        response = self.app.get("/")
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn("ETag", response.headers)
+        self.assertNotIn("Last-Modified", response.headers)
+
+    def test_index_streaming(self):
+        self.app.post("/bulk/add", json={"titles": [f"Task {i}" for i in range(5)]})
+        self.flask_app.config["TASKS_PER_PAGE"] = 0
+        self.flask_app.config["STREAM_CHUNK_SIZE"] = 2
+
+        response = self.app.get("/")
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.is_streamed)
+        self.assertNotIn("X-Cache", response.headers)
+        for i in range(5):
+            self.assertIn(f"Task {i}".encode(), response.data)
+        self.assertNotIn(b"pagination", response.data)
+
+        response = self.app.get(
+            "/", headers={"If-None-Match": response.headers["ETag"]}
+        )
+        self.assertEqual(response.status_code, 304)
+
+    def test_export(self):
+        self.flask_app.config["STREAM_CHUNK_SIZE"] = 2
+        self.app.post("/bulk/add", json={"titles": ["One", 'Two, "quoted"', "Three"]})
+
+        response = self.app.get("/export.csv")
+        self.assertEqual(response.mimetype, "text/csv")
+        self.assertIn("attachment", response.headers["Content-Disposition"])
+        rows = list(csv.reader(io.StringIO(response.get_data(as_text=True))))
+        self.assertEqual(rows[0], ["id", "title", "created_at"])
+        self.assertEqual(
+            [row[:2] for row in rows[1:]],
+            [["1", "One"], ["2", 'Two, "quoted"'], ["3", "Three"]],
+        )
+
+        response = self.app.get("/export.jsonl")
+        lines = response.get_data(as_text=True).splitlines()
+        tasks = [json.loads(line) for line in lines]
+        self.assertEqual(
+            [task["title"] for task in tasks], ["One", 'Two, "quoted"', "Three"]
+        )
+        self.assertIsNotNone(tasks[0]["created_at"])
+
+    def test_static_fingerprint(self):
+        response = self.app.get("/")
+        self.assertRegex(response.data.decode(), r"styles\.css\?v=[0-9a-f]{12}")
+
+        response = self.app.get("/static/styles.css")
+        self.assertEqual(response.cache_control.max_age, 31536000)
+        response.close()
+
+    def test_bulk_add(self):
+        self.flask_app.config["BULK_CHUNK_SIZE"] = 2
+        response = self.app.post(
+            "/bulk/add", json={"titles": ["One", "", "Two", "Three", 4]}
+        )
+        self.assertEqual(response.status_code, 200)
+
+        data = response.get_json()
+        self.assertEqual(data["created"], 3)
+        statuses = [result["status"] for result in data["results"]]
+        self.assertEqual(
+            statuses, ["created", "invalid", "created", "created", "invalid"]
+        )
+        self.assertEqual([result.get("id") for result in data["results"]][2], 2)
+
+        with self.flask_app.app_context():
+            titles = [task.title for task in Task.query.order_by(Task.id)]
+        self.assertEqual(titles, ["One", "Two", "Three"])
+
+    def test_bulk_delete(self):
+        with self.flask_app.app_context():
+            db.session.add_all([Task(title=f"Task {i}") for i in range(1, 4)])
+            db.session.commit()
+
+        response = self.app.post("/bulk/delete", json={"ids": [1, 3, 7, "x"]})
+        data = response.get_json()
+        self.assertEqual(data["deleted"], 2)
+        statuses = [result["status"] for result in data["results"]]
+        self.assertEqual(statuses, ["deleted", "deleted", "not_found", "invalid"])
+
+        with self.flask_app.app_context():
+            self.assertEqual([task.id for task in Task.query.all()], [2])
+
+    def test_bulk_bad_payload(self):
+        response = self.app.post("/bulk/delete", json=[1, 2])
+        self.assertEqual(response.status_code, 400)
+
+    def test_api_create_and_get_task(self):
+        response = self.app.post("/api/v1/tasks", json={"title": "API Task"})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.get_json(), {"id": 1, "title": "API Task"})
+        self.assertEqual(response.headers["Location"], "/api/v1/tasks/1")
+
+        response = self.app.get("/api/v1/tasks/1")
+        self.assertEqual(response.get_json(), {"id": 1, "title": "API Task"})
+
+        response = self.app.post("/api/v1/tasks", json={"title": ""})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("error", response.get_json())
+
+    def test_api_list_tasks(self):
+        with self.flask_app.app_context():
+            db.session.add_all([Task(title=f"Task {i}") for i in range(1, 4)])
+            db.session.commit()
+
+        data = self.app.get("/api/v1/tasks?limit=2").get_json()
+        self.assertEqual([task["id"] for task in data["tasks"]], [1, 2])
+        self.assertIsNone(data["prev"])
+        self.assertEqual(data["next"], 2)
+
+        data = self.app.get("/api/v1/tasks?limit=2&after=2").get_json()
+        self.assertEqual(data["tasks"], [{"id": 3, "title": "Task 3"}])
+        self.assertIsNone(data["next"])
+
+    def test_api_delete_task(self):
+        self.app.post("/api/v1/tasks", json={"title": "API Task"})
+
+        response = self.app.delete("/api/v1/tasks/1")
+        self.assertEqual(response.status_code, 204)
+
+        response = self.app.delete("/api/v1/tasks/1")
+        self.assertEqual(response.status_code, 404)
+        response = self.app.get("/api/v1/tasks/1")
+        self.assertEqual(response.status_code, 404)
+
+    def test_healthz(self):
+        response = self.app.get("/healthz")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json(), {"status": "ok"})
+
+    def test_reset_db_command(self):
+        self.app.post("/bulk/add", json={"titles": ["One", "Two"]})
+        self.assertIn(b"One", self.app.get("/").data)
+
+        result = self.flask_app.test_cli_runner().invoke(args=["reset-db", "--yes"])
+        self.assertIn("Deleted 2 tasks.", result.output)
+        # The cached index is invalidated as well.
+        self.assertNotIn(b"One", self.app.get("/").data)
+
+    def test_search(self):
+        self.app.post(
+            "/bulk/add",
+            json={"titles": ["Buy groceries", "Buy milk", "Call mom", "Groceries"]},
+        )
+        response = self.app.get("/search?q=groc")
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b"Buy groceries", response.data)
+        self.assertIn(b"Groceries", response.data)
+        self.assertNotIn(b"Buy milk", response.data)
+
+        # Every word has to match.
+        response = self.app.get("/search?q=buy+milk")
+        self.assertIn(b"Buy milk", response.data)
+        self.assertNotIn(b"Buy groceries", response.data)
+
+    def test_search_ranking_and_pages(self):
+        with self.flask_app.app_context():
+            self.app.post(
+                "/bulk/add",
+                json={"titles": ["Paint the fence and the fence gate", "Paint"]},
+            )
+            tasks, has_next = search_tasks("fence", per_page=1)
+            self.assertEqual(
+                [t.title for t in tasks], ["Paint the fence and the fence gate"]
+            )
+            self.assertFalse(has_next)
+
+            tasks, has_next = search_tasks("paint", page=1, per_page=1)
+            # The shorter title is the better bm25 match.
+            self.assertEqual([t.title for t in tasks], ["Paint"])
+            self.assertTrue(has_next)
+            tasks, has_next = search_tasks("paint", page=2, per_page=1)
+            self.assertEqual(len(tasks), 1)
+            self.assertFalse(has_next)
+
+    def test_search_too_many_matches_for_ranking(self):
+        self.flask_app.config["SEARCH_RANK_LIMIT"] = 2
+        self.app.post("/bulk/add", json={"titles": ["Paint", "Paint it", "Paint"]})
+        with self.flask_app.app_context():
+            tasks, _ = search_tasks("paint")
+        self.assertEqual([t.id for t in tasks], [3, 2, 1])
+
+    def test_search_index_follows_deletes(self):
+        self.app.post("/add", data={"title": "Water plants"})
+        self.app.get("/delete/1")
+        response = self.app.get("/search?q=water")
+        self.assertIn(b"No tasks found.", response.data)
+
+    def test_search_query_syntax(self):
+        self.app.post("/add", data={"title": 'Fix "AND" bug-42'})
+        # FTS5 operators and quotes in the query are searched as plain words.
+        for query in ['"AND"', "bug-42", "fix AND", "NEAR(", "title:fix", "*"]:
+            response = self.app.get("/search", query_string={"q": query})
+            self.assertEqual(response.status_code, 200, query)
+        response = self.app.get("/search", query_string={"q": 'bug-42 "and'})
+        self.assertIn(b"bug-42", response.data)
+
+    def test_search_like_fallback(self):
+        self.app.post("/bulk/add", json={"titles": ["log_file", "logxfile", "Buy"]})
+        with self.flask_app.app_context():
+            tasks, _ = search_tasks("BU", use_fts=False)
+            self.assertEqual([t.title for t in tasks], ["Buy"])
+            # _ is matched literally and not as a LIKE wildcard.
+            tasks, _ = search_tasks("log_file", use_fts=False)
+            self.assertEqual([t.title for t in tasks], ["log_file"])
+
+    def test_metrics(self):
+        self.app.get("/")
+        self.app.get("/")
+        response = self.app.get("/metrics")
+        self.assertEqual(response.status_code, 200)
+
+        text = response.data.decode()
+        self.assertIn(
+            'http_request_duration_seconds_count{endpoint="tasks.index",'
+            'method="GET",status="200"}',
+            text,
+        )
+        self.assertIn("db_query_duration_seconds_bucket{", text)
+        self.assertIn(
+            'template_render_duration_seconds_sum{template="index.html"}', text
+        )
+        self.assertIn('index_cache_requests_total{result="hit"}', text)
+
+
+class MetricsTestCase(unittest.TestCase):
+    def test_multiprocess_merge(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            # Only the explicit flush below writes, not the background thread.
+            worker = Metrics(tmpdir, flush_interval=3600)
+            worker.inc("index_cache_requests_total", {"result": "hit"}, 2)
+            worker.observe("http_request_duration_seconds", {"endpoint": "x"}, 0.02)
+            worker.flush()
+
+            # Stand in for a second worker process reading the shared directory.
+            with open(path.join(tmpdir, "metrics-0.json"), "w") as file:
+                file.write(json.dumps(worker.snapshot()))
+
+            text = worker.render()
+            atexit.unregister(worker.flush)
+        self.assertIn('index_cache_requests_total{result="hit"} 4.0', text)
+        self.assertIn(
+            'http_request_duration_seconds_bucket{endpoint="x",le="0.025"} 2', text
+        )
+        self.assertIn('http_request_duration_seconds_count{endpoint="x"} 2', text)
+
+    def test_fold_exited_workers(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            worker = Metrics(tmpdir, flush_interval=3600)
+            worker.inc("index_cache_requests_total", {"result": "hit"})
+            worker.observe("http_request_duration_seconds", {"endpoint": "x"}, 0.02)
+            # Stand in for three recycled workers.
+            for pid in (1, 2, 3):
+                with open(path.join(tmpdir, f"metrics-{pid}.json"), "w") as file:
+                    file.write(json.dumps(worker.snapshot()))
+                fold_snapshot(tmpdir, pid)
+
+            files = sorted(n for n in os.listdir(tmpdir) if n.endswith(".json"))
+            text = worker.render()
+            atexit.unregister(worker.flush)
+        self.assertEqual(files, ["metrics-exited.json"])
+        self.assertIn('index_cache_requests_total{result="hit"} 4.0', text)
+        self.assertIn('http_request_duration_seconds_count{endpoint="x"} 4', text)
+
+    def test_failing_statements_are_timed(self):
+        engine = create_engine("sqlite://")
+        metrics = Metrics()
+        instrument_engine(metrics, engine)
+        with engine.connect() as conn:
+            for _ in range(3):
+                with self.assertRaises(Exception):
+                    conn.execute(text("SELECT * FROM missing"))
+            conn.execute(text("SELECT 1"))
+            # Nothing of the failed statements is left on the connection.
+            self.assertEqual(dict(conn.connection.info), {})
+        engine.dispose()
+        _, histograms = metrics.collect()
+        key = (
+            "db_query_duration_seconds",
+            (("endpoint", "none"), ("operation", "SELECT")),
+        )
+        self.assertEqual(sum(histograms[key][0]), 1)
+
+    def test_migrations_on_starting_record_nothing(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            metrics_dir = path.join(tmpdir, "metrics")
+            env = {
+                "DATABASE_URL": "sqlite:///" + path.join(tmpdir, "tasks.db"),
+                "METRICS_DIR": metrics_dir,
+            }
+            previous = {name: os.environ.get(name) for name in env}
+            os.environ.update(env)
+            threads = threading.active_count()
+            try:
+                import gunicorn_config
+
+                gunicorn_config.on_starting(None)
+            finally:
+                for name, value in previous.items():
+                    if value is None:
+                        os.environ.pop(name)
+                    else:
+                        os.environ[name] = value
+            # No flusher thread in the master that writes a snapshot later.
+            self.assertEqual(threading.active_count(), threads)
+            self.assertFalse(path.exists(metrics_dir) and os.listdir(metrics_dir))
+
+
+class ProfilingTestCase(unittest.TestCase):
+    def profile_requests(self, mode):
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        profiled_app = Flask(__name__)
+        init_profiling(
+            profiled_app,
+            {
+                "enabled": True,
+                "sample_rate": 0,
+                "threshold_ms": 20,
+                "mode": mode,
+                "interval_ms": 1,
+                "directory": tmpdir.name,
+            },
+        )
+
+        @profiled_app.route("/slow")
+        def slow():
+            time.sleep(0.05)
+            return "slow"
+
+        @profiled_app.route("/fast")
+        def fast():
+            return "fast"
+
+        client = profiled_app.test_client()
+        client.get("/slow")
+        client.get("/fast")
+        return tmpdir.name, os.listdir(tmpdir.name)
+
+    def test_cprofile_mode(self):
+        directory, files = self.profile_requests("cprofile")
+        self.assertEqual(len(files), 1)
+        self.assertTrue(files[0].startswith("slow-"))
+        self.assertTrue(files[0].endswith(".pstats"))
+
+        output = io.StringIO()
+        with redirect_stdout(output):
+            summarize(directory, 5, "tottime")
+        self.assertIn("1 cProfile captures", output.getvalue())
+
+    def test_sampling_mode(self):
+        directory, files = self.profile_requests("sampling")
+        self.assertEqual(len(files), 1)
+        self.assertTrue(files[0].endswith(".collapsed"))
+
+        output = io.StringIO()
+        with redirect_stdout(output):
+            summarize(directory, 5, "tottime")
+        self.assertIn("slow (", output.getvalue())
+
+
+class CacheBackendTestCase(unittest.TestCase):
+    def check_backend(self, backend):
+        cache = RenderCache(backend)
+        self.assertEqual(cache.get_or_render("a", lambda: "1"), ("1", False))
+        self.assertEqual(cache.get_or_render("a", lambda: "2"), ("1", True))
+
+        cache.invalidate()
+        self.assertEqual(cache.get_or_render("a", lambda: "3"), ("3", False))
+
+        # maxsize is 2, "a" was used last so "b" is evicted first.
+        cache.get_or_render("b", lambda: "b")
+        cache.get_or_render("a", lambda: "x")
+        cache.get_or_render("c", lambda: "c")
+        self.assertEqual(cache.get_or_render("a", lambda: "x"), ("3", True))
+        self.assertEqual(cache.get_or_render("b", lambda: "new"), ("new", False))
+
+    def test_memory_backend(self):
+        self.check_backend(MemoryCache(maxsize=2, ttl=60))
+
+    def test_sqlite_backend(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            cache_path = path.join(tmpdir, "cache.db")
+            self.check_backend(
+                SQLiteCache(cache_path, maxsize=2, ttl=60, touch_interval=0)
+            )
+
+            # A second instance stands in for another gunicorn worker.
+            other = SQLiteCache(cache_path, maxsize=2, ttl=60)
+            version = other.get_version()
+            SQLiteCache(cache_path).bump_version()
+            self.assertGreater(other.get_version(), version)
+
+    def test_sqlite_hits_do_not_write(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            backend = SQLiteCache(path.join(tmpdir, "cache.db"), touch_interval=60)
+            backend.set("a", "1")
+            conn = backend._connect()
+            changes = conn.total_changes
+            for _ in range(10):
+                self.assertEqual(backend.get("a"), "1")
+            self.assertEqual(conn.total_changes, changes)
+
+            backend.touch_interval = 0
+            backend.get("a")
+            self.assertEqual(conn.total_changes, changes + 1)
+
+    def test_ttl(self):
+        backend = MemoryCache(ttl=-1)
+        backend.set("a", "1")
+        self.assertIsNone(backend.get("a"))
+
+
+class DatabaseConcurrencyTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.uri = "sqlite:///" + path.join(self.tmpdir.name, "database.db")
+        self.engine = create_engine(self.uri, **engine_options(self.uri))
+        Task.metadata.create_all(self.engine)
+
+    def tearDown(self):
+        self.engine.dispose()
+        self.tmpdir.cleanup()
+
+    def test_sqlite_pragmas(self):
+        with self.engine.connect() as conn:
+            journal_mode = conn.execute(text("PRAGMA journal_mode")).scalar()
+            busy_timeout = conn.execute(text("PRAGMA busy_timeout")).scalar()
+        self.assertEqual(journal_mode, "wal")
+        self.assertEqual(busy_timeout, 5000)
+
+    def test_concurrent_writers(self):
+        # Four processes match the four gunicorn workers sharing one file.
+        # Without WAL and a busy timeout some of these commits fail with
+        # "database is locked".
+        workers, rows = 4, 100
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            written = pool.map(insert_rows, [self.uri] * workers, [rows] * workers)
+            self.assertEqual(sum(written), workers * rows)
+
+        with self.engine.connect() as conn:
+            count = conn.execute(text("SELECT count(*) FROM task")).scalar()
+        self.assertEqual(count, workers * rows)
+
+
+class DatabaseConfigTestCase(unittest.TestCase):
+    def test_database_uri(self):
+        self.assertEqual(database_uri(False, {}), "sqlite:///:memory:")
+        self.assertTrue(database_uri(True, {}).endswith("/database/database.db"))
+        env = {"DATABASE_URL": "postgresql+psycopg://db/tasks"}
+        self.assertEqual(database_uri(True, env), env["DATABASE_URL"])
+
+    def test_engine_options(self):
+        self.assertEqual(engine_options("sqlite:///:memory:", {}), {})
+
+        options = engine_options("postgresql+psycopg://db/tasks", {"DB_POOL_SIZE": "8"})
+        self.assertEqual(options["pool_size"], 8)
+        self.assertTrue(options["pool_pre_ping"])
+
+        options = engine_options("sqlite:///tasks.db", {})
+        self.assertFalse(options["pool_pre_ping"])
+
+    def test_database_binds(self):
+        self.assertEqual(database_binds(None, {}), {})
+        binds = database_binds("sqlite:///replica.db", {})
+        self.assertEqual(binds["replica"]["url"], "sqlite:///replica.db")
+
+    def test_reads_use_replica(self):
+        # A second SQLite file stands in for the replica. Writes go through the
+        # app to the primary and the index must only show what the replica has.
+        with tempfile.TemporaryDirectory() as tmpdir:
+            uri = "sqlite:///" + path.join(tmpdir, "replica.db")
+            replica = create_engine(uri)
+            Task.metadata.create_all(replica)
+            with replica.begin() as conn:
+                conn.execute(text("INSERT INTO task (title) VALUES ('Replica Task')"))
+            replica.dispose()
+
+            flask_app = create_app({**TEST_CONFIG, "DATABASE_REPLICA_URI": uri})
+            try:
+                client = flask_app.test_client()
+                client.post("/add", data={"title": "Primary Task"})
+                response = client.get("/")
+                with flask_app.app_context():
+                    db.session.remove()
+                    for engine in db.engines.values():
+                        engine.dispose()
+            finally:
+                # db is shared by every app of the module, the metadata of the
+                # bind would make drop_all() of later tests look for it.
+                db.metadatas.pop("replica", None)
+
+        self.assertIn(b"Replica Task", response.data)
+        self.assertNotIn(b"Primary Task", response.data)
+
+    def test_migrate_command(self):
+        # A file database is left alone by create_app, the schema is migrated
+        # once per deployment with flask db upgrade.
+        with tempfile.TemporaryDirectory() as tmpdir:
+            uri = "sqlite:///" + path.join(tmpdir, "tasks.db")
+            flask_app = create_app({**TEST_CONFIG, "SQLALCHEMY_DATABASE_URI": uri})
+            with flask_app.app_context():
+                self.assertFalse(db.inspect(db.engine).has_table("task"))
+
+            runner = flask_app.test_cli_runner()
+            result = runner.invoke(args=["db", "upgrade"])
+            self.assertIn("Applied migrations: [1, 2, 3, 4]", result.output)
+            result = runner.invoke(args=["db", "current"])
+            self.assertEqual(result.output.strip(), "4")
+            with flask_app.app_context():
+                self.assertTrue(db.inspect(db.engine).has_table("task"))
+                db.engine.dispose()
+
+
+class GroupCommitTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        uri = "sqlite:///" + path.join(self.tmpdir.name, "database.db")
+        self.engine = create_engine(uri, **engine_options(uri))
+        upgrade(self.engine)
+        self.commits = 0
+
+        @event.listens_for(self.engine, "commit")
+        def count_commit(conn):
+            self.commits += 1
+
+    def tearDown(self):
+        self.engine.dispose()
+        self.tmpdir.cleanup()
+
+    def test_concurrent_inserts_share_commits(self):
+        committer = GroupCommitter(self.engine, Task.__table__, window=0.05)
+        titles = [f"Task {i}" for i in range(40)]
+        with ThreadPoolExecutor(max_workers=20) as pool:
+            ids = list(pool.map(lambda t: committer.insert({"title": t}), titles))
+
+        with self.engine.connect() as conn:
+            rows = dict(conn.execute(text("SELECT id, title FROM task")).all())
+        # Every request got the id of its own row back.
+        self.assertEqual([rows[id] for id in ids], titles)
+        self.assertLess(self.commits, len(titles))
+
+    def test_failing_row_does_not_fail_the_batch(self):
+        committer = GroupCommitter(self.engine, Task.__table__, window=0.05)
+        good = committer.submit({"title": "Good"})
+        bad = committer.submit({"title": None})
+        self.assertIsInstance(good.result(5), int)
+        with self.assertRaises(IntegrityError):
+            bad.result(5)
+
+    def test_timeout_drops_the_row(self):
+        committer = GroupCommitter(self.engine, Task.__table__, timeout=0.01)
+        committer._ensure_writer = lambda: None  # No writer picks the row up.
+        with self.assertRaises(FutureTimeoutError):
+            committer.insert({"title": "Late"})
+
+        with self.engine.connect() as conn:
+            count = conn.execute(text("SELECT count(*) FROM task")).scalar()
+        self.assertEqual(count, 0)
+
+    def test_app_add(self):
+        flask_app = create_app({**TEST_CONFIG, "GROUP_COMMIT": True})
+        client = flask_app.test_client()
+        response = client.post("/api/v1/tasks", json={"title": "Grouped"})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(client.get("/api/v1/tasks/1").get_json()["title"], "Grouped")
+
+
+class MigrationTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        uri = "sqlite:///" + path.join(self.tmpdir.name, "database.db")
+        self.engine = create_engine(uri)
+
+    def tearDown(self):
+        self.engine.dispose()
+        self.tmpdir.cleanup()
+
+    def columns(self):
+        return {c["name"] for c in inspect(self.engine).get_columns("task")}
+
+    def indexes(self):
+        return {i["name"] for i in inspect(self.engine).get_indexes("task")}
+
+    def test_upgrade_matches_models(self):
+        self.assertEqual(upgrade(self.engine), [1, 2, 3, 4])
+        self.assertEqual(upgrade(self.engine), [])
+        self.assertEqual(current_version(self.engine), 4)
+        self.assertEqual(self.columns(), set(Task.__table__.columns.keys()))
+        self.assertEqual(self.indexes(), {i.name for i in Task.__table__.indexes})
+
+    def test_downgrade(self):
+        upgrade(self.engine)
+        with self.engine.begin() as conn:
+            conn.execute(text("INSERT INTO task (title) VALUES ('Kept')"))
+
+        self.assertEqual(downgrade(self.engine, 1), [4, 3, 2])
+        self.assertEqual(current_version(self.engine), 1)
+        self.assertEqual(self.columns(), {"id", "title"})
+        self.assertEqual(self.indexes(), set())
+
+        self.assertEqual(upgrade(self.engine), [2, 3, 4])
+        with self.engine.connect() as conn:
+            row = conn.execute(text("SELECT title, created_at FROM task")).one()
+        self.assertEqual(tuple(row), ("Kept", None))
+
+        self.assertEqual(downgrade(self.engine, 0), [4, 3, 2, 1])
+        self.assertFalse(inspect(self.engine).has_table("task"))
+
+    def test_failed_migration_can_run_again(self):
+        def fail_after_ddl(conn):
+            create_task_fts(conn)
+            raise RuntimeError("Failed halfway")
+
+        failing = MIGRATIONS[:2] + [MIGRATIONS[2]._replace(upgrade=fail_after_ddl)]
+        with self.assertRaises(RuntimeError):
+            upgrade(self.engine, migrations=failing)
+        self.assertEqual(current_version(self.engine), 2)
+        self.assertFalse(inspect(self.engine).has_table("task_fts"))
+
+        self.assertEqual(upgrade(self.engine), [3, 4])
+
+    def test_concurrent_upgrades(self):
+        # Containers starting together all run the migrations on_starting.
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            results = list(pool.map(upgrade, [self.engine] * 4))
+        self.assertEqual(
+            sorted(v for applied in results for v in applied), [1, 2, 3, 4]
+        )
+        self.assertEqual(current_version(self.engine), 4)
+
+    def test_adopts_database_without_migrations(self):
+        # Databases created by db.create_all() before there were migrations.
+        with self.engine.begin() as conn:
+            conn.execute(
+                text("CREATE TABLE task (id INTEGER PRIMARY KEY, title VARCHAR(50))")
+            )
+            conn.execute(text("INSERT INTO task (title) VALUES ('Old')"))
+
+        self.assertEqual(upgrade(self.engine), [1, 2, 3, 4])
+        with self.engine.connect() as conn:
+            count = conn.execute(text("SELECT count(*) FROM task")).scalar()
+            # Existing tasks are added to the full-text index.
+            match = conn.execute(
+                text("SELECT rowid FROM task_fts WHERE task_fts MATCH 'old'")
+            ).scalar()
+        self.assertEqual(count, 1)
+        self.assertEqual(match, 1)
+
+    def test_hot_queries_use_an_index(self):
+        upgrade(self.engine)
+        queries = {
+            "first page": task_page_query(per_page=50),
+            "next page": task_page_query(after=100, per_page=50),
+            "previous page": task_page_query(before=100, per_page=50),
+            "api page": task_page_query(after=100, columns=(Task.id, Task.title)),
+            "delete": sql_delete(Task).where(Task.id == 1),
+            "by title": select(Task).where(Task.title == "Task"),
+            "by created_at": select(Task).order_by(Task.created_at, Task.id),
+        }
+        with self.engine.connect() as conn:
+            for name, query in queries.items():
+                plan = " ".join(explain_query_plan(conn, query))
+                with self.subTest(name, plan=plan):
+                    self.assertNotIn("TEMP B-TREE", plan)
+                    self.assertTrue(
+                        "USING INTEGER PRIMARY KEY" in plan
+                        or "USING INDEX" in plan
+                        or "USING COVERING INDEX" in plan
+                        # The first page reads the table in rowid order.
+                        or plan == "SCAN task"
+                    )
+
 
 if __name__ == "__main__":
     unittest.main()
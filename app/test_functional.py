@@ -0,0 +1,153 @@
+"""
+test_functional.py
+
+The scenarios of functional_scenarios.py, run in process through Flask's
+test client and HtmlDriver instead of Docker and a browser.
+
+Every scenario runs once per configuration of the matrix below. Each test
+gets a fresh app on its own SQLite file, so the tests can run in any order
+and in separate processes:
+
+    python test_functional.py --workers 4
+
+runs every test of the matrix in a pool of worker processes, defaulting to
+one per CPU. python -m unittest test_functional runs them serially.
+"""
+
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import io
+import os
+from os import path
+import sys
+import tempfile
+import time
+import unittest
+
+from app import create_app, db, init_db
+from functional_scenarios import TaskScenarios
+from html_driver import HtmlDriver
+
+
+FUNCTIONAL_CONFIG = {
+    "TESTING": True,
+    "DATABASE_REPLICA_URI": None,
+    "INDEX_CACHE": "memory",
+    "METRICS_DIR": None,
+}
+
+
+class AppDriverTestCase(unittest.TestCase):
+    """A fresh app per test with self.driver on its index."""
+
+    config = {}
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        uri = "sqlite:///" + path.join(self.tmpdir.name, "database.db")
+        self.flask_app = create_app(
+            {**FUNCTIONAL_CONFIG, "SQLALCHEMY_DATABASE_URI": uri, **self.config}
+        )
+        init_db(self.flask_app)
+        self.driver = HtmlDriver(self.flask_app.test_client())
+        self.driver.get("/")
+
+    def tearDown(self):
+        self.driver.quit()
+        with self.flask_app.app_context():
+            db.session.remove()
+            db.engine.dispose()
+        self.tmpdir.cleanup()
+
+
+class FunctionalTestCase(TaskScenarios, AppDriverTestCase):
+    """The scenarios against the default configuration."""
+
+
+class StreamingFunctionalTestCase(FunctionalTestCase):
+    """The index streamed in one page, see stream_index()."""
+
+    config = {"TASKS_PER_PAGE": 0}
+
+
+class UncachedFunctionalTestCase(FunctionalTestCase):
+    config = {"INDEX_CACHE": "none"}
+
+
+class GroupCommitFunctionalTestCase(FunctionalTestCase):
+    config = {"GROUP_COMMIT": True}
+
+
+class HtmlDriverTestCase(AppDriverTestCase):
+    def test_search_form(self):
+        self.driver.find_element("name", "title").send_keys("Buy milk")
+        self.driver.find_element("xpath", "//form/button").click()
+
+        self.driver.find_element("name", "q").send_keys("milk")
+        self.driver.find_elements("xpath", "//form/button")[1].click()
+        self.assertTrue(self.driver.current_url.startswith("/search?q=milk"))
+        self.assertEqual(self.driver.status_code, 200)
+        self.assertIn("Buy milk", self.driver.find_element("tag name", "ul").text)
+
+    def test_xpath_steps_are_children(self):
+        # The spans are children of the li elements, not of the ul.
+        self.driver.find_element("name", "title").send_keys("Task")
+        self.driver.find_element("xpath", "//form/button").click()
+        self.assertEqual(len(self.driver.find_elements("xpath", "//ul/li/span")), 1)
+        self.assertEqual(self.driver.find_elements("xpath", "//ul/span"), [])
+
+
+def run_test(test_id):
+    """Run one test by id in this process.
+
+    Returns:
+    - tuple: The test id, whether it passed, its output and its duration.
+    """
+    stream = io.StringIO()
+    test = unittest.defaultTestLoader.loadTestsFromName(test_id)
+    started = time.perf_counter()
+    result = unittest.TextTestRunner(stream=stream, verbosity=0).run(test)
+    elapsed = time.perf_counter() - started
+    return test_id, result.wasSuccessful(), stream.getvalue(), elapsed
+
+
+def iter_test_ids(suite):
+    for test in suite:
+        if isinstance(test, unittest.TestSuite):
+            yield from iter_test_ids(test)
+        else:
+            yield test.id()
+
+
+def run_parallel(workers):
+    """Run every test of this module in a pool of worker processes.
+
+    Returns:
+    - bool: True if all tests passed.
+    """
+    # Loaded by name, so the ids are the same in the workers as here.
+    suite = unittest.defaultTestLoader.loadTestsFromName("test_functional")
+    ids = list(iter_test_ids(suite))
+    started = time.perf_counter()
+    failed = []
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for test_id, passed, output, elapsed in executor.map(run_test, ids):
+            print(f"{test_id} ... {'ok' if passed else 'FAIL'} ({elapsed:.2f}s)")
+            if not passed:
+                failed.append((test_id, output))
+
+    for test_id, output in failed:
+        print(f"\n{'=' * 70}\n{test_id}\n{output}")
+    print(
+        f"\nRan {len(ids)} tests on {workers} workers in "
+        f"{time.perf_counter() - started:.2f}s: "
+        + (f"{len(failed)} FAILED" if failed else "OK")
+    )
+    return not failed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the functional tests.")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    args = parser.parse_args()
+    sys.exit(0 if run_parallel(args.workers) else 1)
@@ -0,0 +1,264 @@
+import unittest
+from http.server import BaseHTTPRequestHandler, HTTPServer
+import threading
+import time
+
+import docker
+
+from selenium_grid import (
+    AppPool,
+    DockerHelper,
+    Lease,
+    backoff_delays,
+    find_free_port,
+    run_parallel,
+    shard,
+    wait_for_url,
+)
+
+
+# Stand-ins for the Docker client and the browser, they record what the grid
+# code asks of them and answer like a local Docker daemon would.
+
+
+class FakeEvents:
+    def __init__(self, events):
+        self.events = events
+        self.closed = False
+
+    def __iter__(self):
+        return iter(self.events)
+
+    def close(self):
+        self.closed = True
+
+
+class FakeContainer:
+    def __init__(self, name, health="starting", ip="172.17.0.2", events=()):
+        self.name = name
+        self.id = f"id-{name}"
+        self.short_id = self.id[:10]
+        self.attrs = {
+            "State": {"Health": {"Status": health}} if health else {},
+            "NetworkSettings": {"Networks": {"bridge": {"IPAddress": ip}}},
+        }
+        self.events = list(events)
+        self.removed = False
+
+    def reload(self):
+        pass
+
+    def logs(self, tail):
+        return b"Booting worker"
+
+    def stop(self):
+        pass
+
+    def remove(self):
+        self.removed = True
+
+
+class FakeContainers:
+    def __init__(self, client):
+        self.client = client
+
+    def run(self, image, name, **kwargs):
+        container = self.client.make_container(name)
+        self.client.started.append(container)
+        return container
+
+    def get(self, name):
+        for container in self.client.started:
+            if container.name == name:
+                return container
+        raise docker.errors.NotFound(name)
+
+
+class FakeClient:
+    def __init__(self, make_container=None):
+        self.make_container = make_container or (
+            lambda name: FakeContainer(name, events=[healthy()])
+        )
+        self.containers = FakeContainers(self)
+        self.started = []
+        self.event_streams = []
+
+    def events(self, since, until, decode, filters):
+        (container,) = [c for c in self.started if c.id == filters["container"]]
+        stream = FakeEvents(container.events)
+        self.event_streams.append((filters, stream))
+        return stream
+
+
+class FakeDriver:
+    def __init__(self, grid_url):
+        self.grid_url = grid_url
+        self.quit_called = False
+
+    def quit(self):
+        self.quit_called = True
+
+
+def healthy():
+    return {"status": "health_status: healthy"}
+
+
+class BackoffTestCase(unittest.TestCase):
+    def test_delays_grow_up_to_maximum(self):
+        delays = backoff_delays(initial=0.01, maximum=0.08)
+        for step in (0.01, 0.02, 0.04, 0.08, 0.08, 0.08):
+            self.assertTrue(0 <= next(delays) <= step)
+
+    def test_wait_for_url_gives_up_at_the_deadline(self):
+        # Nothing listens on the port, every attempt fails straight away.
+        url = f"http://127.0.0.1:{find_free_port()}/healthz"
+        start = time.monotonic()
+        self.assertFalse(wait_for_url(url, timeout=0.3, request_timeout=0.1))
+        self.assertLess(time.monotonic() - start, 0.3 + 0.1)
+
+    def test_wait_for_url_retries_until_200(self):
+        attempts = []
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                attempts.append(self.path)
+                self.send_response(200 if len(attempts) >= 3 else 503)
+                self.end_headers()
+
+            def log_message(self, *args):
+                pass
+
+        server = HTTPServer(("127.0.0.1", 0), Handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        try:
+            url = f"http://127.0.0.1:{server.server_port}/healthz"
+            self.assertTrue(wait_for_url(url, timeout=5))
+        finally:
+            server.shutdown()
+            server.server_close()
+        self.assertEqual(len(attempts), 3)
+
+
+class WaitUntilHealthyTestCase(unittest.TestCase):
+    def wait(self, container, timeout=5):
+        client = FakeClient()
+        client.started.append(container)
+        self.client = client
+        return DockerHelper(client).wait_until_healthy(container, timeout)
+
+    def test_already_healthy(self):
+        self.assertTrue(self.wait(FakeContainer("app", health="healthy")))
+        self.assertEqual(self.client.event_streams, [])
+
+    def test_without_health_check(self):
+        self.assertFalse(self.wait(FakeContainer("app", health=None)))
+
+    def test_healthy_event(self):
+        container = FakeContainer(
+            "app", events=[{"status": "health_status: starting"}, healthy()]
+        )
+        self.assertTrue(self.wait(container))
+        filters, stream = self.client.event_streams[0]
+        self.assertEqual(filters["container"], container.id)
+        self.assertEqual(filters["event"], ["health_status", "die"])
+        self.assertTrue(stream.closed)
+
+    def test_unhealthy_event(self):
+        container = FakeContainer(
+            "app", events=[{"status": "health_status: unhealthy"}]
+        )
+        with self.assertRaisesRegex(RuntimeError, "unhealthy:\nBooting worker"):
+            self.wait(container)
+        self.assertTrue(self.client.event_streams[0][1].closed)
+
+    def test_die_event(self):
+        container = FakeContainer("app", events=[{"status": "die"}])
+        with self.assertRaisesRegex(RuntimeError, "is die"):
+            self.wait(container)
+
+    def test_timeout(self):
+        # The daemon ends the stream at until= without a healthy status.
+        with self.assertRaises(TimeoutError):
+            self.wait(FakeContainer("app"), timeout=0.1)
+
+
+class AppPoolTestCase(unittest.TestCase):
+    def test_start_skips_failed_member(self):
+        def make_container(name):
+            events = [{"status": "die"}] if "-pool-1-" in name else [healthy()]
+            return FakeContainer(name, events=events)
+
+        client = FakeClient(make_container)
+        pool = AppPool(
+            DockerHelper(client),
+            "user/simple-task-app:latest",
+            3,
+            grid_url="http://grid:4444",
+            driver_factory=FakeDriver,
+        )
+        with pool:
+            self.assertEqual(len(pool.leases), 2)
+            for lease in pool.leases:
+                self.assertEqual(lease.app_url, "http://172.17.0.2:8080")
+                self.assertEqual(lease.driver.grid_url, "http://grid:4444")
+            drivers = [lease.driver for lease in pool.leases]
+
+        # The failed member is removed right away, the others on stop().
+        self.assertTrue(all(container.removed for container in client.started))
+        self.assertTrue(all(driver.quit_called for driver in drivers))
+
+    def test_start_fails_without_members(self):
+        client = FakeClient(
+            lambda name: FakeContainer(name, events=[{"status": "die"}])
+        )
+        pool = AppPool(DockerHelper(client), "app:latest", 2, driver_factory=FakeDriver)
+        with self.assertRaisesRegex(RuntimeError, "No app container"):
+            pool.start()
+
+
+class ParallelRunTestCase(unittest.TestCase):
+    def test_shard(self):
+        self.assertEqual(shard(list(range(7)), 3), [[0, 3, 6], [1, 4], [2, 5]])
+
+    def test_run_parallel_merges_results(self):
+        seen = []
+
+        class Scenarios(unittest.TestCase):
+            lease = None
+
+            def test_pass_1(self):
+                seen.append((self._testMethodName, self.lease.app_url))
+
+            def test_pass_2(self):
+                seen.append((self._testMethodName, self.lease.app_url))
+
+            def test_fail(self):
+                self.fail("failed")
+
+            def test_error(self):
+                raise ValueError("error")
+
+            @unittest.skip("skipped")
+            def test_skip(self):
+                pass
+
+        class Pool:
+            leases = [
+                Lease(FakeContainer(f"app-{i}"), FakeDriver(None), f"http://app-{i}")
+                for i in range(2)
+            ]
+
+        result = run_parallel(Scenarios, Pool)
+        self.assertEqual(result.testsRun, 5)
+        self.assertEqual(len(result.failures), 1)
+        self.assertEqual(len(result.errors), 1)
+        self.assertEqual(len(result.skipped), 1)
+        # Every test ran once, on the lease of its shard.
+        self.assertEqual(
+            sorted(seen),
+            [("test_pass_1", "http://app-0"), ("test_pass_2", "http://app-1")],
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,83 @@
+#!/bin/python
+
+"""
+delete_paths.py
+
+Microbenchmark of the task delete path.
+
+Compares the old delete() implementation, which loaded the Task with
+Task.query.get() and removed it with db.session.delete(), against the single
+DELETE ... WHERE id = ? statement the app uses now. Every delete is committed
+on its own, the same as one request to /delete/<id>.
+
+Usage:
+    python benchmarks/delete_paths.py --rows 5000
+    DATABASE_URL=sqlite:////tmp/bench.db python benchmarks/delete_paths.py
+"""
+
+import argparse
+import logging
+from os import path
+import sys
+import time
+
+sys.path.insert(0, path.join(path.dirname(path.abspath(__file__)), "..", "app"))
+
+from app import create_app, db, delete_task, Task  # noqa: E402
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s %(levelname)s %(message)s",
+    handlers=[logging.StreamHandler()],
+)
+
+
+def load_then_delete(id):
+    task = db.session.get(Task, id)
+    db.session.delete(task)
+    db.session.commit()
+
+
+def single_statement_delete(id):
+    delete_task(id)
+    db.session.commit()
+
+
+def run(delete_fn, rows):
+    """Fill the table with rows tasks and time deleting all of them."""
+    db.drop_all()
+    db.create_all()
+    db.session.execute(
+        Task.__table__.insert(), [{"title": f"Task {i}"} for i in range(rows)]
+    )
+    db.session.commit()
+    ids = list(db.session.scalars(db.select(Task.id)))
+    db.session.remove()
+
+    start = time.perf_counter()
+    for id in ids:
+        delete_fn(id)
+        db.session.remove()  # Each request gets a new session.
+    return time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare task delete paths.")
+    parser.add_argument("--rows", type=int, default=2000, help="Tasks to delete")
+    args = parser.parse_args()
+
+    with create_app().app_context():
+        results = {}
+        for name, delete_fn in [
+            ("load-then-delete", load_then_delete),
+            ("single-statement", single_statement_delete),
+        ]:
+            elapsed = run(delete_fn, args.rows)
+            results[name] = elapsed
+            logging.info(
+                f"{name}: {elapsed:.3f}s for {args.rows} deletes "
+                f"({elapsed / args.rows * 1e6:.1f}us per delete)"
+            )
+
+    speedup = results["load-then-delete"] / results["single-statement"]
+    logging.info(f"single-statement is {speedup:.2f}x the speed of load-then-delete")
@@ -0,0 +1,112 @@
+#!/bin/python
+
+"""
+dependency_chains.py
+
+Time of the dependency chain lookups of licenses-check.py.
+
+Compares, for the same packages:
+
+* poetry-show: the former get_dependency_chain(), one `poetry show --tree
+  --why` subprocess per level until a direct dependency is reached, only the
+  first line of every level is followed. It never ends on a dependency
+  cycle (poetry <-> poetry-plugin-export), the benchmark gives up after
+  --max-levels levels.
+* lockfile-graph: DependencyGraph, poetry.lock parsed once, every chain of
+  every package answered from memory. Includes the time to parse the lock.
+
+Reports the total time, the time per package and the number of chains
+found. The packages default to every transitive (not direct) dependency in
+poetry.lock, the ones that need the most levels.
+
+Usage:
+    python benchmarks/dependency_chains.py --packages 20
+    python benchmarks/dependency_chains.py --poetry ~/.local/bin/poetry
+"""
+
+import argparse
+import json
+import logging
+from os import path
+import shlex
+import subprocess  # nosec B404
+import sys
+import time
+
+ROOT = path.join(path.dirname(path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+
+from compliance_common import load_script  # noqa: E402
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s %(levelname)s %(message)s",
+    handlers=[logging.StreamHandler()],
+)
+
+
+def poetry_show_chain(poetry, dependency, max_levels):
+    """The chain lookup licenses-check.py did before DependencyGraph.
+
+    Returns:
+    - list: The chain, None if it did not reach a direct dependency.
+    """
+    chain = [dependency]
+    for _ in range(max_levels):
+        # The arguments are built by this script only.
+        pkg_line = subprocess.run(  # nosec B603
+            shlex.split(f"{poetry} show --tree --why {dependency} --no-ansi"),
+            cwd=ROOT,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout
+        if "direct dependency" in pkg_line:
+            return chain
+        dependency = pkg_line.split(" ", 1)[0]
+        chain = [dependency] + chain
+    return None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare dependency chain lookups.")
+    parser.add_argument("--packages", type=int, default=10)
+    parser.add_argument("--poetry", default="poetry")
+    parser.add_argument("--max-levels", type=int, default=10)
+    args = parser.parse_args()
+
+    licenses_check = load_script(path.join(ROOT, "licenses-check.py"))
+    lock_path = path.join(ROOT, "poetry.lock")
+    pyproject_path = path.join(ROOT, "pyproject.toml")
+
+    graph = licenses_check.DependencyGraph(lock_path, pyproject_path)
+    packages = sorted(set(graph.names) - graph.direct)[: args.packages]
+
+    report = {}
+
+    start = time.perf_counter()
+    graph = licenses_check.DependencyGraph(lock_path, pyproject_path)
+    chains = sum(len(graph.chains(package)) for package in packages)
+    report["lockfile-graph"] = {
+        "seconds": time.perf_counter() - start,
+        "chains": chains,
+    }
+
+    start = time.perf_counter()
+    found = [poetry_show_chain(args.poetry, p, args.max_levels) for p in packages]
+    report["poetry-show"] = {
+        "seconds": time.perf_counter() - start,
+        "chains": sum(chain is not None for chain in found),
+    }
+
+    for name, result in report.items():
+        result["ms_per_package"] = result["seconds"] / len(packages) * 1000
+        logging.info(
+            f"{name:15} {len(packages)} packages in {result['seconds'] * 1000:9.1f}ms "
+            f"({result['ms_per_package']:8.2f}ms each), {result['chains']} chains"
+        )
+    logging.info(
+        f"speedup: {report['poetry-show']['seconds'] / report['lockfile-graph']['seconds']:.0f}x"
+    )
+
+    print(json.dumps(report, indent=2))
@@ -0,0 +1,78 @@
+#!/bin/python
+
+"""
+group_commit.py
+
+Insert throughput with and without GROUP_COMMIT, see app/group_commit.py.
+
+Starts the app under gunicorn with gthread workers, so the threads of a
+worker add tasks at the same time, and sends POST /api/v1/tasks from
+--concurrency clients. Runs every combination of group commit off and on and
+of SQLite synchronous=NORMAL (the default, no fsync per commit in WAL mode)
+and FULL (one fsync per commit). Reports inserts/sec and latency
+percentiles.
+
+Usage:
+    python benchmarks/group_commit.py --requests 3000 --concurrency 32
+"""
+
+import argparse
+import json
+import logging
+from os import path
+import sys
+
+sys.path.insert(0, path.dirname(path.abspath(__file__)))
+
+from harness import GunicornServer, run_load  # noqa: E402
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s %(levelname)s %(message)s",
+    handlers=[logging.StreamHandler()],
+)
+
+
+def post_task(server):
+    def send(i):
+        return lambda session: session.post(
+            server.url + "/api/v1/tasks", json={"title": f"Task {i}"}
+        )
+
+    return lambda i: ("POST /api/v1/tasks", send(i))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare group commit on and off.")
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--window-ms", type=float, default=2)
+    args = parser.parse_args()
+
+    report = {}
+    for synchronous in ("NORMAL", "FULL"):
+        for group_commit in ("false", "true"):
+            name = f"synchronous={synchronous} group_commit={group_commit}"
+            env = {
+                "GUNICORN_PROFILE": "gthread",
+                "GUNICORN_WORKERS": str(args.workers),
+                "GUNICORN_THREADS": str(args.threads),
+                "SQLITE_SYNCHRONOUS": synchronous,
+                "GROUP_COMMIT": group_commit,
+                "GROUP_COMMIT_WINDOW_MS": str(args.window_ms),
+                # Worker restarts drop keep-alive connections mid run.
+                "GUNICORN_MAX_REQUESTS": "0",
+            }
+            with GunicornServer(env) as server:
+                result = run_load(post_task(server), args.requests, args.concurrency)
+            result = result["all"]
+            report[name] = result
+            logging.info(
+                f"{name}: {result['rps']:.0f} inserts/s "
+                f"p50 {result['p50_ms']:.1f}ms p99 {result['p99_ms']:.1f}ms "
+                f"errors {result['errors']}"
+            )
+
+    print(json.dumps(report, indent=2))
@@ -0,0 +1,178 @@
+"""
+harness.py
+
+Shared pieces for the HTTP benchmarks: starting the app under gunicorn on a
+local port, driving requests from a pool of threads and summarizing the
+latencies.
+"""
+
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing
+import logging
+import os
+from os import path
+import socket
+import subprocess  # nosec B404
+import sys
+import tempfile
+import time
+
+import requests
+
+APP_DIR = path.join(path.dirname(path.abspath(__file__)), "..", "app")
+
+
+def find_free_port():
+    """Find and return a free port on the local machine."""
+    with closing(socket.socket(socket.AF_INET, socket.SOCK_STREAM)) as s:
+        s.bind(("", 0))
+        s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        return s.getsockname()[1]
+
+
+class GunicornServer:
+    """Run the app with gunicorn_config.py on a free local port.
+
+    The database and the index cache are files in a temporary directory, so
+    every server starts empty and the workers share them the same way they do
+    in a prod like container.
+
+    Usage:
+        with GunicornServer({"GUNICORN_PROFILE": "gthread"}) as server:
+            requests.get(server.url)
+    """
+
+    def __init__(self, env=None, startup_timeout=30):
+        self.env = env or {}
+        self.startup_timeout = startup_timeout
+        self.port = find_free_port()
+        self.url = f"http://127.0.0.1:{self.port}"
+        self.process = None
+        self.tmpdir = None
+
+    def __enter__(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        env = {
+            **os.environ,
+            "PORT": str(self.port),
+            "DATABASE_URL": "sqlite:///" + path.join(self.tmpdir.name, "bench.db"),
+            "INDEX_CACHE_PATH": path.join(self.tmpdir.name, "cache.db"),
+            "PROD_LIKE": "true",
+            **self.env,
+        }
+        # The arguments are static and only come from this script.
+        self.process = subprocess.Popen(  # nosec B603
+            [sys.executable, "-m", "gunicorn", "-c", "gunicorn_config.py"]
+            + ["--access-logfile", "/dev/null", "app:create_app()"],
+            cwd=APP_DIR,
+            env=env,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.PIPE,
+        )
+        self.wait_until_ready()
+        return self
+
+    def wait_until_ready(self):
+        deadline = time.monotonic() + self.startup_timeout
+        delay = 0.01
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                raise RuntimeError(
+                    f"gunicorn exited: {self.process.stderr.read().decode()}"
+                )
+            try:
+                if requests.get(self.url, timeout=1).status_code == 200:
+                    return
+            except requests.RequestException:
+                pass
+            time.sleep(delay)
+            delay = min(delay * 2, 0.5)
+        raise RuntimeError(f"gunicorn did not answer on {self.url}")
+
+    def __exit__(self, *exc):
+        self.process.terminate()
+        try:
+            self.process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+            self.process.wait()
+        self.process.stderr.close()
+        self.tmpdir.cleanup()
+
+
+def percentile(values, pct):
+    """Nearest rank percentile of a list of numbers."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, round(pct / 100 * len(ordered)) - 1))
+    return ordered[rank]
+
+
+def summarize(latencies, errors, elapsed):
+    """Return RPS, latency percentiles in milliseconds and the error rate."""
+    total = len(latencies) + errors
+    return {
+        "requests": total,
+        "errors": errors,
+        "error_rate": errors / total if total else 0.0,
+        "rps": total / elapsed if elapsed else 0.0,
+        "p50_ms": percentile(latencies, 50) * 1000 if latencies else None,
+        "p95_ms": percentile(latencies, 95) * 1000 if latencies else None,
+        "p99_ms": percentile(latencies, 99) * 1000 if latencies else None,
+    }
+
+
+def run_load(pick, total, concurrency, session_factory=requests.Session):
+    """Send total requests from concurrency threads.
+
+    pick(i) returns a (label, send) tuple for the i-th request and send(session)
+    makes the request and returns the response. Results are summarized per
+    label and over all requests. Every thread gets its own session from
+    session_factory, a requests.Session by default or e.g. a Flask test
+    client. A status of 400 or above and any exception count as an error.
+
+    Returns:
+    - dict: summarize() results keyed on label, plus "all".
+    """
+    per_thread = [total // concurrency] * concurrency
+    for i in range(total % concurrency):
+        per_thread[i] += 1
+    offsets = [sum(per_thread[:n]) for n in range(concurrency)]
+
+    def worker(offset, count):
+        latencies, errors = defaultdict(list), defaultdict(int)
+        session = session_factory()
+        for i in range(offset, offset + count):
+            label, send = pick(i)
+            start = time.perf_counter()
+            try:
+                ok = send(session).status_code < 400
+            except Exception as e:
+                logging.debug(f"{label} failed: {e}")
+                ok = False
+            if ok:
+                latencies[label].append(time.perf_counter() - start)
+            else:
+                errors[label] += 1
+        return latencies, errors
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(worker, offsets, per_thread))
+    elapsed = time.perf_counter() - start
+
+    latencies, errors = defaultdict(list), defaultdict(int)
+    for thread_latencies, thread_errors in results:
+        for label, values in thread_latencies.items():
+            latencies[label].extend(values)
+            latencies["all"].extend(values)
+        for label, count in thread_errors.items():
+            errors[label] += count
+            errors["all"] += count
+
+    labels = sorted(set(latencies) | set(errors))
+    return {
+        label: summarize(latencies[label], errors[label], elapsed) for label in labels
+    }
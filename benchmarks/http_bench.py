@@ -0,0 +1,263 @@
+#!/bin/python
+
+"""
+http_bench.py
+
+Throughput and latency benchmark for the tasks blueprint.
+
+Drives a weighted mix of GET /, POST /add and GET /delete/<id> against the
+app at several table sizes and concurrency levels, and writes RPS, p50/p95/p99
+latency and error rates per operation as JSON.
+
+Two modes are available:
+
+* inprocess: Flask's test client inside this process. No network or gunicorn
+  overhead, shows the cost of the application code itself.
+* gunicorn: the app under gunicorn with gunicorn_config.py on a local port,
+  the same way it runs in the container.
+
+The database is a SQLite file in a temporary directory in both modes and is
+seeded through /bulk/add before every table size.
+
+Regressions can fail the build: with --baseline the results are compared
+against an earlier JSON report and the script exits with 1 when RPS drops or
+p99 grows by more than --tolerance, or the error rate exceeds
+--max-error-rate.
+
+Usage:
+    python benchmarks/http_bench.py --mode inprocess gunicorn \\
+        --table-sizes 0 10000 --concurrency 1 8 --mix index=80,add=15,delete=5 \\
+        --output bench.json
+    python benchmarks/http_bench.py --baseline bench.json --tolerance 0.25
+"""
+
+import argparse
+from collections import deque
+import json
+import logging
+from os import path
+import random
+import sys
+import tempfile
+
+sys.path.insert(0, path.dirname(path.abspath(__file__)))
+
+from harness import APP_DIR, GunicornServer, run_load  # noqa: E402
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s %(levelname)s %(message)s",
+    handlers=[logging.StreamHandler()],
+)
+
+SEED_CHUNK = 5000
+
+
+class InProcessTarget:
+    """The app in this process, requests go through Flask's test client."""
+
+    mode = "inprocess"
+    base_url = ""
+    request_kwargs = {}
+
+    def __init__(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        sys.path.insert(0, APP_DIR)
+        import app
+
+        self.app = app.create_app(
+            {
+                "SQLALCHEMY_DATABASE_URI": "sqlite:///"
+                + path.join(self.tmpdir.name, "bench.db"),
+                "INDEX_CACHE": "memory",
+            }
+        )
+        self.db = app.db
+
+    def __enter__(self):
+        with self.app.app_context():
+            self.db.drop_all()
+            self.db.create_all()
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+    def session(self):
+        return self.app.test_client()
+
+
+class GunicornTarget:
+    """The app under gunicorn, a new server with an empty database per use."""
+
+    mode = "gunicorn"
+    request_kwargs = {"allow_redirects": False}
+
+    def __init__(self):
+        self.server = None
+
+    def __enter__(self):
+        self.server = GunicornServer().__enter__()
+        self.base_url = self.server.url
+        return self
+
+    def __exit__(self, *exc):
+        self.server.__exit__(*exc)
+
+    def session(self):
+        import requests
+
+        return requests.Session()
+
+
+def parse_mix(value):
+    """Parse 'index=80,add=15,delete=5' into a dict of weights."""
+    mix = {}
+    for part in value.split(","):
+        name, weight = part.split("=")
+        if name not in ("index", "add", "delete"):
+            raise argparse.ArgumentTypeError(f"Unknown operation: {name}")
+        mix[name] = int(weight)
+    return mix
+
+
+def schedule(mix, total):
+    """Return the operation for each of the total requests, in random order."""
+    weight_sum = sum(mix.values())
+    operations = []
+    for name, weight in mix.items():
+        operations += [name] * round(total * weight / weight_sum)
+    operations = (operations + ["index"] * total)[:total]
+    # Not used for anything security related, only to interleave operations.
+    random.Random(0).shuffle(operations)  # nosec B311
+    return operations
+
+
+def seed(target, rows):
+    """Insert rows tasks through /bulk/add and return their ids."""
+    session = target.session()
+    ids = []
+    for start in range(0, rows, SEED_CHUNK):
+        titles = [f"Seed {i}" for i in range(start, min(rows, start + SEED_CHUNK))]
+        response = session.post(target.base_url + "/bulk/add", json={"titles": titles})
+        results = json.loads(response.text)["results"]
+        ids += [result["id"] for result in results]
+    return ids
+
+
+def bench_target(target, table_size, concurrency, total, mix):
+    operations = schedule(mix, total)
+    deletes = operations.count("delete")
+
+    # Seed the rows the deletes remove on top of the table size, so the table
+    # stays close to table_size for the whole run.
+    delete_ids = deque(seed(target, table_size + deletes)[:deletes])
+    kwargs = target.request_kwargs
+    base_url = target.base_url
+
+    def pick(i):
+        operation = operations[i]
+        if operation == "index":
+            return "GET /", lambda session: session.get(base_url + "/", **kwargs)
+        if operation == "add":
+            data = {"title": f"Bench {i}"}
+            return "POST /add", lambda session: session.post(
+                base_url + "/add", data=data, **kwargs
+            )
+        id = delete_ids.popleft()
+        return "GET /delete/<id>", lambda session: session.get(
+            f"{base_url}/delete/{id}", **kwargs
+        )
+
+    return run_load(pick, total, concurrency, session_factory=target.session)
+
+
+def run(modes, table_sizes, concurrency_levels, total, mix):
+    runs = []
+    for mode in modes:
+        target = InProcessTarget() if mode == "inprocess" else GunicornTarget()
+        for table_size in table_sizes:
+            for concurrency in concurrency_levels:
+                with target:
+                    results = bench_target(target, table_size, concurrency, total, mix)
+                runs.append(
+                    {
+                        "mode": mode,
+                        "table_size": table_size,
+                        "concurrency": concurrency,
+                        "results": results,
+                    }
+                )
+                overall = results["all"]
+                logging.info(
+                    f"{mode} rows={table_size} c={concurrency}: "
+                    f"{overall['rps']:.0f} req/s p50 {overall['p50_ms']:.1f}ms "
+                    f"p99 {overall['p99_ms']:.1f}ms "
+                    f"errors {overall['error_rate']:.2%}"
+                )
+    return {"mix": mix, "requests": total, "runs": runs}
+
+
+def find_regressions(report, baseline, tolerance, max_error_rate):
+    """Compare report against baseline and return a list of messages."""
+
+    def key(run):
+        return run["mode"], run["table_size"], run["concurrency"]
+
+    baseline_runs = {key(run): run for run in baseline["runs"]}
+    regressions = []
+    for run in report["runs"]:
+        for label, result in run["results"].items():
+            name = f"{'/'.join(map(str, key(run)))} {label}"
+            if result["error_rate"] > max_error_rate:
+                regressions.append(f"{name}: error rate {result['error_rate']:.2%}")
+
+            base = baseline_runs.get(key(run), {}).get("results", {}).get(label)
+            if base is None or not result["p99_ms"] or not base["p99_ms"]:
+                continue
+            if result["rps"] < base["rps"] * (1 - tolerance):
+                regressions.append(
+                    f"{name}: {result['rps']:.0f} req/s, baseline {base['rps']:.0f}"
+                )
+            if result["p99_ms"] > base["p99_ms"] * (1 + tolerance):
+                regressions.append(
+                    f"{name}: p99 {result['p99_ms']:.1f}ms, "
+                    f"baseline {base['p99_ms']:.1f}ms"
+                )
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the tasks endpoints.")
+    parser.add_argument(
+        "--mode", nargs="+", default=["inprocess"], choices=["inprocess", "gunicorn"]
+    )
+    parser.add_argument("--table-sizes", nargs="+", type=int, default=[0, 10000])
+    parser.add_argument("--concurrency", nargs="+", type=int, default=[1, 8])
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--mix", type=parse_mix, default="index=80,add=15,delete=5")
+    parser.add_argument("--output", help="Write the JSON report to this file")
+    parser.add_argument("--baseline", help="JSON report to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    parser.add_argument("--max-error-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    report = run(args.mode, args.table_sizes, args.concurrency, args.requests, args.mix)
+
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(report, file, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+
+    if args.baseline:
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+        regressions = find_regressions(
+            report, baseline, args.tolerance, args.max_error_rate
+        )
+        for regression in regressions:
+            logging.critical(f"Regression: {regression}")
+        if regressions:
+            sys.exit(1)
+        logging.info("No regressions against the baseline.")
@@ -0,0 +1,104 @@
+#!/bin/python
+
+"""
+search.py
+
+Benchmark of the task search: the task_fts full-text index against the LIKE
+scan other databases fall back to.
+
+The tasks are generated from a small vocabulary plus a unique number, so
+there are words that match a large share of the tasks and words that match a
+single one. A LIMIT query for a common word stops scanning early, LIKE is at
+its worst for rare words, which have to be looked for in every row. Every query is run --repeat times through search_tasks() and the
+median and p95 per query are reported.
+
+Usage:
+    python benchmarks/search.py --rows 1000000
+"""
+
+import argparse
+import logging
+from os import path
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, path.dirname(path.abspath(__file__)))
+sys.path.insert(0, path.join(path.dirname(path.abspath(__file__)), "..", "app"))
+
+from harness import percentile  # noqa: E402
+from app import Task, create_app, db, init_db, search_tasks  # noqa: E402
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s %(levelname)s %(message)s",
+    handlers=[logging.StreamHandler()],
+)
+
+VERBS = ["buy", "call", "fix", "clean", "write", "review", "book", "pay", "plan"]
+NOUNS = ["groceries", "report", "bike", "kitchen", "invoice", "garden", "tickets"]
+EXTRAS = ["today", "tomorrow", "asap", "later", "weekly", "urgent"]
+
+# Common words, a prefix, a two word match, a single task (the number at the
+# end of every title) and no match at all.
+QUERIES = ["groceries", "rev", "urgent invoice", "fix bike", "12345", "zzyzx"]
+
+
+def generate_titles(rows, seed=42):
+    rng = random.Random(seed)  # nosec B311
+    for i in range(rows):
+        words = [rng.choice(VERBS), rng.choice(NOUNS), rng.choice(EXTRAS)]
+        yield f"{' '.join(words)} {i}"[:50]
+
+
+def seed(rows, chunk_size=10000):
+    titles = generate_titles(rows)
+    while True:
+        chunk = [{"title": title} for _, title in zip(range(chunk_size), titles)]
+        if not chunk:
+            break
+        db.session.execute(Task.__table__.insert(), chunk)
+    db.session.commit()
+
+
+def time_query(query, use_fts, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        search_tasks(query, per_page=50, use_fts=use_fts)
+        timings.append(time.perf_counter() - start)
+        db.session.remove()
+    return timings
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare FTS5 and LIKE search.")
+    parser.add_argument("--rows", type=int, default=200000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        uri = "sqlite:///" + path.join(tmpdir, "search.db")
+        app = create_app({"SQLALCHEMY_DATABASE_URI": uri, "INDEX_CACHE": "none"})
+        init_db(app)
+        with app.app_context():
+            start = time.perf_counter()
+            seed(args.rows)
+            logging.info(
+                f"Inserted {args.rows} tasks in {time.perf_counter() - start:.1f}s"
+            )
+
+            for query in QUERIES:
+                results = {}
+                for name, use_fts in [("fts5", True), ("like", False)]:
+                    timings = time_query(query, use_fts, args.repeat)
+                    results[name] = percentile(timings, 50)
+                    logging.info(
+                        f"{query!r:18} {name:5} "
+                        f"p50 {percentile(timings, 50) * 1000:8.2f}ms "
+                        f"p95 {percentile(timings, 95) * 1000:8.2f}ms"
+                    )
+                speedup = results["like"] / results["fts5"]
+                logging.info(f"{query!r:18} fts5 is {speedup:.1f}x the speed of like")
+            db.engine.dispose()
@@ -0,0 +1,107 @@
+#!/bin/python
+
+"""
+startup.py
+
+Cold start benchmark of the app, the cost paid by every container start,
+gunicorn worker boot and worker recycle (max_requests).
+
+Every repetition runs in a fresh Python process and measures:
+
+* import: `import app`
+* create_app: building the Flask app, engines and extensions
+* first_request: the first GET / including the first database connection
+
+The database is a SQLite file whose schema was created beforehand, the same
+as for a worker booting against an initialized deployment.
+
+Usage:
+    python benchmarks/startup.py --repeat 10
+"""
+
+import argparse
+import json
+import logging
+import os
+from os import path
+import statistics
+import subprocess  # nosec B404
+import sys
+import tempfile
+
+sys.path.insert(0, path.dirname(path.abspath(__file__)))
+
+from harness import APP_DIR  # noqa: E402
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s %(levelname)s %(message)s",
+    handlers=[logging.StreamHandler()],
+)
+
+PROBE = """
+import json, time
+start = time.perf_counter()
+import app
+imported = time.perf_counter()
+flask_app = app.create_app()
+created = time.perf_counter()
+flask_app.test_client().get("/")
+served = time.perf_counter()
+print(json.dumps({
+    "import": imported - start,
+    "create_app": created - imported,
+    "first_request": served - created,
+}))
+"""
+
+
+def probe(env):
+    # The command is static and only comes from this script.
+    result = subprocess.run(  # nosec B603
+        [sys.executable, "-c", PROBE],
+        cwd=APP_DIR,
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return json.loads(result.stdout.splitlines()[-1])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure app cold start time.")
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        env = {
+            **os.environ,
+            "DATABASE_URL": "sqlite:///" + path.join(tmpdir, "startup.db"),
+            "INDEX_CACHE": "memory",
+        }
+        # Migrate the schema once, like gunicorn's on_starting hook does.
+        subprocess.run(  # nosec B603
+            [sys.executable, "-m", "flask", "--app", "app", "db", "upgrade"],
+            cwd=APP_DIR,
+            env=env,
+            capture_output=True,
+            check=True,
+        )
+
+        runs = [probe(env) for _ in range(args.repeat)]
+
+    report = {}
+    for phase in ("import", "create_app", "first_request"):
+        values = [run[phase] * 1000 for run in runs]
+        report[phase] = {
+            "median_ms": statistics.median(values),
+            "min_ms": min(values),
+            "max_ms": max(values),
+        }
+        logging.info(f"{phase}: median {report[phase]['median_ms']:.1f}ms")
+    report["total_median_ms"] = statistics.median(
+        sum(run.values()) * 1000 for run in runs
+    )
+    logging.info(f"total: median {report['total_median_ms']:.1f}ms")
+    print(json.dumps(report, indent=2))
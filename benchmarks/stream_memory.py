@@ -0,0 +1,171 @@
+#!/bin/python
+
+"""
+stream_memory.py
+
+Memory benchmark of the full task list responses.
+
+Compares, for growing table sizes:
+
+* index-materialized: the index as one page with every task, rendered with
+  render_template() after loading all rows (what the index did before).
+* index-streamed: the index with TASKS_PER_PAGE=0, streamed with
+  stream_template() from a yield_per cursor.
+* export.csv and export.jsonl: the streamed exports.
+
+Every measurement runs in a fresh process that reads the response chunk by
+chunk without keeping it. It reports how much the peak RSS of the process
+grew during the request, the time to the first byte and the total time. The
+streamed responses should show the same memory for every table size.
+
+SQLite's mmap is turned off for the probes, mapped database pages count
+towards RSS and would grow with the file size no matter how the response is
+built. --tracemalloc also reports the peak of the Python allocations, which
+slows every request down several times.
+
+Usage:
+    python benchmarks/stream_memory.py --rows 10000,100000,500000
+"""
+
+import argparse
+import json
+import logging
+import os
+from os import path
+import subprocess  # nosec B404
+import sys
+import tempfile
+
+APP_DIR = path.join(path.dirname(path.abspath(__file__)), "..", "app")
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s %(levelname)s %(message)s",
+    handlers=[logging.StreamHandler()],
+)
+
+MODES = {
+    "index-materialized": "/",
+    "index-streamed": "/",
+    "export.csv": "/export.csv",
+    "export.jsonl": "/export.jsonl",
+}
+
+
+def seed(uri, rows):
+    from app import Task, create_app, db, init_db
+
+    app = create_app({"SQLALCHEMY_DATABASE_URI": uri, "INDEX_CACHE": "none"})
+    init_db(app)
+    with app.app_context():
+        for start in range(0, rows, 10000):
+            db.session.execute(
+                Task.__table__.insert(),
+                [
+                    {"title": f"Task number {i} to benchmark streaming"}
+                    for i in range(start, min(start + 10000, rows))
+                ],
+            )
+        db.session.commit()
+        db.engine.dispose()
+
+
+def probe(uri, mode, rows, trace):
+    """Measure one request in this process and print the result as JSON."""
+    import resource
+    import time
+    import tracemalloc
+
+    from app import create_app
+
+    per_page = rows if mode == "index-materialized" else 0
+    app = create_app(
+        {
+            "SQLALCHEMY_DATABASE_URI": uri,
+            "INDEX_CACHE": "none",
+            "TASKS_PER_PAGE": per_page,
+        }
+    )
+    client = app.test_client()
+    # Warm up imports, templates and the connection pool on an empty export.
+    client.get("/export.csv?warmup").close()
+
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if trace:
+        tracemalloc.start()
+    start = time.perf_counter()
+    response = client.get(MODES[mode], buffered=False)
+    first_byte, size = None, 0
+    for chunk in response.response:
+        if first_byte is None:
+            first_byte = time.perf_counter() - start
+        size += len(chunk)
+    response.close()
+    total = time.perf_counter() - start
+    traced_peak = tracemalloc.get_traced_memory()[1] if trace else None
+    tracemalloc.stop()
+    rss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    print(
+        json.dumps(
+            {
+                # ru_maxrss is in kilobytes on Linux.
+                "rss_growth_mb": (rss_after - rss_before) / 1024,
+                "tracemalloc_peak_mb": traced_peak and traced_peak / 1024 / 1024,
+                "first_byte_ms": first_byte * 1000,
+                "total_ms": total * 1000,
+                "bytes": size,
+            }
+        )
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure full list memory use.")
+    parser.add_argument("--rows", default="10000,100000,300000")
+    parser.add_argument("--tracemalloc", action="store_true")
+    parser.add_argument("--probe", nargs=4, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    sys.path.insert(0, APP_DIR)
+
+    if args.probe:
+        uri, mode, rows, trace = args.probe
+        probe(uri, mode, int(rows), trace == "true")
+        sys.exit(0)
+
+    report = []
+    with tempfile.TemporaryDirectory() as tmpdir:
+        for rows in [int(value) for value in args.rows.split(",")]:
+            uri = "sqlite:///" + path.join(tmpdir, f"stream-{rows}.db")
+            seed(uri, rows)
+            for mode in MODES:
+                # The arguments are built by this script only.
+                result = subprocess.run(  # nosec B603
+                    [
+                        sys.executable,
+                        __file__,
+                        "--probe",
+                        uri,
+                        mode,
+                        str(rows),
+                        str(args.tracemalloc).lower(),
+                    ],
+                    cwd=APP_DIR,
+                    env={**os.environ, "PROFILE_REQUESTS": "", "SQLITE_MMAP_SIZE": "0"},
+                    capture_output=True,
+                    text=True,
+                    check=True,
+                )
+                measured = json.loads(result.stdout.splitlines()[-1])
+                report.append({"rows": rows, "mode": mode, **measured})
+                traced = measured["tracemalloc_peak_mb"]
+                logging.info(
+                    f"{rows:>8} rows {mode:19} "
+                    f"rss +{measured['rss_growth_mb']:7.1f}MB "
+                    + (f"traced {traced:7.1f}MB " if traced else "")
+                    + f"first byte {measured['first_byte_ms']:8.1f}ms "
+                    f"total {measured['total_ms']:8.1f}ms"
+                )
+
+    print(json.dumps(report, indent=2))
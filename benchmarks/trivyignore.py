@@ -0,0 +1,153 @@
+#!/bin/python
+
+"""
+trivyignore.py
+
+Time and memory of trivyignore-check.py on a synthetic ignore file.
+
+Writes a valid '.trivyignore' of --lines lines, groups of a reason, an until date within the next
+30 days and --cves vulnerabilities, and compares:
+
+* readlines: the former check_trivyignore_entries(), readlines(), groupby and split_list, stopping
+  at the first invalid group.
+* streaming: the one pass validator without the cache.
+* cache-miss: the validator with the compliance cache, after one group changed.
+* cache-hit: the validator on the unchanged file, the cached verdict.
+
+Every mode reports the time of the check. --tracemalloc also reports the peak of the Python
+allocations during the check, which slows all modes down several times. The checks log at WARNING
+and up only, like in a build with the ignores in order.
+
+Usage:
+    python benchmarks/trivyignore.py --lines 100000 --tracemalloc
+"""
+
+import argparse
+from datetime import datetime, timedelta
+from itertools import groupby
+import json
+import logging
+import os
+from os import path
+import sys
+import tempfile
+import time
+import tracemalloc
+
+ROOT = path.join(path.dirname(path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+
+from compliance_common import load_script  # noqa: E402
+
+logging.basicConfig(
+    level=logging.WARNING,
+    format="%(asctime)s %(levelname)s %(message)s",
+    handlers=[logging.StreamHandler()],
+)
+
+
+def readlines_check(max_days):
+    """The check trivyignore-check.py did before the streaming validator."""
+
+    def split_list(original_list, split_value):
+        result, sublist = [], []
+        for item in original_list:
+            if item == split_value:
+                if sublist:
+                    result.append(sublist)
+                    sublist = []
+            else:
+                sublist.append(item)
+        result.append(sublist) if sublist else None
+        return result
+
+    current_datetime = datetime.now()
+    with open(".trivyignore", "r") as file:
+        lines = file.readlines()
+    lines = [key for key, _group in groupby(lines)]
+    for group in split_list(lines, "\n"):
+        group = [string.replace("\n", "") for string in group]
+        if "reason:" not in group[0]:
+            return False
+        reason = group[0].split(":")[-1].strip()
+        if "until:" not in group[1]:
+            return False
+        until = group[1].split(":")[-1].strip()
+        vuls = ",".join(group[2:])
+        if vuls == "":
+            return False
+        until_datetime = datetime.strptime(until, "%Y-%m-%d")
+        until_day = (until_datetime - current_datetime).days
+        days_in_past = (current_datetime - until_datetime).days
+        if until_day > max_days or days_in_past > 0:
+            return False
+        logging.info(f"Ignoring {vuls} until {until} ({until_day}d). Reason: {reason}")
+    return True
+
+
+def write_ignore_file(lines, cves, changed=None):
+    today = datetime.now().date()
+    with open(".trivyignore", "w") as file:
+        written, group = 0, 0
+        while written < lines:
+            until = today + timedelta(days=1 + group % 29)
+            file.write(f"# reason: Synthetic ignore {group}\n# until: {until}\n")
+            for cve in range(cves):
+                suffix = "-changed" if group == changed else ""
+                file.write(f"CVE-2024-{group:06d}{cve}{suffix}\n")
+            file.write("\n")
+            written += cves + 3
+            group += 1
+    return group
+
+
+def measure(check, trace):
+    if trace:
+        tracemalloc.start()
+    start = time.perf_counter()
+    valid = check()
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1] if trace else None
+    tracemalloc.stop()
+    return {
+        "valid": valid,
+        "ms": elapsed * 1000,
+        "peak_mb": peak and peak / 1024 / 1024,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark trivyignore-check.py.")
+    parser.add_argument("--lines", type=int, default=100000)
+    parser.add_argument("--cves", type=int, default=2)
+    parser.add_argument("--tracemalloc", action="store_true")
+    args = parser.parse_args()
+
+    trivyignore_check = load_script(path.join(ROOT, "trivyignore-check.py"))
+
+    def streaming(use_cache):
+        return lambda: trivyignore_check.check_trivyignore_entries(
+            30, use_cache=use_cache
+        )
+
+    report = {}
+    with tempfile.TemporaryDirectory() as tmpdir:
+        os.chdir(tmpdir)
+        groups = write_ignore_file(args.lines, args.cves)
+        logging.warning(f"{args.lines} lines, {groups} groups")
+
+        report["readlines"] = measure(lambda: readlines_check(30), args.tracemalloc)
+        report["streaming"] = measure(streaming(False), args.tracemalloc)
+        write_ignore_file(args.lines, args.cves, changed=groups // 2)
+        report["cache-miss"] = measure(streaming(True), args.tracemalloc)
+        report["cache-hit"] = measure(streaming(True), args.tracemalloc)
+        os.chdir(ROOT)
+
+    for name, result in report.items():
+        peak = result["peak_mb"]
+        logging.warning(
+            f"{name:18} {result['ms']:9.1f}ms "
+            + (f"peak {peak:7.2f}MB " if peak is not None else "")
+            + f"valid {result['valid']}"
+        )
+    print(json.dumps(report, indent=2))
@@ -0,0 +1,82 @@
+#!/bin/python
+
+"""
+worker_profiles.py
+
+Load test of the gunicorn worker profiles in app/gunicorn_config.py.
+
+Starts the app under gunicorn once per profile and measures requests/sec and
+latency percentiles for GET / and POST /add. Profiles whose worker class is
+not installed (gevent, eventlet) are skipped.
+
+Usage:
+    python benchmarks/worker_profiles.py --requests 2000 --concurrency 16
+    python benchmarks/worker_profiles.py --profiles sync gthread --workers 4
+"""
+
+import argparse
+import importlib.util
+import json
+import logging
+from os import path
+import sys
+
+sys.path.insert(0, path.dirname(path.abspath(__file__)))
+
+from harness import GunicornServer, run_load  # noqa: E402
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s %(levelname)s %(message)s",
+    handlers=[logging.StreamHandler()],
+)
+
+PROFILES = ["sync", "gthread", "gevent", "eventlet"]
+
+
+def get_index(server):
+    return lambda i: ("GET /", lambda session: session.get(server.url + "/"))
+
+
+def post_add(server):
+    def send(i):
+        return lambda session: session.post(
+            server.url + "/add", data={"title": f"Task {i}"}, allow_redirects=False
+        )
+
+    return lambda i: ("POST /add", send(i))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare gunicorn worker profiles.")
+    parser.add_argument("--profiles", nargs="+", default=PROFILES, choices=PROFILES)
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--workers", type=int, help="Override GUNICORN_WORKERS")
+    parser.add_argument("--threads", type=int, default=4, help="gthread threads")
+    args = parser.parse_args()
+
+    report = {}
+    for profile in args.profiles:
+        if profile in ("gevent", "eventlet") and not importlib.util.find_spec(profile):
+            logging.warning(f"Skipping {profile}, the package is not installed.")
+            continue
+
+        env = {"GUNICORN_PROFILE": profile, "GUNICORN_THREADS": str(args.threads)}
+        if args.workers:
+            env["GUNICORN_WORKERS"] = str(args.workers)
+
+        logging.info(f"Starting gunicorn with the {profile} profile...")
+        with GunicornServer(env) as server:
+            report[profile] = {}
+            for name, send in [("POST /add", post_add), ("GET /", get_index)]:
+                result = run_load(send(server), args.requests, args.concurrency)
+                result = result[name]
+                report[profile][name] = result
+                logging.info(
+                    f"{profile} {name}: {result['rps']:.0f} req/s "
+                    f"p50 {result['p50_ms']:.1f}ms p99 {result['p99_ms']:.1f}ms "
+                    f"errors {result['errors']}"
+                )
+
+    print(json.dumps(report, indent=2))
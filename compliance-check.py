@@ -0,0 +1,228 @@
+#!/bin/python
+
+"""
+compliance-check.py
+
+Runs the compliance checks of the builder stage concurrently and writes one JSON report.
+
+Checks:
+- licenses: licenses-check.py, the licenses of the installed packages against '.approved-dep.csv'.
+- trivyignore: trivyignore-check.py, the reasons and until dates in '.trivyignore'.
+- bandit: static security analysis of the Python code.
+- pip-audit: known vulnerabilities of the packages in 'poetry.lock', exported to 'requirements.txt'
+  first. The builder stage installs the wheels from that file later on.
+- trivy: known vulnerabilities of the whole file system.
+
+Every check runs in a thread of its own; the audits spend their time in subprocesses, so they overlap.
+Only trivy waits for pip-audit: pip-audit writes 'requirements.txt' and builds a throwaway virtualenv
+in the temp directory, a scan in the meantime would see partly written files. The wall time of trivy
+includes that wait. Inputs more than one check needs are parsed once. The report lists per check
+whether it passed, its wall time, the time spent in subprocesses and its findings, every warning or
+error it logged:
+
+{
+  "passed": false,
+  "wall_time": 41.2,
+  "checks": [
+    {"name": "trivy", "passed": true, "wall_time": 41.1, "subprocess_time": 41.1, "findings": [], "error": null},
+    ...
+  ]
+}
+
+The checks are sorted by wall time, the slowest gate first. The exit code is 1 if any check failed.
+
+Usage:
+    python compliance-check.py --max-days 30 --report compliance-report.json
+    python compliance-check.py --checks licenses,trivyignore
+"""
+
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+import json
+import logging
+import os
+import sys
+import threading
+import time
+
+from compliance_common import (
+    FindingsHandler,
+    load_script,
+    reset_subprocess_time,
+    run,
+    setup_logging,
+    subprocess_time,
+)
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+licenses_check = load_script(os.path.join(HERE, "licenses-check.py"))
+trivyignore_check = load_script(os.path.join(HERE, "trivyignore-check.py"))
+
+
+class Inputs:
+    """The inputs of the checks, each parsed once on first use."""
+
+    def __init__(self, max_days):
+        self.max_days = max_days
+        self._lock = threading.Lock()
+        self._dependency_graph = None
+        # Set once pip-audit is done with its files, or when it does not run.
+        self.pip_audit_done = threading.Event()
+
+    def dependency_graph(self):
+        """The reverse dependency graph of 'poetry.lock'."""
+        with self._lock:
+            if self._dependency_graph is None:
+                self._dependency_graph = licenses_check.DependencyGraph()
+            return self._dependency_graph
+
+
+def run_tool(cmd):
+    """Run an audit tool, logging the end of its output as findings when it fails."""
+    result = run(cmd, check=False)
+    if result.returncode != 0:
+        output = (result.stdout + result.stderr).strip().splitlines()
+        logging.critical(f"{cmd} exited with {result.returncode}")
+        for line in output[-20:]:
+            logging.critical(f"  {line}")
+    return result.returncode == 0
+
+
+def check_licenses(inputs):
+    return licenses_check.check_licenses(inputs.dependency_graph()) == 0
+
+
+def check_trivyignore(inputs):
+    return trivyignore_check.check_trivyignore_entries(inputs.max_days)
+
+
+def check_bandit(inputs):
+    return run_tool("bandit -r -f txt .")
+
+
+def check_pip_audit(inputs):
+    try:
+        export = run("poetry export --without-hashes --format=requirements.txt")
+        with open("requirements.txt", "w") as file:
+            file.write(export.stdout)
+        return run_tool("pip-audit --strict --progress-spinner off -r requirements.txt")
+    finally:
+        inputs.pip_audit_done.set()
+
+
+def check_trivy(inputs):
+    inputs.pip_audit_done.wait()
+    # Ignore unfixed since if there is not fix we should not stop development.
+    return run_tool(
+        "trivy rootfs --ignore-unfixed --exit-code 1 --timeout 3m --no-progress /"
+    )
+
+
+CHECKS = {
+    "licenses": check_licenses,
+    "trivyignore": check_trivyignore,
+    "bandit": check_bandit,
+    "pip-audit": check_pip_audit,
+    "trivy": check_trivy,
+}
+
+
+def run_check(name, inputs, findings):
+    """Run one check and measure it.
+
+    Returns:
+    - dict: The entry of the check in the report.
+    """
+    reset_subprocess_time()
+    findings.pop()
+    error = None
+    start = time.perf_counter()
+    logging.info(f"Starting check {name}")
+    try:
+        passed = bool(CHECKS[name](inputs))
+    except Exception as e:
+        passed = False
+        error = f"{type(e).__name__}: {e}"
+        logging.critical(f"{name} failed with {error}")
+    wall_time = time.perf_counter() - start
+    logging.info(
+        f"Finished check {name} in {wall_time:.2f}s: {'passed' if passed else 'FAILED'}"
+    )
+    return {
+        "name": name,
+        "passed": passed,
+        "wall_time": round(wall_time, 3),
+        "subprocess_time": round(subprocess_time(), 3),
+        "findings": findings.pop(),
+        "error": error,
+    }
+
+
+def run_checks(names, max_days, workers=None):
+    """Run the checks in names concurrently.
+
+    Returns:
+    - dict: The report, see the module docstring.
+    """
+    findings = FindingsHandler()
+    logging.getLogger().addHandler(findings)
+    inputs = Inputs(max_days)
+    if "pip-audit" not in names:
+        inputs.pip_audit_done.set()
+    # Started in the order of CHECKS, so pip-audit is running before trivy waits for it even with
+    # fewer workers than checks.
+    names = sorted(names, key=list(CHECKS).index)
+    start = time.perf_counter()
+    try:
+        with ThreadPoolExecutor(max_workers=workers or len(names)) as executor:
+            checks = list(
+                executor.map(lambda name: run_check(name, inputs, findings), names)
+            )
+    finally:
+        logging.getLogger().removeHandler(findings)
+    checks.sort(key=lambda check: check["wall_time"], reverse=True)
+    return {
+        "passed": all(check["passed"] for check in checks),
+        "wall_time": round(time.perf_counter() - start, 3),
+        "checks": checks,
+    }
+
+
+if __name__ == "__main__":
+    setup_logging()
+    parser = argparse.ArgumentParser(
+        description="Run the compliance checks concurrently."
+    )
+    parser.add_argument(
+        "--checks", default=",".join(CHECKS), help="Comma separated check names."
+    )
+    parser.add_argument(
+        "--max-days",
+        type=int,
+        default=30,
+        help="Maximum number of days for trivyignore entries",
+    )
+    parser.add_argument("--report", default="compliance-report.json")
+    parser.add_argument("--workers", type=int)
+    args = parser.parse_args()
+
+    names = args.checks.split(",")
+    unknown = set(names) - CHECKS.keys()
+    if unknown:
+        parser.error(f"Unknown checks: {', '.join(sorted(unknown))}")
+
+    report = run_checks(names, args.max_days, args.workers)
+    with open(args.report, "w") as file:
+        json.dump(report, file, indent=2)
+
+    for check in report["checks"]:
+        logging.info(
+            f"{check['name']:12} {'passed' if check['passed'] else 'FAILED':7} "
+            f"wall {check['wall_time']:7.2f}s subprocess {check['subprocess_time']:7.2f}s "
+            f"findings {len(check['findings'])}"
+        )
+    logging.info(
+        f"Compliance checks completed in {report['wall_time']:.2f}s, report: {args.report}"
+    )
+    sys.exit(0 if report["passed"] else 1)
@@ -0,0 +1,111 @@
+"""
+compliance_cache.py
+
+Persistent result cache of the compliance checks, licenses-check.py and trivyignore-check.py.
+
+Every check stores its last passing verdict under a key built from the content hashes of its inputs
+('poetry.lock', '.approved-dep.csv', '.trivyignore', the script itself, ...). When the key matches on
+the next run the check returns right away. A verdict may also carry an expiry date: an ignore in
+'.trivyignore' is valid until its 'until' date, so the verdict is only reused up to the earliest one.
+Failing verdicts are never cached, a failing check always runs and reports its findings again.
+
+Below the verdict a check can cache the results of its single items under keys of their own, the
+license check does for the dependency chains of its packages. After a miss only the items whose key
+changed are evaluated again.
+
+The cache file is '.compliance-cache.json', or the path in the COMPLIANCE_CACHE environment variable.
+compliance-check.py runs the checks concurrently, so save() holds a lock on the file, reads it again
+and only replaces the section of its own check.
+"""
+
+from datetime import date
+import fcntl
+import hashlib
+import json
+import logging
+import os
+import tempfile
+
+CACHE_PATH = os.environ.get("COMPLIANCE_CACHE", ".compliance-cache.json")
+
+
+def file_hash(path):
+    """SHA-256 of the content of a file, 'missing' if it does not exist."""
+    try:
+        with open(path, "rb") as file:
+            digest = hashlib.sha256()
+            # In chunks, an ignore file may be large.
+            for chunk in iter(lambda: file.read(1 << 16), b""):
+                digest.update(chunk)
+            return digest.hexdigest()
+    except FileNotFoundError:
+        return "missing"
+
+
+def cache_key(*parts):
+    """A key for any JSON serializable parts."""
+    return hashlib.sha256(json.dumps(parts, sort_keys=True).encode()).hexdigest()
+
+
+class ComplianceCache:
+    """The cached verdict and item results of one check.
+
+    Parameters:
+    - check (str): Name of the check, every check has its own section in the cache file.
+    - path (str): The cache file.
+    """
+
+    def __init__(self, check, path=CACHE_PATH):
+        self.check = check
+        self.path = path
+        self.cached = self._load().get(check, {})
+        self.items = {}
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, "r") as file:
+                return json.load(file)
+        except (OSError, ValueError) as e:
+            logging.warning(f"Ignoring unreadable cache {self.path}: {e}")
+            return {}
+
+    def verdict(self, key, today=None):
+        """True if the check passed before with the same key and the verdict did not expire."""
+        expires = self.cached.get("expires")
+        today = (today or date.today()).isoformat()
+        return self.cached.get("key") == key and (expires is None or today <= expires)
+
+    def item(self, key):
+        """The cached result of an item, None if there is none. Kept for the next run."""
+        if key in self.cached.get("items", {}):
+            self.items[key] = self.cached["items"][key]
+        return self.items.get(key)
+
+    def set_item(self, key, value):
+        self.items[key] = value
+
+    def save(self, key=None, expires=None):
+        """Write the item results of this run and, with a key, the passing verdict.
+
+        Items not used in this run are dropped.
+        """
+        entry = {"items": self.items}
+        if key is not None:
+            entry.update(key=key, expires=expires and expires.isoformat())
+        directory = os.path.dirname(self.path) or "."
+        with open(self.path + ".lock", "a") as lock:
+            # Other checks may have saved since this one loaded the file, their sections are kept.
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            data = self._load()
+            data[self.check] = entry
+            # Written to a temporary file first, a check cancelled halfway leaves the old cache intact.
+            fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+            try:
+                with os.fdopen(fd, "w") as file:
+                    json.dump(data, file, indent=1, sort_keys=True)
+                os.replace(tmp_path, self.path)
+            except BaseException:
+                os.remove(tmp_path)
+                raise
@@ -0,0 +1,103 @@
+"""
+compliance_common.py
+
+Helpers shared by the compliance scripts: licenses-check.py, trivyignore-check.py and the runner
+compliance-check.py.
+
+- setup_logging(): the log format of all scripts.
+- run(): runs a command and adds its duration to the subprocess time of the calling thread, which
+  compliance-check.py reports per check.
+- load_script(): imports a script with a dash in its name.
+- FindingsHandler: collects the warnings and errors logged by every check.
+"""
+
+# Ignoring
+# Issue: [B404:blacklist] Consider possible security implications associated with the subprocess module.
+# Severity: Low   Confidence: High
+import subprocess  # nosec B404:blacklist
+
+import importlib.util
+import logging
+import os
+import shlex
+import threading
+import time
+
+LOG_FORMAT = "%(asctime)s %(levelname)s %(message)s"
+
+_local = threading.local()
+
+
+def setup_logging(level=logging.INFO):
+    logging.basicConfig(
+        level=level,
+        format=LOG_FORMAT,
+        handlers=[logging.StreamHandler()],
+    )
+
+
+def run(cmd, check=True):
+    """Execute a command and capture results.
+
+    Parameters:
+    - cmd (str): The command to be executed.
+    - check (bool): Raise if the command exits with a non-zero status.
+
+    Returns:
+    - CompletedProcess: A named tuple containing information about the completed process.
+
+    Raises:
+    - subprocess.CalledProcessError: If check is set and the command exits with a non-zero status.
+    """
+    logging.info(f"Running: {cmd}")
+    start = time.perf_counter()
+    try:
+        # Ignoring
+        # Issue: [B603:subprocess_without_shell_equals_true] subprocess call - check for execution of untrusted input.
+        # Severity: Low   Confidence: High
+        # The commands are static strings of the compliance scripts, not external or user input.
+        return subprocess.run(
+            shlex.split(cmd), capture_output=True, text=True, check=check
+        )  # nosec B603
+    finally:
+        _local.subprocess_time = subprocess_time() + time.perf_counter() - start
+
+
+def subprocess_time():
+    """Seconds the calling thread spent in run() so far."""
+    return getattr(_local, "subprocess_time", 0.0)
+
+
+def reset_subprocess_time():
+    _local.subprocess_time = 0.0
+
+
+def load_script(path):
+    """Import a script by path, e.g. 'licenses-check.py', under its name with underscores."""
+    name = os.path.splitext(os.path.basename(path))[0].replace("-", "_")
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+class FindingsHandler(logging.Handler):
+    """Collects the messages of level WARNING and up per thread.
+
+    compliance-check.py runs every check in a thread of its own, so the messages of a thread are the
+    findings of the check running in it.
+    """
+
+    def __init__(self):
+        super().__init__(level=logging.WARNING)
+        self.findings = {}
+        self._lock = threading.Lock()
+
+    def emit(self, record):
+        with self._lock:
+            self.findings.setdefault(record.thread, []).append(record.getMessage())
+
+    def pop(self, thread=None):
+        """Remove and return the findings of a thread, the calling one by default."""
+        with self._lock:
+            return self.findings.pop(thread or threading.get_ident(), [])
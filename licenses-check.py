@@ -3,99 +3,293 @@
 """
 Script Description:
 This Python script checks and compares the licenses of installed Python packages with an approved list.
-It utilizes the 'pip-licenses' tool to retrieve current licenses and compares them with the licenses listed
-in a '.approved-dep.csv' file. Discrepancies are reported, along with corresponding dependency chains.
-"""
+It reads the licenses from the metadata of the installed distributions, the same way 'pip-licenses' does,
+and compares them with the licenses listed in a '.approved-dep.csv' file. Discrepancies are reported,
+along with corresponding dependency chains.
+
+The metadata is read in parallel and cached in '.licenses-cache.json', next to the compliance cache (or
+the path in the LICENSES_CACHE environment variable), keyed on the path and mtime of every dist-info
+directory, so only new or reinstalled distributions are read again.
+
+Packages that only declare an SPDX License-Expression get the names of the matching 'License ::'
+classifiers instead, the values '.approved-dep.csv' uses, see SPDX_CLASSIFIERS. A License field with
+an SPDX id is compared the same way, so 'MIT' matches an approved 'MIT License' and vice versa.
+
+A passing verdict is cached with compliance_cache.py, keyed on the hashes of 'poetry.lock',
+'.approved-dep.csv', this script and the installed distributions. Unless one of them changed the check
+passes right away. The dependency chains of failing packages are cached per package.
 
-# Ignoring
-# Issue: [B404:blacklist] Consider possible security implications associated with the subprocess module.
-# Severity: Low   Confidence: High
-import subprocess  # nosec B404:blacklist
+The dependency chains come from 'poetry.lock', which is parsed once into a reverse dependency graph.
+Every path from a package up to the direct dependencies in 'pyproject.toml' is reported.
+"""
 
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 import csv
+import importlib.metadata
+import json
+import os
+import pathlib
+import re
 import sys
-import shlex
 import logging
 
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s %(levelname)s %(message)s",
-    handlers=[logging.StreamHandler()],
-)
+from compliance_cache import CACHE_PATH, ComplianceCache, cache_key, file_hash
+from compliance_common import setup_logging
 
-def run(cmd):
-    """Execute a command in the system shell and capture results.
+try:
+    import tomllib
+except ModuleNotFoundError:  # Python < 3.11
+    import tomli as tomllib
 
-    Parameters:
-    - cmd (str): The command to be executed.
+LICENSE_UNKNOWN = "UNKNOWN"
 
-    Returns:
-    - CompletedProcess: A named tuple containing information about the completed process.
+# In the same directory as the compliance cache, the builder stage keeps it in a cache mount.
+LICENSES_CACHE = os.environ.get(
+    "LICENSES_CACHE", os.path.join(os.path.dirname(CACHE_PATH), ".licenses-cache.json")
+)
+
+# Changes whenever read_license() reads a license differently, older cache files are ignored.
+LICENSES_CACHE_VERSION = 2
+
+# SPDX license identifiers and the 'License ::' classifier names 'pip-licenses' reports for them.
+SPDX_CLASSIFIERS = {
+    "0bsd": "Zero-Clause BSD (0BSD)",
+    "apache-2.0": "Apache Software License",
+    "bsd-2-clause": "BSD License",
+    "bsd-3-clause": "BSD License",
+    "cc0-1.0": "CC0 1.0 Universal (CC0 1.0) Public Domain Dedication",
+    "gpl-2.0-only": "GNU General Public License v2 (GPLv2)",
+    "gpl-2.0-or-later": "GNU General Public License v2 or later (GPLv2+)",
+    "gpl-3.0-only": "GNU General Public License v3 (GPLv3)",
+    "gpl-3.0-or-later": "GNU General Public License v3 or later (GPLv3+)",
+    "isc": "ISC License (ISCL)",
+    "lgpl-2.0-only": "GNU Lesser General Public License v2 (LGPLv2)",
+    "lgpl-2.0-or-later": "GNU Lesser General Public License v2 or later (LGPLv2+)",
+    "lgpl-2.1-only": "GNU Lesser General Public License v2 (LGPLv2)",
+    "lgpl-2.1-or-later": "GNU Lesser General Public License v2 or later (LGPLv2+)",
+    "lgpl-3.0-only": "GNU Lesser General Public License v3 (LGPLv3)",
+    "lgpl-3.0-or-later": "GNU Lesser General Public License v3 or later (LGPLv3+)",
+    "mit": "MIT License",
+    "mit-0": "MIT No Attribution License (MIT-0)",
+    "mpl-2.0": "Mozilla Public License 2.0 (MPL 2.0)",
+    "psf-2.0": "Python Software Foundation License",
+    "python-2.0": "Python Software Foundation License",
+    "unlicense": "The Unlicense (Unlicense)",
+}
+
+# Left out by 'pip-licenses' by default, so they are not in '.approved-dep.csv' either.
+SYSTEM_PACKAGES = {
+    "pip-licenses",
+    "pip",
+    "prettytable",
+    "wcwidth",
+    "setuptools",
+    "wheel",
+}
+
+
+def canonicalize(name):
+    """Normalize a package name like pip does (PEP 503), e.g. 'Flask_SQLAlchemy' -> 'flask-sqlalchemy'."""
+    return re.sub(r"[-_.]+", "-", name).lower()
+
+
+def spdx_to_classifiers(expression):
+    """Translate an SPDX license expression to the names of the 'License ::' classifiers.
+
+    Every license of an expression like 'MIT OR Apache-2.0' gets its classifier, sorted and joined
+    with '; ' like the classifiers of a package, 'Apache Software License; MIT License'.
 
-    Raises:
-    - subprocess.CalledProcessError: If the command exits with a non-zero status.
+    Returns:
+    - str: The classifier names, the expression itself if it has a license without a classifier or
+      an exception ('WITH').
     """
-    try:
-        logging.info(f"Running: {cmd}")
-        args = shlex.split(cmd)
-        # Ignoring
-        # Issue: [B603:subprocess_without_shell_equals_true] subprocess call - check for execution of untrusted input.
-        # Severity: Low   Confidence: High
-        # This is specify script that is only used for internal checks and commands are static and are not from external
-        # or user input and is running in a place where the user already as more then enough permissions to run the script
-        # passed to this method anyway.
-        return subprocess.run(
-            args, capture_output=True, text=True, check=True
-        )  # nosec B603
-    except subprocess.CalledProcessError as e:
-        print(f"Error: {e}")
-        print(f"Command output: {e.output}")
-        sys.exit(2)
-
-
-def get_dependency_chain(dependency):
-    """Retrieve the dependency chain for a given Python package using Poetry.
-
-    This function takes a package name as input and returns a list representing
-    the dependency chain, starting from the provided package and going up through
-    its direct and transitive dependencies.
+    tokens = expression.replace("(", " ").replace(")", " ").split()
+    licenses = [token for token in tokens if token.upper() not in ("AND", "OR")]
+    classifiers = {SPDX_CLASSIFIERS.get(license.lower()) for license in licenses}
+    if not licenses or None in classifiers or "WITH" in map(str.upper, tokens):
+        return expression
+    return "; ".join(sorted(classifiers))
+
+
+def read_license(metadata_path):
+    """Read the name and license of a distribution like 'pip-licenses --from=mixed'.
+
+    The license comes from the 'License ::' classifiers when there are any, multiple ones joined with
+    '; '. Otherwise from the License-Expression, translated to the classifier names, or the License
+    field, and 'UNKNOWN' without either.
 
     Parameters:
-    - dependency (str): The name of the Python package for which to retrieve the dependency chain.
+    - metadata_path (str): The dist-info or egg-info directory of the distribution.
 
     Returns:
-    - list: A list containing the dependency chain, with the provided package at the beginning
-      and its direct and transitive dependencies following in order.
+    - tuple: The name of the distribution and its license.
     """
-    chain = [dependency]
+    metadata = importlib.metadata.PathDistribution(pathlib.Path(metadata_path)).metadata
+    classifiers = {
+        classifier.split(" :: ")[-1]
+        for classifier in metadata.get_all("Classifier") or []
+        if classifier.startswith("License")
+    } - {"OSI Approved"}
+    if classifiers:
+        return metadata["Name"], "; ".join(sorted(classifiers))
+    if metadata.get("License-Expression"):
+        return metadata["Name"], spdx_to_classifiers(metadata["License-Expression"])
+    return metadata["Name"], metadata.get("License") or LICENSE_UNKNOWN
 
-    # Continue querying the dependency tree until a direct dependency is found
-    while True:
-        pkg_line = run(f"poetry show --tree --why {dependency} --no-ansi").stdout
 
-        # Check if the current package is a direct dependency
-        if "direct dependency" in pkg_line:
-            break
+def find_distributions(paths):
+    """Find the metadata directory of every distribution installed in paths.
 
-        # Get the first word from the first line of pkg_line, this should be the upper dependency pkg name
-        dependency = pkg_line.split(" ", 1)[0]
-        chain = [dependency] + chain
+    Like importlib.metadata, the first one found wins when a distribution is installed in several paths.
 
-    return chain
+    Returns:
+    - dict: Canonical name -> (metadata directory, mtime in nanoseconds).
+    """
+    found = {}
+    for entry in paths:
+        if not os.path.isdir(entry):
+            continue
+        for item in os.scandir(entry):
+            if item.name.endswith((".dist-info", ".egg-info")) and item.is_dir():
+                # '<name>-<version>.dist-info', with the dashes of the name escaped.
+                name = canonicalize(item.name.rsplit(".", 1)[0].split("-", 1)[0])
+                found.setdefault(name, (item.path, item.stat().st_mtime_ns))
+    return found
+
+
+def collect_licenses(paths=None, cache_path=LICENSES_CACHE, workers=8):
+    """Collect the licenses of the installed distributions.
+
+    Parameters:
+    - paths (list): The directories to scan, sys.path by default.
+    - cache_path (str): The cache file, None to read every distribution again.
+    - workers (int): Number of threads reading metadata in parallel.
 
+    Returns:
+    - dict: Distribution name -> license, without SYSTEM_PACKAGES.
+    """
+    cache = {}
+    if cache_path and os.path.exists(cache_path):
+        with open(cache_path, "r") as file:
+            content = json.load(file)
+        if content.get("version") == LICENSES_CACHE_VERSION:
+            cache = content["distributions"]
+
+    distributions = find_distributions(sys.path if paths is None else paths)
+    stale = [
+        (path, mtime)
+        for path, mtime in distributions.values()
+        if cache.get(path, {}).get("mtime") != mtime
+    ]
+    if stale:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            read = executor.map(read_license, [path for path, _ in stale])
+            for (path, mtime), (name, license) in zip(stale, read):
+                cache[path] = {"mtime": mtime, "name": name, "license": license}
+
+    current = {path: cache[path] for path, _ in distributions.values()}
+    if cache_path and (stale or len(current) != len(cache)):
+        with open(cache_path, "w") as file:
+            content = {"version": LICENSES_CACHE_VERSION, "distributions": current}
+            json.dump(content, file, indent=1, sort_keys=True)
+
+    return {
+        entry["name"]: entry["license"]
+        for entry in current.values()
+        if canonicalize(entry["name"]) not in SYSTEM_PACKAGES
+    }
+
+
+class DependencyGraph:
+    """Reverse dependency graph of the packages in 'poetry.lock'.
+
+    Attributes:
+    - names (dict): Canonical name -> name as written in 'poetry.lock'.
+    - dependents (defaultdict): Canonical name -> set of canonical names of the packages requiring it.
+    - direct (set): Canonical names of the direct dependencies of all groups in 'pyproject.toml'.
+    """
 
-def run_pip_licenses():
+    def __init__(self, lock_path="poetry.lock", pyproject_path="pyproject.toml"):
+        with open(lock_path, "rb") as file:
+            lock = tomllib.load(file)
+        with open(pyproject_path, "rb") as file:
+            pyproject = tomllib.load(file)
+
+        self.names = {}
+        self.dependents = defaultdict(set)
+        for package in lock.get("package", []):
+            name = canonicalize(package["name"])
+            self.names[name] = package["name"]
+            for dependency in package.get("dependencies", {}):
+                self.dependents[canonicalize(dependency)].add(name)
+
+        poetry = pyproject["tool"]["poetry"]
+        groups = [poetry.get("dependencies", {}), poetry.get("dev-dependencies", {})]
+        groups += [g.get("dependencies", {}) for g in poetry.get("group", {}).values()]
+        self.direct = {canonicalize(d) for group in groups for d in group} - {"python"}
+
+        self._paths = {}
+
+    def __contains__(self, package):
+        return canonicalize(package) in self.names
+
+    def chains(self, package):
+        """All dependency chains from a direct dependency down to package.
+
+        A chain goes on past a direct dependency that is itself required by another one, so every
+        chain that keeps the package installed is listed.
+
+        Parameters:
+        - package (str): The name of the package, in any spelling.
+
+        Returns:
+        - list: Lists of package names, each starting at a direct dependency and ending at package.
+          Empty if package is not in 'poetry.lock' or not required by any direct dependency.
+        """
+        return [
+            [self.names.get(name, name) for name in path]
+            for path in self._paths_up(canonicalize(package), frozenset())[0]
+        ]
+
+    def _paths_up(self, name, visiting):
+        # The paths above a package are the same for every chain through it, so they are memoized.
+        # Packages already on the current path are skipped to stay out of dependency cycles; the
+        # paths found that way may be incomplete and are not memoized.
+        if name in self._paths:
+            return self._paths[name], True
+        visiting = visiting | {name}
+        paths = [[name]] if name in self.direct else []
+        complete = True
+        for parent in sorted(self.dependents[name]):
+            if parent in visiting:
+                complete = False
+                continue
+            parent_paths, parent_complete = self._paths_up(parent, visiting)
+            complete = complete and parent_complete
+            paths += [path + [name] for path in parent_paths]
+        if complete:
+            self._paths[name] = paths
+        return paths, complete
+
+
+def check_licenses(graph=None):
     """Check and compare licenses of installed Python packages with an approved list.
 
     Reads an '.approved-dep.csv' file containing approved packages and their licenses.
-    Retrieves the current licenses of installed Python packages using 'pip-licenses'. Compares
+    Retrieves the current licenses of installed Python packages with collect_licenses(). Compares
     the current licenses with the approved licenses. Prints discrepancies and the corresponding
     dependency chains. Exits with a non-zero code if there are discrepancies.
 
     Note:
     - The '.approved-dep.csv' file format should be 'package_name,license' per line.
-    - The 'pip-licenses' tool must be installed for the function to work.
+    - A header row 'Name,License', as written by 'pip-licenses', is skipped.
+    - SPDX ids and the matching classifier names are the same license, 'MIT' is approved by
+      'MIT License'.
+    - The dependency chains are read from 'poetry.lock' and 'pyproject.toml'.
+
+    Parameters:
+    - graph (DependencyGraph): An already parsed graph, parsed when needed without one.
     """
 
     exit_code = 0
@@ -104,6 +298,22 @@ def run_pip_licenses():
 
     csv_file_path = ".approved-dep.csv"
 
+    # Skip the check when nothing changed since it last passed
+
+    cache = ComplianceCache("licenses")
+    lock_hash = file_hash("poetry.lock")
+    verdict_key = cache_key(
+        lock_hash,
+        file_hash(csv_file_path),
+        file_hash(__file__),
+        sorted(find_distributions(sys.path).values()),
+    )
+    if cache.verdict(verdict_key):
+        logging.info(
+            "Dependencies and approved licenses unchanged since the last pass."
+        )
+        return exit_code
+
     # Using defaultdict to pip_license_cmd automatically create a list for new packages
     # Each package may have multiple licenses, which is why they are stored in a list.
 
@@ -112,21 +322,13 @@ def run_pip_licenses():
     # Read CSV file and populate approved_packages with package-license
     with open(csv_file_path, "r") as file:
         for pkg, license in csv.reader(file):
-            approved_packages[pkg].append(license)
+            if (pkg, license) != ("Name", "License"):
+                approved_packages[pkg].append(license)
 
     # Fetching Current Python Package Licenses
 
-    current_packages = {}
-
-    # Retrieves the licenses of currently installed packages using 'pip-licenses'
-    result = run("pip-licenses --format=csv --no-version")
-
-    # Split the stdout of'result' into lines and use the csv.reader to create a list of packages
-    current_packages_csv = list(csv.reader(result.stdout.splitlines()))
-
-    # Iterate through the list of current packages
-    for pkg, license in current_packages_csv:
-        current_packages[pkg] = license
+    # Reads the licenses from the metadata of the installed distributions
+    current_packages = collect_licenses()
 
     # Print keys present in current but not in approved
     extra_keys_current = current_packages.keys() - approved_packages.keys()
@@ -138,28 +340,42 @@ def run_pip_licenses():
 
     for pkg, license in current_packages.items():
         approved_licenses = approved_packages[pkg]
-        if license not in approved_licenses:
+        # A License field with an SPDX id matches the classifier name and the other way around
+        approved = {spdx_to_classifiers(approved) for approved in approved_licenses}
+        if spdx_to_classifiers(license) not in approved:
             logging.critical(
                 f"{pkg} uses {license} this differs from "
                 f"approved licenses ({','.join(approved_licenses)})."
             )
             exit_code = 2
-            chain = get_dependency_chain(pkg)
-            logging.critical(f"  └── Dependency chain: {' -> '.join(chain)}")
+            chains_key = cache_key(lock_hash, pkg)
+            chains = cache.item(chains_key)
+            if chains is None:
+                # Parsed only if a dependency chain is not cached
+                graph = graph or DependencyGraph()
+                chains = graph.chains(pkg)
+                cache.set_item(chains_key, chains)
+            if not chains:
+                logging.critical("  └── Not required by any dependency in poetry.lock")
+            for chain in chains:
+                logging.critical(f"  └── Dependency chain: {' -> '.join(chain)}")
 
     # If there is a package in approved but not in current
     missing_keys_current = approved_packages.keys() - current_packages.keys()
     for key in missing_keys_current:
         logging.info(f"{key} missing in current dependencies; {csv_file_path}.")
 
+    cache.save(verdict_key if exit_code == 0 else None)
+
     return exit_code
 
 
 if __name__ == "__main__":
+    setup_logging()
     exitcode = 1
     logging.info(f"Starting dependency licenses check...")
     try:
-        exitcode = run_pip_licenses()
+        exitcode = check_licenses()
     except KeyboardInterrupt:
         logging.info("Operation interrupted by the user.")
     except Exception as e:
@@ -23,96 +23,192 @@ CVE-2018-14618
 # reason: Not used in prod app; it is a build dependency
 # until: 2022-03-01
 CVE-1234-98765
+
+The file is validated in one pass, holding one ignore group in memory at a time, so org-wide
+ignore files with thousands of entries take constant memory. All invalid groups are reported, with
+the path and line number of the group, not only the first one. Several files can be checked in one
+run, each with its own maximum number of days:
+
+    python trivyignore-check.py --max-days 30 .trivyignore org/.trivyignore:90
+
+A passing result is cached with compliance_cache.py per file, keyed on the hashes of the file and this
+script and on the maximum number of days. It is reused until the earliest until date passed. The
+groups are not cached one by one: hashing a group costs more than checking it.
 """
-   
+
 import sys
-from itertools import groupby
 from datetime import datetime
+from functools import lru_cache
 import logging
 import argparse
 
+from compliance_cache import ComplianceCache, cache_key, file_hash
+from compliance_common import setup_logging
+
+
+def iter_groups(file):
+    """Yield the ignore groups of an open '.trivyignore' one at a time.
+
+    Groups are separated by blank lines. Consecutive duplicate lines count once.
+
+    Returns:
+    - generator: Tuples of the line number of the first line of the group and its lines.
+    """
+    group, start, previous = [], None, None
+    for number, line in enumerate(file, start=1):
+        line = line.rstrip("\n")
+        if line == previous:
+            continue
+        previous = line
+        if line.strip():
+            if not group:
+                start = number
+            group.append(line)
+        elif group:
+            yield start, group
+            group = []
+    if group:
+        yield start, group
+
+
+@lru_cache(maxsize=4096)
+def parse_until(until):
+    # Large ignore files share a few until dates, strptime is the slowest step per group.
+    return datetime.strptime(until, "%Y-%m-%d")
+
+
+def check_group(group, max_days, current_datetime):
+    """Check one ignore group: reason, until date and vulnerabilities.
+
+    Returns:
+    - tuple: The until date of the group as a date, None if the group is invalid, and the error if
+      it is.
+    """
+    if "reason:" not in group[0]:
+        return None, "Invalid entry: 'reason:' not found."
+    reason = group[0].split(":")[-1].strip()
+
+    if len(group) < 2 or "until:" not in group[1]:
+        return None, f"Invalid entry: 'until' not found for reason: {reason}."
+    until = group[1].split(":")[-1].strip()
+
+    vuls = ",".join(group[2:])
+    if vuls == "":
+        return None, f"Invalid entry: no vulnerability entries for {reason}."
+
+    # Calculate the differences in days
+    try:
+        until_datetime = parse_until(until)
+    except ValueError:
+        return (
+            None,
+            f"Invalid entry: until date {until!r} is not YYYY-MM-DD for {reason}.",
+        )
+    until_day = (until_datetime - current_datetime).days
+    days_in_past = (current_datetime - until_datetime).days
 
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s %(levelname)s %(message)s",
-    handlers=[logging.StreamHandler()],
-)
+    if until_day > max_days:
+        return None, f"{vuls} until date should not exceed {max_days} days."
+    elif days_in_past > 0:
+        return None, f"{vuls}. Ignore beyond {until}. Investigate ignores."
 
+    if logging.getLogger().isEnabledFor(logging.DEBUG):
+        logging.debug(f"Ignoring {vuls} until {until} ({until_day}d). Reason: {reason}")
+    return until_datetime.date(), None
 
-def split_list(original_list, split_value):
-    result, sublist = [], []
 
-    for item in original_list:
-        if item == split_value:
-            if sublist:  # Avoid empty sublists if there are consecutive split values
-                result.append(sublist)
-                sublist = []
-        else:
-            sublist.append(item)
+def check_trivyignore_entries(max_days, path=".trivyignore", use_cache=True):
+    """Check all ignore groups of a '.trivyignore' file.
 
-    result.append(sublist) if sublist else None
-    return result
+    Parameters:
+    - max_days (int): How many days from today an until date may be at most.
+    - path (str): The file to check.
+    - use_cache (bool): Reuse and store results with compliance_cache.py.
 
+    Returns:
+    - bool: True if every group is valid, False if one is not or the file can not be read.
+    """
 
-def check_trivyignore_entries(max_days):
-
-    logging.info(f"Checking validity of '.trivyignore'")
+    logging.info(f"Checking validity of '{path}'")
 
     current_datetime = datetime.now()
 
-    with open(".trivyignore", "r") as file:
-        lines = file.readlines()
-
-    # Using groupby from itertools to remove consecutive duplicates
-    lines = [key for key, _group in groupby(lines)]
-
-    # Splitting the list of lines into sublists based on the newline character ("\n")
-    triviy_ignored_groups = split_list(lines, "\n")
-
-    for group in triviy_ignored_groups:
-        group = [string.replace("\n", "") for string in group]
-
-        if "reason:" not in group[0]:
-            logging.critical("Invalid entry: 'reason:' not found.")
-            return False
-        else:
-            reason = group[0].split(":")[-1].strip()
-
-        if "until:" not in group[1]:
-            logging.critical(f"Invalid entry: 'until' not found for reason: {reason}.")
-            return False
-        else:
-            until = group[1].split(":")[-1].strip()
-
-        vuls = ",".join(group[2:])
-        if vuls == "":
-            logging.critical(f"Invalid entry: no vulnerability entries for {reason}.")
-            return False
-
-        # Calculate the differences in days
-        until_datetime = datetime.strptime(until, "%Y-%m-%d")
-        until_day = (until_datetime - current_datetime).days
-        days_in_past = (current_datetime - until_datetime).days
-
-        if until_day > max_days:
-            logging.critical(f"{vuls} until date should not exceed {max_days} days.")
-            return False
-        elif days_in_past > 0:
-            logging.critical(f"{vuls}. Ignore beyond {until}. Investigate ignores.")
-            return False
-
-        logging.info(f"Ignoring {vuls} until {until} ({until_day}d). Reason: {reason}")
-
-    return True
+    # Skip the check when nothing changed and no ignore expired since it last passed
+    if use_cache:
+        cache = ComplianceCache(f"trivyignore:{path}")
+        verdict_key = cache_key(file_hash(path), file_hash(__file__), max_days)
+        if cache.verdict(verdict_key, current_datetime.date()):
+            logging.info(
+                f"'{path}' unchanged and no ignore expired since the last pass."
+            )
+            return True
+
+    groups = invalid = 0
+    expires = None
+    try:
+        with open(path, "r") as file:
+            for line, group in iter_groups(file):
+                groups += 1
+                until, error = check_group(group, max_days, current_datetime)
+                if error:
+                    logging.critical(f"{path}:{line}: {error}")
+                    invalid += 1
+                else:
+                    # Compare dates, as a string '2026-11-2' sorts after '2026-11-10'.
+                    expires = min(expires or until, until)
+    except (OSError, UnicodeDecodeError) as e:
+        # A missing or misspelled ignore file must fail the gate, not skip it.
+        logging.critical(f"{path}: Unable to read the ignore file: {e}")
+        return False
+
+    logging.info(f"{path}: {groups} groups, {invalid} invalid.")
+    if use_cache:
+        cache.save(None if invalid else verdict_key, expires)
+    return invalid == 0
+
+
+def file_argument(value):
+    """'PATH' or 'PATH:MAX_DAYS' -> (path, max_days or None)."""
+    path, _, days = value.rpartition(":")
+    if path and days.isdigit():
+        return path, int(days)
+    return value, None
 
 
 if __name__ == "__main__":
+    setup_logging()
     try:
-        parser = argparse.ArgumentParser(description="Check trivyignore entries based on the specified maximum days.")
-        parser.add_argument("--max-days", type=int, help="Maximum number of days for trivyignore entries", required=True)
+        parser = argparse.ArgumentParser(
+            description="Check trivyignore entries based on the specified maximum days."
+        )
+        parser.add_argument(
+            "--max-days",
+            type=int,
+            help="Maximum number of days for trivyignore entries, for files without their own",
+        )
+        parser.add_argument(
+            "files",
+            nargs="*",
+            type=file_argument,
+            default=[(".trivyignore", None)],
+            metavar="PATH[:MAX_DAYS]",
+            help="The ignore files to check, .trivyignore by default",
+        )
+        parser.add_argument(
+            "--no-cache", action="store_true", help="Do not use compliance_cache.py"
+        )
         args = parser.parse_args()
 
-        if not check_trivyignore_entries(args.max_days):
+        if any(days is None for _, days in args.files) and args.max_days is None:
+            parser.error("--max-days is required for files without their own")
+
+        valid = True
+        for path, days in args.files:
+            days = args.max_days if days is None else days
+            # Every file is checked, also after an invalid one.
+            valid = check_trivyignore_entries(days, path, not args.no_cache) and valid
+
+        if not valid:
             logging.critical("Invalid trivyignore entires found.")
             sys.exit(1)
         else:
@@ -122,3 +218,4 @@ if __name__ == "__main__":
         logging.info("Operation interrupted by the user.")
     except Exception as e:
         logging.fatal(f"An error occurred: {e}")
+        sys.exit(1)